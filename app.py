@@ -402,13 +402,22 @@ elif menu_option == "🌡️ Fase 3: Monitoramento IoT":
         with col4:
             st.metric("% Irrigação", f"{stats['percentual_irrigacao']:.1f}%")
         
+        uso_bomba = controller.obter_uso_bomba_sensores(horas=24)
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            st.metric("Bomba Ligada (24h)", f"{uso_bomba['segundos_ligada'] / 60:.0f} min")
+        with col2:
+            st.metric("Ciclo de Trabalho (24h)", f"{uso_bomba['ciclo_trabalho']:.1f}%")
+        with col3:
+            st.metric("Acionamentos (24h)", uso_bomba['acionamentos'])
+        
         # Histórico em tabela
         st.markdown("---")
         st.subheader("📋 Histórico de Leituras")
         
-        historico = controller.sensor_handler.exportar_para_dict()
-        if historico:
-            df_historico = pd.DataFrame(historico)
+        df_historico = controller.sensor_handler.to_dataframe()
+        if not df_historico.empty:
+            st.line_chart(df_historico.set_index('timestamp')[['umidade', 'ph']])
             st.dataframe(df_historico, use_container_width=True)
     
     else:
@@ -28,6 +28,9 @@ class Config:
     DB_PORT = os.getenv("DB_PORT", "1521")
     DB_SERVICE = os.getenv("DB_SERVICE")
     
+    # Log persistente de sensores (Fase 3)
+    SENSOR_LOG_DIR = os.getenv("SENSOR_LOG_DIR", str(DATA_DIR / "sensores"))
+    
     # Banco de Dados SQLite (Fase 4)
     SQLITE_DB_PATH = os.getenv("SQLITE_DB_PATH", str(DATABASE_DIR / "farmtech.db"))
     
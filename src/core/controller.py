@@ -3,10 +3,9 @@ Controlador Central do Sistema FarmTech
 Integra todos os módulos das Fases 1-6
 """
 
-from alerts.aws_alert import send_alert
 from typing import Optional, Dict, Any, List
 import os
-from datetime import datetime
+from datetime import datetime, timedelta
 
 
 class FarmTechController:
@@ -26,6 +25,7 @@ class FarmTechController:
         self.ml_model = None
         self.database = None
         self.sensor_handler = None
+        self.armazem_sensores = None
         self.yolo_detector = None
         
         self._inicializar_servicos()
@@ -54,8 +54,20 @@ class FarmTechController:
             
             # Fase 3: Sensores IoT
             from src.fase3.sensor_handler import SensorHandler
+            from src.fase3.armazem_sensores import ArmazemSensores
+            from src.fase3.log_persistente import LogSensores
+            from src.fase3.gravador_leituras import GravadorLeituras
             
-            self.sensor_handler = SensorHandler()
+            self.sensor_handler = SensorHandler(
+                log=LogSensores(Config.SENSOR_LOG_DIR),
+                gravador=GravadorLeituras(self.database)
+            )
+            self.armazem_sensores = ArmazemSensores()
+            # O handler do dashboard é um dispositivo do armazém: resumo de
+            # dispositivos e backtest enxergam as leituras do dashboard
+            self.armazem_sensores.registrar_shard(
+                SensorHandler.DISPOSITIVO_PADRAO, self.sensor_handler
+            )
             print("  ✅ Fase 3: Handler de sensores inicializado")
             
             # Fase 4: Machine Learning
@@ -168,33 +180,32 @@ class FarmTechController:
         return self.sensor_handler.gerar_dados_simulados(n_leituras)
     
     def adicionar_leitura_sensor(self, umidade: float, ph: float,
-                             fosforo: bool, potassio: bool,
-                             temperatura: Optional[float] = None):
-    """
-    Adiciona nova leitura de sensor
-    
-    Args:
-        umidade: Umidade do solo (%)
-        ph: pH do solo
-        fosforo: Presença de fósforo
-        potassio: Presença de potássio
-        temperatura: Temperatura (opcional)
+                                 fosforo: bool, potassio: bool,
+                                 temperatura: Optional[float] = None):
+        """
+        Adiciona nova leitura de sensor
         
-    Returns:
-        SensorData criado
-    """
-    
-    #  Criar o objeto de leitura
-    dado = self.sensor_handler.adicionar_leitura(
-        umidade, ph, fosforo, potassio, temperatura
-    )
-
-    #  Verificar alertas (já envia para AWS se crítico)
-    self.sensor_handler.verificar_alertas()
+        Args:
+            umidade: Umidade do solo (%)
+            ph: pH do solo
+            fosforo: Presença de fósforo
+            potassio: Presença de potássio
+            temperatura: Temperatura (opcional)
+            
+        Returns:
+            SensorData criado
+        """
+        
+        #  Criar o objeto de leitura
+        dado = self.sensor_handler.adicionar_leitura(
+            umidade, ph, fosforo, potassio, temperatura
+        )
 
-    # Retorna corretamente o objeto criado
-    return dado
+        #  Verificar alertas (mudanças de estado são enviadas à AWS)
+        self.sensor_handler.verificar_alertas()
 
+        # Retorna corretamente o objeto criado
+        return dado
     
     def obter_ultima_leitura_sensor(self):
         """Retorna última leitura de sensor"""
@@ -204,17 +215,71 @@ class FarmTechController:
         """Retorna estatísticas do histórico de sensores"""
         return self.sensor_handler.obter_estatisticas()
     
-    def obter_alertas_sensores(self) -> List[str]:
-        """Verifica alertas e também dispara AWS se houver crítico"""
+    def obter_agregados_janelas_sensores(self, janelas: Optional[List] = None) -> Dict:
+        """
+        Retorna agregados dos sensores nas janelas de 15 min, 1 h e 24 h
+        
+        Args:
+            janelas: Janelas desejadas (nomes ou segundos); padrão: todas
+            
+        Returns:
+            Dicionário janela -> agregados
+        """
+        return self.sensor_handler.obter_agregados_janelas(janelas)
+    
+    def obter_serie_sensores(self, inicio: datetime, fim: datetime, pontos: int = 500) -> Dict:
+        """
+        Retorna a série agregada dos sensores para gráficos de longo prazo
+        
+        Args:
+            inicio: Início do período
+            fim: Fim do período
+            pontos: Pontos desejados no gráfico
+        
+        Returns:
+            Dicionário com o nível de rollup usado e as colunas da série
+        """
+        return self.sensor_handler.obter_rollups(inicio, fim, pontos)
+    
+    def obter_uso_bomba_sensores(self, horas: int = 24) -> Dict:
+        """
+        Retorna o uso da bomba nas últimas horas
+        
+        Args:
+            horas: Tamanho do período
+            
+        Returns:
+            Dicionário com segundos ligada, ciclo de trabalho (%) e acionamentos
+        """
+        return self.sensor_handler.obter_uso_bomba(datetime.now() - timedelta(hours=horas))
 
-        alertas = self.sensor_handler.verificar_alertas()
+    def prever_umidade_sensores(self, horas: float = 6) -> Dict:
+        """
+        Prevê a umidade do solo nas próximas horas a partir do histórico
 
-        # Se houver alertas, envia para AWS (segurança extra)
-        if alertas:
-            mensagem = " | ".join(alertas)
-            send_alert(f"ALERTA DO CONTROLLER: {mensagem}")
+        Args:
+            horas: Horizonte da previsão (até 6 h)
+
+        Returns:
+            Dicionário com 'timestamp' e 'umidade' prevista por intervalo
+        """
+        return self.sensor_handler.prever_umidade(horas)
 
-        return alertas
+    def obter_resumo_dispositivos(self, talhao: Optional[str] = None) -> Dict:
+        """
+        Retorna estatísticas consolidadas dos dispositivos IoT
+        
+        Args:
+            talhao: Se informado, apenas dispositivos desse talhão
+            
+        Returns:
+            Dicionário com estatísticas e total de dispositivos
+        """
+        return self.armazem_sensores.obter_resumo_geral(talhao)
+    
+    def obter_alertas_sensores(self) -> List[str]:
+        """Verifica alertas (mudanças de estado são enviadas à AWS pelo handler)"""
+        return self.sensor_handler.verificar_alertas()
     
     # ========================================
     # MÉTODOS PARA FASE 4: Machine Learning
@@ -354,7 +419,58 @@ class FarmTechController:
             decisao_final['prioridade'] = 'baixa'
         
         return decisao_final
-    
+
+    def comparar_politicas_irrigacao(
+        self,
+        inicio: datetime,
+        fim: datetime,
+        nutrientes: float,
+        clima: Optional[Dict] = None,
+        talhao: Optional[str] = None,
+        intervalo: float = 300
+    ) -> Dict:
+        """
+        Compara as políticas de irrigação sobre o histórico dos dispositivos
+
+        Reproduz o histórico do armazém de sensores (que inclui as leituras
+        do dashboard, no dispositivo SensorHandler.DISPOSITIVO_PADRAO) com a
+        regra de limiar (Fase 3), o modelo ML (Fase 4) e a lógica integrada
+        de analisar_necessidade_irrigacao_completa, além da bomba registrada.
+
+        Args:
+            inicio: Início do período
+            fim: Fim do período
+            nutrientes: Nível de nutrientes N (ppm) para o modelo ML
+            clima: Histórico de previsões com arrays 'timestamp' e 'chuva'
+                (chuva significativa); sem ele, considera que não choveu
+            talhao: Se informado, apenas dispositivos desse talhão
+            intervalo: Passo da reprodução em segundos
+
+        Returns:
+            Horas de bomba, água usada e tempo abaixo dos limiares de
+            umidade por política (ver BacktestIrrigacao.resultado)
+        """
+        from src.fase3.backtest_irrigacao import (
+            backtest_armazem, politica_limiar, politica_ml,
+            politica_combinada, politica_registrada
+        )
+
+        politicas = [politica_registrada(), politica_limiar(self.sensor_handler)]
+        if self.ml_model.model_info['carregado']:
+            politicas += [
+                politica_ml(self.ml_model, nutrientes),
+                politica_combinada(self.ml_model, nutrientes)
+            ]
+
+        limiares = (
+            self.sensor_handler.LIMIAR_UMIDADE_BAIXA,
+            self.sensor_handler.LIMIAR_UMIDADE_CRITICA
+        )
+        return backtest_armazem(
+            self.armazem_sensores, inicio, fim, politicas, intervalo,
+            clima=clima, talhao=talhao, limiares=limiares
+        )
+
     def obter_dashboard_resumo(self) -> Dict:
         """
         Retorna resumo geral para dashboard principal
@@ -362,14 +478,8 @@ class FarmTechController:
         Returns:
             Dicionário com informações de todas as fases
         """
-
-        
         alertas = self.sensor_handler.verificar_alertas()
         
-        if alertas:
-            mensagem = " | ".join(alertas)
-            send_alert(f"ALERTA DO DASHBOARD: {mensagem}")
-        
         resumo = {
             'fase1': {
                 'total_plantios': len(self.calculo_plantio.dados),
@@ -2,7 +2,9 @@
 Fase 2 - Banco de Dados Estruturado e Sistema CRUD
 """
 
-from .models import Base, Funcionarios, Insumos, Talhoes, Financeiros, Relatorios, Tarefas
+from .models import (
+    Base, Funcionarios, Insumos, Talhoes, Financeiros, Relatorios, Tarefas, LeiturasSensor
+)
 from .database import DatabaseHandler
 
 __all__ = [
@@ -13,5 +15,6 @@ __all__ = [
     'Financeiros',
     'Relatorios',
     'Tarefas',
+    'LeiturasSensor',
     'DatabaseHandler'
 ]
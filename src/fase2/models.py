@@ -3,7 +3,9 @@ Modelos de dados do sistema FarmTech
 Migrado da Fase 2 (agrogestor)
 """
 
-from sqlalchemy import Identity, Float, Date, Column, Integer, String
+from sqlalchemy import (
+    Identity, Float, Date, DateTime, Boolean, Column, Integer, String, Index
+)
 from sqlalchemy.orm import declarative_base
 
 Base = declarative_base()
@@ -92,3 +94,25 @@ class Tarefas(Base):
     
     def __repr__(self):
         return f"<Tarefa(id={self.id}, titulo='{self.titulo}', status='{self.status}')>"
+
+
+class LeiturasSensor(Base):
+    """Modelo para leituras dos sensores IoT (série temporal)"""
+    __tablename__ = 'leituras_sensor'
+    __table_args__ = (
+        # Consultas são sempre por dispositivo e intervalo de tempo
+        Index('ix_leituras_sensor_dispositivo_timestamp', 'dispositivo', 'timestamp'),
+    )
+
+    id = Column(Integer, Identity(start=1, cycle=False), primary_key=True)
+    dispositivo = Column(String(100), nullable=False)
+    timestamp = Column(DateTime, nullable=False)
+    umidade = Column(Float, nullable=False)
+    ph = Column(Float, nullable=False)
+    temperatura = Column(Float, nullable=True)
+    fosforo_presente = Column(Boolean, nullable=False)
+    potassio_presente = Column(Boolean, nullable=False)
+    bomba_ligada = Column(Boolean, nullable=False)
+    
+    def __repr__(self):
+        return f"<LeituraSensor(dispositivo='{self.dispositivo}', timestamp={self.timestamp}, umidade={self.umidade})>"
@@ -4,5 +4,24 @@ Integração com sensores ESP32 e sistema de irrigação
 """
 
 from .sensor_handler import SensorHandler, SensorData
+from .historico_colunar import HistoricoColunar
+from .armazem_sensores import ArmazemSensores
+from .simulador import GeradorSensores
+from .log_persistente import LogSensores
+from .compressao import HistoricoComprimido, OrcamentoBytes
+from .regras_alerta import RegraAlerta, TabelaRegras
+from .servidor_ingestao import ServidorIngestao
 
-__all__ = ['SensorHandler', 'SensorData']
+__all__ = [
+    'SensorHandler',
+    'SensorData',
+    'HistoricoColunar',
+    'ArmazemSensores',
+    'GeradorSensores',
+    'LogSensores',
+    'HistoricoComprimido',
+    'OrcamentoBytes',
+    'RegraAlerta',
+    'TabelaRegras',
+    'ServidorIngestao'
+]
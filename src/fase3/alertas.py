@@ -0,0 +1,163 @@
+"""
+Máquina de estados dos alertas de sensores
+Cada tipo de alerta transita entre OK, ATENÇÃO e CRÍTICO com histerese;
+apenas as transições geram notificação
+"""
+
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+
+OK, ATENCAO, CRITICO = 0, 1, 2
+NOMES_ESTADO = ('OK', 'ATENÇÃO', 'CRÍTICO')
+
+
+@dataclass(frozen=True)
+class TipoAlerta:
+    """
+    Definição de um tipo de alerta sobre um campo da leitura
+
+    O nível é ativado ao cruzar o limiar e só é desativado quando o valor
+    volta além do limiar somado à histerese, evitando alertas oscilando
+    em torno do limite.
+    """
+    nome: str
+    campo: str  # Atributo de SensorData (booleanos valem 0/1)
+    abaixo: bool  # True = alerta quando o valor fica abaixo do limiar
+    limiar_atencao: Optional[float]  # None = tipo só com nível crítico
+    mensagem_atencao: str  # Aceita {valor}
+    limiar_critico: Optional[float] = None
+    mensagem_critico: Optional[str] = None
+    histerese: float = 0.0
+
+    def avaliar(self, valor: float, estado: int) -> int:
+        """Retorna o novo estado para o valor lido, dado o estado atual"""
+        novo = OK
+        for nivel, limiar in ((ATENCAO, self.limiar_atencao), (CRITICO, self.limiar_critico)):
+            if limiar is None:
+                continue
+            if self.abaixo:
+                ativo = valor < limiar or (estado >= nivel and valor < limiar + self.histerese)
+            else:
+                ativo = valor > limiar or (estado >= nivel and valor > limiar - self.histerese)
+            if ativo:
+                novo = nivel
+        return novo
+
+    def mensagem(self, estado: int, valor: float) -> str:
+        modelo = self.mensagem_critico if estado == CRITICO else self.mensagem_atencao
+        return modelo.format(valor=valor)
+
+
+def tipos_alerta_anomalia(metricas) -> List[TipoAlerta]:
+    """Tipos de alerta para os escores normalizados de DetectorAnomalias"""
+    return [
+        TipoAlerta(f'anomalia_{m}', f'anomalia_{m}', False, 1.0,
+                   f"⚠️ Anomalia detectada em {m} (escore {{valor:.1f}})")
+        for m in metricas
+    ]
+
+
+def tipos_alerta_monitoramento(metricas, leituras_travamento: int,
+                               tolerancia_silencio: float = 3.0,
+                               tolerancia_silencio_critica: float = 10.0) -> List[TipoAlerta]:
+    """
+    Tipos de alerta para dispositivo sem enviar dados e sensores travados
+
+    Args:
+        metricas: Métricas com detector de travamento (campo travado_<métrica>
+            = leituras idênticas seguidas)
+        leituras_travamento: Repetições a partir das quais o sensor está travado
+        tolerancia_silencio: Silêncio, em múltiplos do intervalo de envio
+            esperado (campo 'silencio'), que gera ATENÇÃO
+        tolerancia_silencio_critica: Idem para CRÍTICO
+    """
+    return [
+        TipoAlerta('sem_dados', 'silencio', False, tolerancia_silencio,
+                   "⚠️ ATENÇÃO: Dispositivo sem enviar dados ({valor:.0f}x o intervalo esperado)",
+                   limiar_critico=tolerancia_silencio_critica,
+                   mensagem_critico=("⚠️ CRÍTICO: Dispositivo sem enviar dados "
+                                     "({valor:.0f}x o intervalo esperado)")),
+    ] + [
+        TipoAlerta(f'travado_{m}', f'travado_{m}', False, leituras_travamento - 0.5,
+                   f"⚠️ Sensor de {m} travado ({{valor:.0f}} leituras iguais)")
+        for m in metricas
+    ]
+
+
+class MaquinaAlertas:
+    """
+    Estado corrente de cada tipo de alerta de um dispositivo
+
+    Uma transição para um estado de alerta é notificada se for uma
+    escalada além do último nível notificado ou se já tiver passado
+    `intervalo_renotificacao` segundos desde a última notificação do tipo.
+    Retornos a OK apenas atualizam o estado.
+    """
+
+    INTERVALO_RENOTIFICACAO = 15 * 60  # segundos
+
+    def __init__(self, tipos: List[TipoAlerta],
+                 intervalo_renotificacao: Optional[float] = None):
+        self.tipos = tipos
+        self.intervalo_renotificacao = (
+            self.INTERVALO_RENOTIFICACAO if intervalo_renotificacao is None
+            else intervalo_renotificacao
+        )
+        self.estados: Dict[str, int] = {t.nome: OK for t in tipos}
+        self._notificado: Dict[str, Tuple[int, float]] = {}
+
+    def definir_tipos(self, tipos: List[TipoAlerta]):
+        """Troca os tipos de alerta, mantendo o estado dos que continuam"""
+        self.tipos = tipos
+        self.estados = {t.nome: self.estados.get(t.nome, OK) for t in tipos}
+        self._notificado = {nome: v for nome, v in self._notificado.items()
+                            if nome in self.estados}
+
+    def avaliar(self, leitura, agora: Optional[float] = None,
+                extras: Optional[Dict[str, float]] = None) -> Tuple[List[str], List[str]]:
+        """
+        Atualiza os estados com uma leitura
+
+        Avaliar a mesma leitura novamente não altera os estados.
+
+        Args:
+            leitura: Objeto com os campos dos tipos (ex.: SensorData)
+            agora: Instante (time.monotonic) para o intervalo de renotificação
+            extras: Valores adicionais por campo (têm precedência sobre a
+                leitura), como os escores de anomalia
+
+        Returns:
+            (mensagens dos alertas ativos, mensagens a notificar)
+        """
+        agora = time.monotonic() if agora is None else agora
+        ativos, notificar = [], []
+        for tipo in self.tipos:
+            if extras and tipo.campo in extras:
+                valor = extras[tipo.campo]
+            else:
+                valor = getattr(leitura, tipo.campo, None)
+            if valor is None:
+                continue
+            anterior = self.estados[tipo.nome]
+            estado = tipo.avaliar(float(valor), anterior)
+            self.estados[tipo.nome] = estado
+            if estado == OK:
+                continue
+
+            mensagem = tipo.mensagem(estado, valor)
+            ativos.append(mensagem)
+            if estado == anterior:
+                continue
+
+            nivel_notificado, instante = self._notificado.get(tipo.nome, (OK, None))
+            if (estado > nivel_notificado or instante is None
+                    or agora - instante >= self.intervalo_renotificacao):
+                notificar.append(mensagem)
+                self._notificado[tipo.nome] = (estado, agora)
+        return ativos, notificar
+
+    def obter_estado(self) -> Dict[str, str]:
+        """Estado corrente de cada tipo de alerta ('OK', 'ATENÇÃO', 'CRÍTICO')"""
+        return {nome: NOMES_ESTADO[estado] for nome, estado in self.estados.items()}
@@ -0,0 +1,352 @@
+"""
+Detecção de anomalias em tempo real nas leituras de solo
+EWMA (média/variância exponenciais) com z-score, mediana/MAD em janela fixa
+e sensores travados (mesmo valor repetido)
+"""
+
+import math
+import statistics
+from collections import deque
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+
+
+# Escala mínima por métrica para o MAD (evita divisão por zero em sinais
+# quantizados, como o pH com duas casas)
+ESCALA_MINIMA = {
+    'umidade': 0.5,
+    'ph': 0.05,
+    'temperatura': 0.2,
+}
+
+# Fator que torna o MAD comparável ao desvio-padrão de uma normal
+_FATOR_MAD = 1.4826
+
+
+def _recorrencia(entradas: np.ndarray, phi: float, inicial: float) -> np.ndarray:
+    """
+    y[t] = phi * y[t-1] + entradas[t] sem laço por elemento
+
+    A série é dividida em blocos curtos (phi^-k abaixo de 1e4, limitando a
+    perda de precisão da forma fechada) resolvidos todos de uma vez a
+    partir de zero; depois o valor final de cada bloco é propagado ao
+    seguinte com uma recorrência escalar por bloco.
+    """
+    n = len(entradas)
+    if phi <= 0 or not n:
+        return np.array(entradas, dtype=np.float64)
+    tamanho = 4096 if phi >= 1 else max(1, min(4096, int(math.log(1e4) / -math.log(phi))))
+    blocos = -(-n // tamanho)
+
+    matriz = np.zeros(blocos * tamanho)
+    matriz[:n] = entradas
+    matriz = matriz.reshape(blocos, tamanho)
+    potencias = phi ** np.arange(1, tamanho + 1)
+    local = potencias * np.cumsum(matriz / potencias, axis=1)
+
+    # Valor de y imediatamente antes de cada bloco
+    antes = np.empty(blocos)
+    y, fator = inicial, potencias[-1]
+    for b in range(blocos):
+        antes[b] = y
+        y = fator * y + local[b, -1]
+    return (local + antes[:, None] * potencias).ravel()[:n]
+
+
+class DetectorEWMA:
+    """
+    Média e variância exponencialmente ponderadas de uma métrica
+
+    O z-score de cada leitura é calculado contra o estado anterior a ela.
+    Memória e custo constantes por leitura.
+    """
+
+    __slots__ = ('alfa', 'aquecimento', 'n', 'media', 'variancia', 'ultimo_z')
+
+    def __init__(self, alfa: float = 0.05, aquecimento: int = 20):
+        """
+        Args:
+            alfa: Peso da leitura nova (0-1); menor = memória mais longa
+            aquecimento: Leituras antes de emitir z-scores
+        """
+        self.alfa = alfa
+        self.aquecimento = aquecimento
+        self.n = 0
+        self.media = 0.0
+        self.variancia = 0.0
+        self.ultimo_z = 0.0
+
+    def atualizar(self, valor: float) -> float:
+        """Incorpora uma leitura e retorna o z-score dela (0 no aquecimento)"""
+        if self.n == 0:
+            self.n, self.media, self.ultimo_z = 1, valor, 0.0
+            return 0.0
+        desvio = valor - self.media
+        z = 0.0
+        if self.n >= self.aquecimento and self.variancia > 0:
+            z = desvio / math.sqrt(self.variancia)
+        self.media += self.alfa * desvio
+        self.variancia = (1 - self.alfa) * (self.variancia + self.alfa * desvio * desvio)
+        self.n += 1
+        self.ultimo_z = z
+        return z
+
+    def atualizar_lote(self, valores: np.ndarray) -> np.ndarray:
+        """Versão vetorizada de atualizar (mesmo resultado, leitura a leitura)"""
+        valores = np.asarray(valores, dtype=np.float64)
+        if not len(valores):
+            return np.empty(0)
+        if self.n == 0:
+            z_primeiro = self.atualizar(float(valores[0]))
+            return np.concatenate([[z_primeiro], self.atualizar_lote(valores[1:])])
+
+        a, phi = self.alfa, 1 - self.alfa
+        medias = _recorrencia(a * valores, phi, self.media)
+        anteriores = np.concatenate([[self.media], medias[:-1]])
+        desvios = valores - anteriores
+        variancias = _recorrencia(phi * a * desvios ** 2, phi, self.variancia)
+        variancias_anteriores = np.concatenate([[self.variancia], variancias[:-1]])
+
+        contagem = self.n + np.arange(len(valores))
+        validos = (contagem >= self.aquecimento) & (variancias_anteriores > 0)
+        z = np.zeros(len(valores))
+        z[validos] = desvios[validos] / np.sqrt(variancias_anteriores[validos])
+
+        self.media = float(medias[-1])
+        self.variancia = float(variancias[-1])
+        self.n += len(valores)
+        self.ultimo_z = float(z[-1])
+        return z
+
+    def estado(self) -> Dict:
+        return {
+            'leituras': self.n,
+            'media': self.media,
+            'desvio': math.sqrt(self.variancia),
+            'z': self.ultimo_z,
+        }
+
+
+class DetectorMAD:
+    """
+    Escore robusto (x - mediana) / (1.4826 * MAD) em uma janela fixa
+
+    A janela é pequena e de tamanho fixo, então memória e custo por leitura
+    são constantes. O escore de cada leitura usa a janela anterior a ela.
+    """
+
+    __slots__ = ('janela', 'escala_minima', '_valores', 'ultimo_escore')
+
+    def __init__(self, janela: int = 15, escala_minima: float = 0.0):
+        """
+        Args:
+            janela: Número de leituras anteriores consideradas
+            escala_minima: Piso da escala robusta
+        """
+        self.janela = janela
+        self.escala_minima = escala_minima
+        self._valores = deque(maxlen=janela)
+        self.ultimo_escore = 0.0
+
+    def _escala(self, mad: float) -> float:
+        return max(_FATOR_MAD * mad, self.escala_minima) or 1e-12
+
+    def atualizar(self, valor: float) -> float:
+        """Incorpora uma leitura e retorna o escore dela (0 até encher a janela)"""
+        escore = 0.0
+        if len(self._valores) == self.janela:
+            mediana = statistics.median(self._valores)
+            mad = statistics.median(abs(v - mediana) for v in self._valores)
+            escore = (valor - mediana) / self._escala(mad)
+        self._valores.append(valor)
+        self.ultimo_escore = escore
+        return escore
+
+    def atualizar_lote(self, valores: np.ndarray) -> np.ndarray:
+        """Versão vetorizada de atualizar (janelas deslizantes em bloco)"""
+        valores = np.asarray(valores, dtype=np.float64)
+        if not len(valores):
+            return np.empty(0)
+        serie = np.concatenate([np.array(self._valores, dtype=np.float64), valores])
+        anteriores = len(self._valores)
+        escores = np.zeros(len(valores))
+
+        # Leitura i do lote usa serie[i + anteriores - janela : i + anteriores]
+        primeiro = max(0, self.janela - anteriores)
+        if primeiro < len(valores):
+            janelas = np.lib.stride_tricks.sliding_window_view(serie[:-1], self.janela)
+            janelas = janelas[primeiro + anteriores - self.janela:]
+            medianas = np.median(janelas, axis=1)
+            mad = np.median(np.abs(janelas - medianas[:, None]), axis=1)
+            escala = np.maximum(_FATOR_MAD * mad, self.escala_minima)
+            escala[escala == 0] = 1e-12
+            escores[primeiro:] = (valores[primeiro:] - medianas) / escala
+
+        self._valores.extend(valores[-self.janela:].tolist())
+        self.ultimo_escore = float(escores[-1])
+        return escores
+
+    def estado(self) -> Dict:
+        valores = np.array(self._valores)
+        if not len(valores):
+            return {'mediana': None, 'mad': None, 'escore': self.ultimo_escore}
+        mediana = float(np.median(valores))
+        return {
+            'mediana': mediana,
+            'mad': float(np.median(np.abs(valores - mediana))),
+            'escore': self.ultimo_escore,
+        }
+
+
+class DetectorConstante:
+    """
+    Sequência de leituras idênticas ao final da série (variância zero)
+
+    Um sensor travado repete exatamente o mesmo valor; basta contar as
+    repetições da última leitura, com memória e custo constantes.
+    """
+
+    __slots__ = ('ultimo', 'repeticoes')
+
+    def __init__(self):
+        self.ultimo: Optional[float] = None
+        self.repeticoes = 0
+
+    def atualizar(self, valor: float) -> int:
+        """Incorpora uma leitura e retorna quantas leituras iguais terminam nela"""
+        if valor == self.ultimo:
+            self.repeticoes += 1
+        else:
+            self.ultimo = valor
+            self.repeticoes = 1
+        return self.repeticoes
+
+    def atualizar_lote(self, valores: np.ndarray) -> int:
+        """Versão vetorizada de atualizar (mesmo estado final)"""
+        valores = np.asarray(valores, dtype=np.float64)
+        if not len(valores):
+            return self.repeticoes
+        mudancas = np.flatnonzero(valores[1:] != valores[:-1])
+        ultimo = float(valores[-1])
+        if len(mudancas):
+            self.repeticoes = len(valores) - 1 - int(mudancas[-1])
+        elif ultimo == self.ultimo:
+            self.repeticoes += len(valores)
+        else:
+            self.repeticoes = len(valores)
+        self.ultimo = ultimo
+        return self.repeticoes
+
+
+class DetectorAnomalias:
+    """
+    Detectores por métrica de um dispositivo
+
+    Cada métrica tem um DetectorEWMA e, se `usar_mad`, também um DetectorMAD.
+    O escore normalizado de uma leitura é o maior entre |z| / limiar_z e
+    |escore MAD| / limiar_mad; acima de 1 a leitura é anômala. Um
+    DetectorConstante por métrica conta as leituras idênticas mais
+    recentes; a partir de `leituras_travamento` o sensor é considerado
+    travado.
+    """
+
+    LEITURAS_TRAVAMENTO = 30
+
+    METRICAS = ('umidade', 'ph')
+
+    def __init__(self, metricas: Optional[Sequence[str]] = None,
+                 alfa: float = 0.05, limiar_z: float = 4.0,
+                 usar_mad: bool = False, janela_mad: int = 15,
+                 limiar_mad: float = 5.0, leituras_travamento: Optional[int] = None):
+        """
+        Args:
+            metricas: Colunas monitoradas (padrão: umidade e pH)
+            alfa: Peso da leitura nova no EWMA
+            limiar_z: |z| a partir do qual o EWMA acusa anomalia
+            usar_mad: Ativa o detector robusto por mediana/MAD
+            janela_mad: Leituras na janela do MAD
+            limiar_mad: |escore| a partir do qual o MAD acusa anomalia
+            leituras_travamento: Leituras idênticas seguidas que indicam
+                sensor travado
+        """
+        self.metricas = tuple(metricas or self.METRICAS)
+        self.limiar_z = limiar_z
+        self.limiar_mad = limiar_mad
+        self.ewma = {m: DetectorEWMA(alfa) for m in self.metricas}
+        self.mad = {
+            m: DetectorMAD(janela_mad, ESCALA_MINIMA.get(m, 0.0)) for m in self.metricas
+        } if usar_mad else {}
+        self.escores: Dict[str, float] = {m: 0.0 for m in self.metricas}
+        self.leituras_travamento = leituras_travamento or self.LEITURAS_TRAVAMENTO
+        self.constante = {m: DetectorConstante() for m in self.metricas}
+
+    def atualizar(self, valores: Dict[str, Optional[float]]) -> Dict[str, float]:
+        """
+        Incorpora uma leitura
+
+        Args:
+            valores: Métrica -> valor (None/NaN = ausente, ignorado)
+
+        Returns:
+            Métrica -> escore normalizado da leitura
+        """
+        for m in self.metricas:
+            valor = valores.get(m)
+            if valor is None or valor != valor:
+                continue
+            self.constante[m].atualizar(valor)
+            escore = abs(self.ewma[m].atualizar(valor)) / self.limiar_z
+            if m in self.mad:
+                escore = max(escore, abs(self.mad[m].atualizar(valor)) / self.limiar_mad)
+            self.escores[m] = escore
+        return dict(self.escores)
+
+    def atualizar_lote(self, colunas: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+        """
+        Incorpora um lote (vetorizado)
+
+        Returns:
+            Métrica -> escore normalizado por leitura (NaN onde ausente)
+        """
+        saida = {}
+        for m in self.metricas:
+            valores = np.asarray(colunas[m], dtype=np.float64)
+            presentes = ~np.isnan(valores)
+            escores = np.full(len(valores), np.nan)
+            if presentes.any():
+                v = valores[presentes]
+                self.constante[m].atualizar_lote(v)
+                escore = np.abs(self.ewma[m].atualizar_lote(v)) / self.limiar_z
+                if m in self.mad:
+                    escore = np.maximum(escore, np.abs(self.mad[m].atualizar_lote(v)) / self.limiar_mad)
+                escores[presentes] = escore
+                self.escores[m] = float(escore[-1])
+            saida[m] = escores
+        return saida
+
+    def anomalias(self) -> Dict[str, bool]:
+        """Métrica -> se a última leitura foi anômala"""
+        return {m: e > 1.0 for m, e in self.escores.items()}
+
+    def repeticoes(self) -> Dict[str, int]:
+        """Métrica -> leituras idênticas seguidas até a última"""
+        return {m: d.repeticoes for m, d in self.constante.items()}
+
+    def travados(self) -> Dict[str, bool]:
+        """Métrica -> se o sensor está repetindo o mesmo valor (travado)"""
+        return {m: d.repeticoes >= self.leituras_travamento for m, d in self.constante.items()}
+
+    def estado(self) -> Dict[str, Dict]:
+        """Estado dos detectores por métrica (para inspeção)"""
+        return {
+            m: {
+                'escore': self.escores[m],
+                'anomalia': self.escores[m] > 1.0,
+                'repeticoes': self.constante[m].repeticoes,
+                'travado': self.constante[m].repeticoes >= self.leituras_travamento,
+                'ewma': self.ewma[m].estado(),
+                'mad': self.mad[m].estado() if m in self.mad else None,
+            }
+            for m in self.metricas
+        }
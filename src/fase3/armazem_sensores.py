@@ -0,0 +1,592 @@
+"""
+Armazenamento de leituras de múltiplos dispositivos IoT
+Um SensorHandler por dispositivo, cada um com seu próprio lock de escrita
+"""
+
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .compressao import OrcamentoBytes
+from .estatisticas import EstatisticasSensores
+from .historico_colunar import COLUNAS, datetime_para_us, us_para_datetime, US_POR_SEGUNDO
+from .interpolacao_espacial import GradeInterpolada
+from .monitor_atividade import MonitorAtividade
+from .previsao_umidade import PrevisorUmidade
+from .reamostragem import reamostrar
+from .regras_alerta import TabelaRegras
+from .sketches import DDSketch, QUANTIS_PADRAO
+from .sensor_handler import SensorHandler, SensorData
+
+
+class ArmazemSensores:
+    """
+    Conjunto de shards de sensores indexados por dispositivo
+
+    Cada dispositivo (ESP8266, identificado pelo deviceId da telemetria)
+    tem seu próprio SensorHandler com última leitura, histórico,
+    estatísticas e alertas. Cada SensorHandler serializa as próprias
+    escritas (_lock_escrita), então threads ingerindo dispositivos
+    diferentes não disputam lock algum. Consultas não usam esse lock: leem
+    o instantâneo publicado por cada SensorHandler, sem bloquear a
+    ingestão. Os prazos de próximo envio de
+    todos os dispositivos ficam em um MonitorAtividade, que encontra os
+    dispositivos silenciosos sem percorrer os demais. Dispositivos com
+    posição conhecida alimentam grades de interpolação por talhão,
+    atualizadas apenas com os dispositivos que receberam leituras. As
+    leituras que saem do histórico em memória dos shards ficam em blocos
+    comprimidos sob um único OrcamentoBytes, então o limite de memória vale
+    para o armazém inteiro e não cresce com o número de dispositivos.
+    """
+
+    CAPACIDADE_POR_DISPOSITIVO = 10_000
+    LARGURA_BUCKET_JANELAS = 300  # Buckets de 5 min para reduzir memória por shard
+    MAXIMO_BYTES_COMPRIMIDOS = 512 * 1024 * 1024  # Todos os dispositivos juntos
+
+    def __init__(self, capacidade_por_dispositivo: Optional[int] = None,
+                 atraso_permitido: Optional[float] = None,
+                 maximo_bytes_comprimidos: Optional[int] = None):
+        """
+        Inicializa o armazém
+
+        Args:
+            capacidade_por_dispositivo: Leituras mantidas em memória por dispositivo
+            atraso_permitido: Atraso máximo (s) aceito por dispositivo em
+                relação à sua leitura mais recente (ver SensorHandler)
+            maximo_bytes_comprimidos: Memória máxima dos blocos comprimidos
+                de todos os dispositivos; acima dela os blocos mais antigos
+                do armazém são descartados
+        """
+        self.atraso_permitido = atraso_permitido
+        self.orcamento_compressao = OrcamentoBytes(
+            maximo_bytes_comprimidos or self.MAXIMO_BYTES_COMPRIMIDOS
+        )
+        self.capacidade_por_dispositivo = (
+            capacidade_por_dispositivo or self.CAPACIDADE_POR_DISPOSITIVO
+        )
+        self._lock_registro = threading.Lock()
+        self._shards: Dict[str, SensorHandler] = {}
+        self._talhoes: Dict[str, str] = {}
+        self._culturas: Dict[str, str] = {}
+        self.regras: Optional[TabelaRegras] = None
+        self._atividade = MonitorAtividade()
+        self._lock_atividade = threading.Lock()
+        self._posicoes: Dict[str, Tuple[float, float]] = {}
+        # Talhão (None = todos) -> dispositivos alterados desde a última atualização da grade
+        self._alterados: Dict[Optional[str], set] = {}
+        self._grades: Dict[Optional[str], GradeInterpolada] = {}
+        self._lock_grades = threading.Lock()
+        self._previsor = PrevisorUmidade()
+        self._lock_previsao = threading.Lock()
+
+    def _criar_shard(self, dispositivo: str, talhao: Optional[str]) -> SensorHandler:
+        """Cria o shard sob o lock de registro (apenas na primeira leitura)"""
+        with self._lock_registro:
+            shard = self._shards.get(dispositivo)
+            if shard is None:
+                shard = SensorHandler(
+                    capacidade=self.capacidade_por_dispositivo,
+                    dispositivo_id=dispositivo,
+                    largura_bucket_janelas=self.LARGURA_BUCKET_JANELAS,
+                    atraso_permitido=self.atraso_permitido,
+                    # Dispositivos do armazém enviam telemetria periódica
+                    monitorar_silencio=True,
+                    orcamento_compressao=self.orcamento_compressao
+                )
+                self._shards[dispositivo] = shard
+            if talhao is not None:
+                self._talhoes[dispositivo] = talhao
+            self._aplicar_regras(dispositivo, shard)
+            return shard
+
+    def registrar_shard(self, dispositivo: str, shard: SensorHandler,
+                        talhao: Optional[str] = None):
+        """
+        Inclui um SensorHandler já existente como shard do dispositivo
+
+        Permite consultar pelo armazém (resumos, reamostragem, backtest)
+        um handler alimentado por outro caminho, como o do dashboard. As
+        leituras continuam entrando diretamente no handler.
+
+        Raises:
+            ValueError: Se o dispositivo já tiver um shard
+        """
+        with self._lock_registro:
+            if dispositivo in self._shards:
+                raise ValueError(f"Dispositivo já registrado: {dispositivo}")
+            self._shards[dispositivo] = shard
+            if talhao is not None:
+                self._talhoes[dispositivo] = talhao
+            self._aplicar_regras(dispositivo, shard)
+
+    def _aplicar_regras(self, dispositivo: str, shard: SensorHandler):
+        """Alertas do shard com as regras efetivas no seu talhão e cultura"""
+        if self.regras is None:
+            return
+        talhao = self._talhoes.get(dispositivo)
+        shard.definir_regras(self.regras, talhao, self._culturas.get(talhao))
+
+    def definir_regras(self, regras: TabelaRegras):
+        """
+        Define a tabela de regras de todos os dispositivos
+
+        Cada shard passa a alertar com as regras efetivas para o seu
+        dispositivo, talhão e cultura (ver TabelaRegras.tipos_alerta), e a
+        tabela vira o padrão de avaliar_regras.
+        """
+        with self._lock_registro:
+            self.regras = regras
+            for dispositivo, shard in self._shards.items():
+                self._aplicar_regras(dispositivo, shard)
+
+    def obter_shard(self, dispositivo: str, talhao: Optional[str] = None) -> SensorHandler:
+        """
+        Retorna o SensorHandler do dispositivo, criando-o se necessário
+
+        Args:
+            dispositivo: Identificador do dispositivo
+            talhao: Talhão onde o dispositivo está instalado (opcional)
+
+        Returns:
+            SensorHandler do dispositivo
+        """
+        shard = self._shards.get(dispositivo)
+        if shard is None or (talhao is not None and self._talhoes.get(dispositivo) != talhao):
+            shard = self._criar_shard(dispositivo, talhao)
+        return shard
+
+    def adicionar_leitura(self, dispositivo: str, umidade: float, ph: float,
+                          fosforo: bool, potassio: bool,
+                          temperatura: Optional[float] = None,
+                          talhao: Optional[str] = None,
+                          timestamp: Optional[datetime] = None) -> Optional[SensorData]:
+        """
+        Adiciona uma leitura ao shard do dispositivo
+
+        Args:
+            dispositivo: Identificador do dispositivo
+            umidade: Umidade do solo (%)
+            ph: pH do solo
+            fosforo: Presença de fósforo
+            potassio: Presença de potássio
+            temperatura: Temperatura ambiente (opcional)
+            talhao: Talhão do dispositivo (opcional)
+            timestamp: Momento da medição no dispositivo (padrão: agora)
+
+        Returns:
+            SensorData criado (None se recusado pela marca d'água)
+        """
+        shard = self.obter_shard(dispositivo, talhao)
+        leitura = shard.adicionar_leitura(umidade, ph, fosforo, potassio, temperatura,
+                                          timestamp)
+        self._registrar_envio(dispositivo, shard)
+        return leitura
+
+    def adicionar_leituras_lote(self, dados, dispositivos=None) -> int:
+        """
+        Distribui um lote de leituras de vários dispositivos entre os shards
+
+        O lote é ordenado por dispositivo uma única vez e cada fatia é
+        entregue ao SensorHandler.adicionar_leituras_lote do shard.
+
+        Args:
+            dados: DataFrame ou dicionário de arrays (ver
+                SensorHandler.adicionar_leituras_lote)
+            dispositivos: Identificador do dispositivo por leitura
+                (padrão: coluna 'dispositivo' de `dados`)
+
+        Returns:
+            Número de leituras adicionadas (sem as recusadas pela marca d'água)
+        """
+        ids = np.asarray(dados['dispositivo'] if dispositivos is None else dispositivos)
+        if not len(ids):
+            return 0
+
+        unicos, inverso = np.unique(ids, return_inverse=True)
+        ordem = np.argsort(inverso, kind='stable')
+        limites = np.searchsorted(inverso[ordem], np.arange(len(unicos) + 1))
+        colunas = {
+            nome: np.asarray(dados[nome])[ordem]
+            for nome in ('timestamp', 'umidade', 'ph', 'fosforo', 'potassio', 'temperatura')
+            if nome in dados
+        }
+
+        adicionadas = 0
+        for i, dispositivo in enumerate(unicos.tolist()):
+            inicio, fim = limites[i], limites[i + 1]
+            shard = self.obter_shard(dispositivo)
+            adicionadas += shard.adicionar_leituras_lote(
+                {nome: valores[inicio:fim] for nome, valores in colunas.items()}
+            )
+            self._registrar_envio(dispositivo, shard)
+        return adicionadas
+    
+    def _registrar_envio(self, dispositivo: str, shard: SensorHandler):
+        """Atualiza o prazo de próximo envio e marca o dispositivo para as grades"""
+        prazo = shard.prazo_envio()
+        if prazo is not None:
+            with self._lock_atividade:
+                self._atividade.registrar(dispositivo, prazo)
+        if dispositivo in self._posicoes:
+            self._marcar_alterado(dispositivo)
+    
+    def _marcar_alterado(self, dispositivo: str):
+        with self._lock_grades:
+            for chave in {None, self._talhoes.get(dispositivo)}:
+                if chave in self._grades:
+                    self._alterados.setdefault(chave, set()).add(dispositivo)
+    
+    def definir_posicoes(self, posicoes: Dict[str, Tuple[float, float]]):
+        """
+        Registra a posição (latitude, longitude) de dispositivos
+        
+        Apenas posições novas ou alteradas marcam o dispositivo para
+        atualização das grades de interpolação.
+        """
+        for dispositivo, posicao in posicoes.items():
+            posicao = (float(posicao[0]), float(posicao[1]))
+            if self._posicoes.get(dispositivo) != posicao:
+                self._posicoes[dispositivo] = posicao
+                self._marcar_alterado(dispositivo)
+    
+    def definir_posicao(self, dispositivo: str, latitude: float, longitude: float):
+        """Registra a posição de um dispositivo (ver definir_posicoes)"""
+        self.definir_posicoes({dispositivo: (latitude, longitude)})
+    
+    def _valores_recentes(self, dispositivos: List[str]):
+        """Posições e últimos valores das métricas interpoladas"""
+        latitudes = np.array([self._posicoes[d][0] for d in dispositivos])
+        longitudes = np.array([self._posicoes[d][1] for d in dispositivos])
+        leituras = [self._shards[d].obter_ultima_leitura() if d in self._shards else None
+                    for d in dispositivos]
+        valores = {
+            metrica: np.array([np.nan if l is None or getattr(l, metrica) is None
+                               else getattr(l, metrica) for l in leituras], dtype=np.float64)
+            for metrica in ('umidade', 'temperatura')
+        }
+        return latitudes, longitudes, valores
+    
+    def _atualizar_grade(self, talhao: Optional[str]) -> Optional[GradeInterpolada]:
+        """Aplica à grade do talhão os dispositivos alterados (sob _lock_grades)"""
+        grade = self._grades.get(talhao)
+        if grade is None:
+            pendentes = [d for d in self.dispositivos(talhao) if d in self._posicoes]
+        else:
+            pendentes = [d for d in self._alterados.pop(talhao, ()) if d in self._posicoes]
+        if not pendentes:
+            return grade
+        
+        latitudes, longitudes, valores = self._valores_recentes(pendentes)
+        if grade is not None and not grade.cobre(latitudes, longitudes).all():
+            # Dispositivo fora da área coberta: a grade é refeita com todos
+            grade = None
+            pendentes = [d for d in self.dispositivos(talhao) if d in self._posicoes]
+            latitudes, longitudes, valores = self._valores_recentes(pendentes)
+        if grade is None:
+            grade = GradeInterpolada(latitudes, longitudes)
+            self._grades[talhao] = grade
+            self._alterados[talhao] = set()
+        grade.atualizar(pendentes, latitudes, longitudes, valores)
+        return grade
+    
+    def obter_grade(self, talhao: Optional[str] = None, metrica: str = 'umidade') -> Dict:
+        """
+        Mapa interpolado (IDW) de umidade ou temperatura do talhão
+        
+        A grade é mantida entre chamadas: cada consulta incorpora apenas os
+        dispositivos que receberam leituras ou mudaram de posição desde a
+        anterior, recalculando só as células no raio deles.
+        
+        Args:
+            talhao: Talhão (None = todos os dispositivos com posição)
+            metrica: 'umidade' ou 'temperatura'
+            
+        Returns:
+            Dicionário com 'latitude' (centro de cada linha), 'longitude'
+            (centro de cada coluna), 'valores' (linhas x colunas, NaN fora
+            do raio dos dispositivos) e 'dispositivos'; vazio se nenhum
+            dispositivo do talhão tiver posição
+        """
+        with self._lock_grades:
+            grade = self._atualizar_grade(talhao)
+            if grade is None:
+                return {}
+            latitudes, longitudes = grade.coordenadas()
+            return {
+                'latitude': latitudes,
+                'longitude': longitudes,
+                'valores': grade.valores(metrica),
+                'dispositivos': len(grade),
+            }
+    
+    def dispositivos_silenciosos(self, talhao: Optional[str] = None) -> Dict[str, float]:
+        """
+        Dispositivos que não enviam dados há mais que a tolerância
+        
+        Args:
+            talhao: Se informado, apenas dispositivos desse talhão
+            
+        Returns:
+            Dicionário dispositivo -> segundos de atraso além do prazo,
+            do mais atrasado ao menos atrasado
+        """
+        with self._lock_atividade:
+            vencidos = self._atividade.vencidos(time.monotonic())
+        if talhao is None:
+            return vencidos
+        return {d: atraso for d, atraso in vencidos.items() if self._talhoes.get(d) == talhao}
+    
+    def verificar_silenciosos(self, talhao: Optional[str] = None) -> Dict[str, List[str]]:
+        """
+        Verifica os alertas dos dispositivos silenciosos
+        
+        Para ser chamado periodicamente: dispositivos que pararam de enviar
+        não passam pelo caminho de ingestão, então é esta varredura que
+        leva o alerta de dispositivo sem dados até verificar_alertas.
+        
+        Returns:
+            Dicionário dispositivo -> alertas ativos
+        """
+        return {dispositivo: self.verificar_alertas(dispositivo)
+                for dispositivo in self.dispositivos_silenciosos(talhao)}
+
+    def obter_ultima_leitura(self, dispositivo: str) -> Optional[SensorData]:
+        """Retorna a última leitura do dispositivo (None se desconhecido)"""
+        shard = self._shards.get(dispositivo)
+        if shard is None:
+            return None
+        return shard.obter_ultima_leitura()
+
+    def obter_estatisticas(self, dispositivo: str) -> Dict:
+        """Retorna as estatísticas do dispositivo"""
+        shard = self._shards.get(dispositivo)
+        if shard is None:
+            return EstatisticasSensores().resumo()
+        return shard.obter_estatisticas()
+
+    def verificar_alertas(self, dispositivo: str) -> List[str]:
+        """Verifica alertas da última leitura do dispositivo"""
+        shard = self._shards.get(dispositivo)
+        if shard is None:
+            return []
+        return shard.verificar_alertas()
+
+    def obter_estado_anomalias(self, dispositivo: str) -> Dict[str, Dict]:
+        """Retorna o estado dos detectores de anomalia do dispositivo"""
+        shard = self._shards.get(dispositivo)
+        if shard is None:
+            return {}
+        return shard.obter_estado_anomalias()
+
+    def definir_cultura(self, talhao: str, cultura: str):
+        """Associa uma cultura a um talhão (escopo 'cultura' das regras)"""
+        with self._lock_registro:
+            self._culturas[talhao] = cultura
+            for dispositivo in self.dispositivos(talhao):
+                self._aplicar_regras(dispositivo, self._shards[dispositivo])
+
+    def avaliar_regras(self, regras: Optional[TabelaRegras] = None,
+                       talhao: Optional[str] = None) -> Dict:
+        """
+        Avalia regras sobre o histórico de todos os dispositivos em uma passada
+
+        Os históricos dos shards são concatenados e as regras (com limiares
+        por dispositivo, talhão ou cultura) são aplicadas ao conjunto.
+
+        Args:
+            regras: Tabela de regras (padrão: a de definir_regras)
+            talhao: Se informado, apenas dispositivos desse talhão
+
+        Returns:
+            Dicionário com 'dispositivo' e 'timestamp' por leitura,
+            'regras' (nome -> máscara), 'severidade' (0, 1, 2 por leitura) e
+            'resumo' (nome -> {dispositivo: leituras em alerta})
+        """
+        regras = regras or self.regras
+        if regras is None:
+            raise ValueError("Nenhuma tabela de regras definida")
+        partes, nomes = [], []
+        for dispositivo in self.dispositivos(talhao):
+            partes.append(self._shards[dispositivo].obter_historico())
+            nomes.append(dispositivo)
+
+        if partes:
+            colunas = {nome: np.concatenate([p[nome] for p in partes]) for nome in partes[0]}
+        else:
+            colunas = {nome: np.empty(0, dtype=dtype) for nome, dtype in COLUNAS.items()}
+        indices = np.repeat(np.arange(len(nomes)), [len(p['flags']) for p in partes])
+
+        mascaras = regras.avaliar(colunas, indices, dict(self._talhoes), self._culturas,
+                                  nomes_dispositivos=nomes)
+        return {
+            'dispositivo': np.array(nomes, dtype=object)[indices],
+            'timestamp': colunas['timestamp'],
+            'regras': mascaras,
+            'severidade': regras.severidade(mascaras),
+            'resumo': regras.resumir(mascaras, indices, nomes),
+        }
+
+    def obter_percentis(self, metrica: str = 'umidade', quantis=QUANTIS_PADRAO,
+                        inicio: Optional[datetime] = None, fim: Optional[datetime] = None,
+                        talhao: Optional[str] = None,
+                        dispositivos: Optional[List[str]] = None) -> Dict[float, Optional[float]]:
+        """
+        Percentis de uma métrica sobre um grupo de dispositivos
+
+        Mescla os sketches de cada shard (custo O(dispositivos), sem
+        percorrer leituras).
+
+        Args:
+            metrica: 'umidade', 'ph' ou 'temperatura' (esta apenas com intervalo)
+            quantis: Quantis desejados (0-1)
+            inicio, fim: Intervalo de tempo (padrão: histórico em memória)
+            talhao: Se informado, apenas dispositivos desse talhão
+            dispositivos: Lista explícita de dispositivos
+
+        Returns:
+            Dicionário quantil -> valor (None se não houver leituras)
+        """
+        partes = []
+        for dispositivo in dispositivos or self.dispositivos(talhao):
+            shard = self._shards.get(dispositivo)
+            if shard is not None:
+                partes.append(shard.obter_sketch(metrica, inicio, fim))
+        return DDSketch.combinar(partes).quantis(quantis)
+
+    def obter_uso_bomba(self, inicio: datetime, fim: Optional[datetime] = None,
+                        talhao: Optional[str] = None) -> Dict:
+        """
+        Uso das bombas por dispositivo e total em um período
+        
+        Args:
+            inicio: Início do período
+            fim: Fim do período (padrão: agora)
+            talhao: Se informado, apenas dispositivos desse talhão
+            
+        Returns:
+            Dicionário com 'dispositivos' (dispositivo -> uso, ver
+            SensorHandler.obter_uso_bomba), 'segundos_ligada' e
+            'acionamentos' somados
+        """
+        fim = fim or datetime.now()
+        por_dispositivo = {
+            dispositivo: self._shards[dispositivo].obter_uso_bomba(inicio, fim)
+            for dispositivo in self.dispositivos(talhao)
+        }
+        return {
+            'dispositivos': por_dispositivo,
+            'segundos_ligada': sum(u['segundos_ligada'] for u in por_dispositivo.values()),
+            'acionamentos': sum(u['acionamentos'] for u in por_dispositivo.values()),
+        }
+
+    def reamostrar(self, inicio: datetime, fim: datetime, intervalo: float,
+                   agregacoes: Optional[Dict[str, str]] = None,
+                   preenchimento: str = 'nenhum', lacuna_maxima: Optional[float] = None,
+                   talhao: Optional[str] = None,
+                   dispositivos: Optional[List[str]] = None,
+                   persistente: bool = False) -> Dict:
+        """
+        Reamostra as leituras de vários dispositivos na mesma grade regular
+
+        As leituras de todos os dispositivos são reamostradas em uma única
+        passada vetorizada (ver SensorHandler.reamostrar para os parâmetros).
+
+        Args:
+            talhao: Se informado, apenas dispositivos desse talhão
+            dispositivos: Lista explícita de dispositivos
+            persistente: Lê o que já saiu da memória do log/banco de cada
+                shard (SensorHandler.ler_intervalo)
+
+        Returns:
+            Dicionário com 'dispositivos' (ordem das linhas), 'timestamp',
+            'contagem' e uma grade (dispositivos x intervalos) por coluna
+        """
+        inicio_us, fim_us = datetime_para_us(inicio), datetime_para_us(fim)
+        nomes, partes = [], []
+        for dispositivo in dispositivos or self.dispositivos(talhao):
+            shard = self._shards.get(dispositivo)
+            if shard is not None:
+                nomes.append(dispositivo)
+                partes.append(shard.ler_intervalo(inicio, fim) if persistente
+                              else shard.obter_intervalo(inicio, fim))
+
+        if partes:
+            colunas = {nome: np.concatenate([p[nome] for p in partes]) for nome in COLUNAS}
+        else:
+            colunas = {nome: np.empty(0, dtype=dtype) for nome, dtype in COLUNAS.items()}
+        grupos = np.repeat(np.arange(len(partes)), [len(p['timestamp']) for p in partes])
+
+        resultado = reamostrar(
+            colunas, inicio_us, fim_us, int(intervalo * US_POR_SEGUNDO), agregacoes,
+            preenchimento,
+            None if lacuna_maxima is None else int(lacuna_maxima * US_POR_SEGUNDO),
+            grupos=grupos, n_grupos=len(partes)
+        )
+        resultado['dispositivos'] = nomes
+        return resultado
+
+    def prever_umidade(self, horas: float = 6.0, talhao: Optional[str] = None) -> Dict:
+        """
+        Prevê a umidade do solo de cada dispositivo nas próximas horas
+
+        Um único PrevisorUmidade acompanha todos os dispositivos: a cada
+        chamada, os intervalos fechados desde a anterior são reamostrados
+        de uma vez e incorporados, e os modelos dos dispositivos com dados
+        novos são reajustados em lote.
+
+        Args:
+            horas: Horizonte da previsão (até 6 h)
+            talhao: Se informado, apenas dispositivos desse talhão
+
+        Returns:
+            Dicionário com 'timestamp' (início de cada intervalo previsto),
+            'dispositivos' e 'umidade' (dispositivos x intervalos)
+        """
+        with self._lock_previsao:
+            previsor = self._previsor
+            inicio_us, fim_us = previsor.intervalos_pendentes(datetime_para_us(datetime.now()))
+            if fim_us > inicio_us:
+                grades = self.reamostrar(
+                    us_para_datetime(inicio_us), us_para_datetime(fim_us),
+                    previsor.passo, {'umidade': 'media'}
+                )
+                previsor.atualizar(grades['dispositivos'], inicio_us, grades['umidade'])
+            return previsor.prever(horas, self.dispositivos(talhao))
+
+    def dispositivos(self, talhao: Optional[str] = None) -> List[str]:
+        """
+        Lista os dispositivos conhecidos
+
+        Args:
+            talhao: Se informado, apenas dispositivos desse talhão
+
+        Returns:
+            Lista de identificadores
+        """
+        if talhao is None:
+            return list(self._shards)
+        return [d for d, t in list(self._talhoes.items()) if t == talhao]
+
+    def obter_resumo_geral(self, talhao: Optional[str] = None) -> Dict:
+        """
+        Consolida as estatísticas de todos os dispositivos
+
+        Combina os agregados já mantidos por shard (custo O(dispositivos),
+        sem percorrer leituras).
+
+        Args:
+            talhao: Se informado, apenas dispositivos desse talhão
+
+        Returns:
+            Dicionário no formato de SensorHandler.obter_estatisticas,
+            acrescido de 'total_dispositivos'
+        """
+        partes = [self._shards[dispositivo].obter_agregados()
+                  for dispositivo in self.dispositivos(talhao)]
+
+        resumo = EstatisticasSensores.combinar(partes).resumo()
+        resumo['total_dispositivos'] = len(partes)
+        return resumo
@@ -0,0 +1,302 @@
+"""
+Backtest de políticas de irrigação sobre o histórico de sensores
+Cada política é avaliada de uma vez sobre grades (dispositivos x passos)
+do histórico reamostrado, sem chamadas por leitura
+"""
+
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from .historico_colunar import US_POR_SEGUNDO
+from .rollups import RollupsSensores
+
+
+# Entradas das políticas: grades (dispositivos x passos) de 'umidade', 'ph',
+# 'temperatura' e 'bomba' (fração do passo com a bomba ligada, registrada)
+# e 'chuva' (chuva prevista em cada passo, um valor por passo)
+Grades = Dict[str, np.ndarray]
+COLUNAS_GRADE = ('umidade', 'ph', 'temperatura', 'bomba')
+
+
+@dataclass(frozen=True)
+class Politica:
+    """
+    Regra de irrigação avaliada sobre grades do histórico
+
+    `decidir` recebe as grades de um bloco de dispositivos e devolve uma
+    grade booleana (True = irrigar no passo). Passos sem umidade nunca
+    irrigam, qualquer que seja a decisão.
+    """
+    nome: str
+    decidir: Callable[[Grades], np.ndarray]
+
+
+def politica_limiar(handler) -> Politica:
+    """Regra de limiar de SensorHandler.decidir_irrigacao (umidade baixa e pH adequado ou ausente)"""
+    return Politica('limiar', lambda g: handler.decidir_irrigacao_lote(g['umidade'], g['ph']))
+
+
+def _prever_ml(modelo, nutrientes: float, g: Grades) -> np.ndarray:
+    umidade, temperatura = g['umidade'], g['temperatura']
+    decisao = np.zeros(umidade.shape, dtype=bool)
+    # O modelo não aceita valores ausentes: só os passos completos vão a ele
+    completos = ~(np.isnan(umidade) | np.isnan(temperatura))
+    if completos.any():
+        decisao[completos] = modelo.prever_arrays(
+            umidade[completos], temperatura[completos], nutrientes
+        )
+    return decisao
+
+
+def politica_ml(modelo, nutrientes: float) -> Politica:
+    """
+    Previsão do modelo de ML (MLModel.prever_arrays), em uma chamada por bloco
+
+    Args:
+        modelo: MLModel carregado
+        nutrientes: Nível de nutrientes N (ppm) usado em todos os passos
+    """
+    return Politica('ml', lambda g: _prever_ml(modelo, nutrientes, g))
+
+
+def politica_combinada(modelo, nutrientes: float) -> Politica:
+    """
+    Lógica de FarmTechController.analisar_necessidade_irrigacao_completa:
+    não irrigar com chuva prevista; sem chuva, seguir o modelo de ML
+    """
+    def decidir(g: Grades) -> np.ndarray:
+        return _prever_ml(modelo, nutrientes, g) & ~g['chuva']
+    return Politica('combinada', decidir)
+
+
+def politica_registrada() -> Politica:
+    """Acionamentos que de fato ocorreram (bomba ligada na maior parte do passo)"""
+    return Politica('registrada', lambda g: g['bomba'] >= 0.5)
+
+
+def chuva_prevista(grade_us: np.ndarray, clima_us: np.ndarray, chuva: np.ndarray,
+                   horizonte_us: int) -> np.ndarray:
+    """
+    Se havia chuva significativa prevista em cada passo da grade
+
+    Equivalente ao 'ha_chuva' de FarmTechController.obter_previsao_clima:
+    um passo tem chuva prevista se alguma entrada do histórico de clima
+    com chuva cai em [passo, passo + horizonte).
+
+    Args:
+        grade_us: Início de cada passo (µs)
+        clima_us: Instante de cada entrada do histórico de clima (µs)
+        chuva: Chuva significativa em cada entrada (ver
+            ClimaService.analisar_chuva, 'ha_chuva_significativa')
+        horizonte_us: Janela à frente considerada
+
+    Returns:
+        Array booleano, um valor por passo
+    """
+    clima_us = np.asarray(clima_us, dtype=np.int64)
+    chuva = np.asarray(chuva, dtype=bool)
+    ordem = np.argsort(clima_us, kind='stable')
+    clima_us, chuva = clima_us[ordem], chuva[ordem]
+    acumulado = np.r_[0, np.cumsum(chuva)]
+    grade_us = np.asarray(grade_us, dtype=np.int64)
+    inicio = np.searchsorted(clima_us, grade_us, side='left')
+    fim = np.searchsorted(clima_us, grade_us + horizonte_us, side='left')
+    return acumulado[fim] > acumulado[inicio]
+
+
+class BacktestIrrigacao:
+    """
+    Acumula as métricas de várias políticas sobre blocos do histórico
+
+    O histórico chega como grades reamostradas (ver reamostrar), em blocos
+    de dispositivos; cada bloco é avaliado por todas as políticas com
+    operações vetorizadas, em fatias de no máximo CELULAS_POR_FATIA
+    células para limitar a memória temporária. As métricas são somas,
+    então blocos podem ser avaliados em qualquer ordem.
+
+    A reprodução é em malha aberta: as decisões não alteram a umidade
+    reproduzida, que já reflete a irrigação que de fato ocorreu. O tempo
+    abaixo de cada limiar é reportado como o tempo em que a política
+    deixaria o solo seco sem irrigar.
+    """
+
+    INTERVALO = 5 * 60  # segundos por passo
+    VAZAO_BOMBA = 1000.0  # litros por hora, por dispositivo
+    CELULAS_POR_FATIA = 1_000_000
+
+    def __init__(self, politicas: Sequence[Politica], intervalo: Optional[float] = None,
+                 limiares: Sequence[float] = (50.0, 30.0), vazao: Optional[float] = None):
+        """
+        Args:
+            politicas: Políticas comparadas (nomes distintos)
+            intervalo: Duração de cada passo das grades (segundos)
+            limiares: Umidades (%) para o tempo abaixo do limiar
+            vazao: Vazão da bomba de cada dispositivo (L/h)
+        """
+        nomes = [p.nome for p in politicas]
+        if len(set(nomes)) != len(nomes):
+            raise ValueError(f"Nomes de política repetidos: {nomes}")
+        self.politicas = list(politicas)
+        self.intervalo = intervalo or self.INTERVALO
+        self.limiares = tuple(limiares)
+        self.vazao = self.VAZAO_BOMBA if vazao is None else vazao
+
+        self.dispositivos = 0
+        self.passos_validos = 0
+        self._abaixo = np.zeros(len(self.limiares), dtype=np.int64)
+        self._ligados = {p.nome: 0 for p in self.politicas}
+        self._acionamentos = {p.nome: 0 for p in self.politicas}
+        self._secos = {p.nome: np.zeros(len(self.limiares), dtype=np.int64)
+                       for p in self.politicas}
+        self._concordantes = {p.nome: 0 for p in self.politicas}
+        self._comparados = 0
+
+    def avaliar(self, grades: Grades, chuva: Optional[np.ndarray] = None):
+        """
+        Acumula um bloco de dispositivos
+
+        Args:
+            grades: 'umidade', 'ph' e 'temperatura' (dispositivos x passos);
+                'bomba' opcional (ver Grades)
+            chuva: Chuva prevista em cada passo (None = sem chuva)
+        """
+        umidade = np.asarray(grades['umidade'])
+        n_dispositivos, n_passos = umidade.shape
+        if chuva is None:
+            chuva = np.zeros(n_passos, dtype=bool)
+        chuva = np.broadcast_to(np.asarray(chuva, dtype=bool), umidade.shape)
+
+        linhas = max(1, self.CELULAS_POR_FATIA // max(n_passos, 1))
+        for inicio in range(0, n_dispositivos, linhas):
+            fatia = slice(inicio, inicio + linhas)
+            bloco = {nome: np.asarray(grades[nome])[fatia] for nome in COLUNAS_GRADE
+                     if nome in grades}
+            bloco['chuva'] = chuva[fatia]
+            self._avaliar_fatia(bloco)
+        self.dispositivos += n_dispositivos
+
+    def _avaliar_fatia(self, g: Grades):
+        umidade = g['umidade']
+        validos = ~np.isnan(umidade)
+        self.passos_validos += int(np.count_nonzero(validos))
+        abaixo = [umidade < limiar for limiar in self.limiares]
+        for i, mascara in enumerate(abaixo):
+            self._abaixo[i] += np.count_nonzero(mascara)
+
+        registrada = None
+        if 'bomba' in g:
+            bomba = g['bomba']
+            comparaveis = validos & ~np.isnan(bomba)
+            registrada = bomba >= 0.5
+            self._comparados += int(np.count_nonzero(comparaveis))
+
+        for politica in self.politicas:
+            decisao = np.asarray(politica.decidir(g), dtype=bool) & validos
+            nome = politica.nome
+            self._ligados[nome] += int(np.count_nonzero(decisao))
+            # Acionamento = passo ligado cujo anterior (no mesmo dispositivo) estava desligado
+            self._acionamentos[nome] += int(
+                np.count_nonzero(decisao[:, :1])
+                + np.count_nonzero(decisao[:, 1:] & ~decisao[:, :-1])
+            )
+            for i, mascara in enumerate(abaixo):
+                self._secos[nome][i] += np.count_nonzero(mascara & ~decisao)
+            if registrada is not None:
+                self._concordantes[nome] += int(
+                    np.count_nonzero(comparaveis & (decisao == registrada))
+                )
+
+    def resultado(self) -> Dict:
+        """
+        Métricas acumuladas
+
+        Returns:
+            Dicionário com 'dispositivos', 'horas_analisadas' (passos com
+            umidade, somados entre dispositivos), 'horas_abaixo' (limiar ->
+            horas com umidade abaixo dele) e 'politicas': por política,
+            'horas_bomba', 'agua_litros', 'acionamentos',
+            'horas_abaixo_sem_irrigar' (limiar -> horas abaixo dele com a
+            bomba desligada) e 'concordancia' (% dos passos com a mesma
+            decisão que a bomba registrada; None sem 'bomba')
+        """
+        horas_passo = self.intervalo / 3600
+        politicas = {}
+        for politica in self.politicas:
+            nome = politica.nome
+            horas = self._ligados[nome] * horas_passo
+            politicas[nome] = {
+                'horas_bomba': round(horas, 2),
+                'agua_litros': round(horas * self.vazao, 1),
+                'acionamentos': self._acionamentos[nome],
+                'horas_abaixo_sem_irrigar': {
+                    limiar: round(float(secos) * horas_passo, 2)
+                    for limiar, secos in zip(self.limiares, self._secos[nome])
+                },
+                'concordancia': (round(self._concordantes[nome] / self._comparados * 100, 2)
+                                 if self._comparados else None),
+            }
+        return {
+            'dispositivos': self.dispositivos,
+            'horas_analisadas': round(self.passos_validos * horas_passo, 2),
+            'horas_abaixo': {
+                limiar: round(float(abaixo) * horas_passo, 2)
+                for limiar, abaixo in zip(self.limiares, self._abaixo)
+            },
+            'politicas': politicas,
+        }
+
+
+def backtest_armazem(armazem, inicio: datetime, fim: datetime,
+                     politicas: Sequence[Politica], intervalo: Optional[float] = None,
+                     clima: Optional[Dict[str, np.ndarray]] = None,
+                     horizonte_chuva: float = 6 * 3600,
+                     talhao: Optional[str] = None,
+                     dispositivos: Optional[List[str]] = None,
+                     dispositivos_por_bloco: int = 25, **opcoes) -> Dict:
+    """
+    Compara políticas sobre o histórico de um ArmazemSensores
+
+    O histórico de cada bloco de dispositivos é reamostrado na grade do
+    backtest (média por passo, lacunas de até LACUNA_MAXIMA dos rollups
+    preenchidas com a leitura anterior) e avaliado por BacktestIrrigacao.
+    Períodos que já saíram da memória dos shards são lidos do log
+    persistente ou do banco (SensorHandler.ler_intervalo); shards sem
+    nenhum dos dois só contribuem com o que ainda está em memória.
+
+    Args:
+        armazem: ArmazemSensores com o histórico
+        inicio, fim: Período reproduzido
+        politicas: Políticas comparadas
+        intervalo: Passo da grade (segundos; padrão BacktestIrrigacao.INTERVALO)
+        clima: Histórico de previsões com 'timestamp' (datetime64 ou µs) e
+            'chuva' (chuva significativa); None = sem chuva em todo o período
+        horizonte_chuva: Janela à frente (segundos) em que a chuva prevista
+            impede a irrigação (limite_horas de ClimaService.analisar_chuva)
+        talhao, dispositivos: Seleção de dispositivos (ver ArmazemSensores.reamostrar)
+        dispositivos_por_bloco: Dispositivos reamostrados de cada vez
+        **opcoes: limiares e vazao de BacktestIrrigacao
+
+    Returns:
+        BacktestIrrigacao.resultado()
+    """
+    backtest = BacktestIrrigacao(politicas, intervalo, **opcoes)
+    nomes = list(dispositivos or armazem.dispositivos(talhao))
+    agregacoes = {nome: 'media' for nome in COLUNAS_GRADE}
+    chuva = None
+    for i in range(0, len(nomes), dispositivos_por_bloco):
+        grades = armazem.reamostrar(
+            inicio, fim, backtest.intervalo, agregacoes, preenchimento='anterior',
+            lacuna_maxima=RollupsSensores.LACUNA_MAXIMA,
+            dispositivos=nomes[i:i + dispositivos_por_bloco], persistente=True,
+        )
+        if chuva is None and clima is not None:
+            chuva = chuva_prevista(
+                grades['timestamp'].astype(np.int64),
+                np.asarray(clima['timestamp']).astype('datetime64[us]').astype(np.int64),
+                clima['chuva'], int(horizonte_chuva * US_POR_SEGUNDO),
+            )
+        backtest.avaliar(grades, chuva)
+    return backtest.resultado()
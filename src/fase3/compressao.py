@@ -0,0 +1,502 @@
+"""
+Compressão em memória de blocos selados do histórico de sensores
+Timestamps em delta-of-delta, floats por XOR com a leitura anterior
+(estilo Gorilla) e flags empacotadas em bits, tudo vetorizado em NumPy
+"""
+
+import queue
+import threading
+from collections import OrderedDict, deque
+from typing import Dict, List, Optional, Union
+
+import numpy as np
+
+from .historico_colunar import COLUNAS
+
+
+# Bytes por leitura no formato colunar sem compressão
+BYTES_POR_LEITURA = sum(np.dtype(dtype).itemsize for dtype in COLUNAS.values())
+
+_COLUNAS_FLOAT = ('umidade', 'ph', 'temperatura')
+_BITS_FLAGS = 3  # FLAG_FOSFORO, FLAG_POTASSIO, FLAG_BOMBA
+_BITS_LARGURA = 7  # Larguras de 1 a 64 bits
+
+
+def _largura_bits(valores: np.ndarray) -> np.ndarray:
+    """Número de bits significativos de cada uint64 (0 para zero)"""
+    # O expoente de frexp é a largura; cada metade de 32 bits é exata em float64
+    alto = np.frexp((valores >> np.uint64(32)).astype(np.float64))[1]
+    baixo = np.frexp((valores & np.uint64(0xFFFFFFFF)).astype(np.float64))[1]
+    return np.where(alto > 0, alto + 32, baixo).astype(np.int64)
+
+
+def _empacotar_bits(valores: np.ndarray, larguras: np.ndarray) -> bytes:
+    """Concatena os `larguras[i]` bits menos significativos de cada valor"""
+    total = int(larguras.sum())
+    if not total:
+        return b''
+    inicios = np.cumsum(larguras) - larguras
+    if larguras.max() <= 57:
+        # Inverso da leitura em janelas de _desempacotar_bits: cada valor,
+        # alinhado ao seu bit inicial, ocupa os 8 bytes a partir do seu byte
+        # inicial; os bits de valores diferentes não se sobrepõem, então a
+        # soma dos bytes de cada posição é o OU deles
+        deslocamento = (64 - larguras - (inicios & 7)).astype(np.uint64)
+        janelas = ((valores & ((np.uint64(1) << larguras.astype(np.uint64)) - np.uint64(1)))
+                   << deslocamento).astype('>u8').view(np.uint8)
+        posicoes = ((inicios >> 3)[:, None] + np.arange(8)).ravel()
+        tamanho = (total + 7) // 8
+        dados = np.bincount(posicoes, janelas, minlength=tamanho + 8)[:tamanho]
+        return dados.astype(np.uint8).tobytes()
+    indice = np.repeat(np.arange(len(valores)), larguras)
+    # Bit k (do mais significativo) de cada valor
+    deslocamento = (np.repeat(inicios + larguras - 1, larguras)
+                    - np.arange(total)).astype(np.uint64)
+    bits = (valores[indice] >> deslocamento) & np.uint64(1)
+    return np.packbits(bits.astype(np.uint8)).tobytes()
+
+
+def _desempacotar_bits(dados: bytes, larguras: np.ndarray) -> np.ndarray:
+    """Inverso de _empacotar_bits (larguras todas maiores que zero)"""
+    total = int(larguras.sum())
+    if not total:
+        return np.zeros(len(larguras), dtype=np.uint64)
+    inicios = np.cumsum(larguras) - larguras
+    if larguras.max() <= 57:
+        # Cada valor cabe nos 8 bytes a partir do seu byte inicial: lê essa
+        # janela como inteiro big-endian e recorta os bits do valor
+        buffer = np.zeros(len(dados) + 8, dtype=np.uint8)
+        buffer[:len(dados)] = np.frombuffer(dados, dtype=np.uint8)
+        janelas = np.lib.stride_tricks.sliding_window_view(buffer, 8)[inicios >> 3]
+        janelas = janelas.copy().view('>u8')[:, 0].astype(np.uint64)
+        janelas <<= (inicios & 7).astype(np.uint64)
+        return janelas >> (64 - larguras).astype(np.uint64)
+    bits = np.unpackbits(np.frombuffer(dados, dtype=np.uint8), count=total)
+    deslocamento = (np.repeat(inicios + larguras - 1, larguras)
+                    - np.arange(total)).astype(np.uint64)
+    return np.add.reduceat(bits.astype(np.uint64) << deslocamento, inicios)
+
+
+def _codificar_fluxo(valores: np.ndarray) -> Dict:
+    """
+    Codifica uint64 majoritariamente pequenos ou nulos
+
+    Um bit por valor indica se é zero; os não nulos guardam a largura
+    (7 bits) e apenas os bits significativos.
+    """
+    nao_nulos = valores != 0
+    significativos = valores[nao_nulos]
+    larguras = _largura_bits(significativos)
+    return {
+        'nao_nulos': np.packbits(nao_nulos).tobytes(),
+        'larguras': _empacotar_bits((larguras - 1).astype(np.uint64),
+                                    np.full(len(larguras), _BITS_LARGURA)),
+        'quantidade': len(significativos),
+        'bits': _empacotar_bits(significativos, larguras),
+    }
+
+
+def _decodificar_fluxo(fluxo: Dict, n: int) -> np.ndarray:
+    nao_nulos = np.unpackbits(np.frombuffer(fluxo['nao_nulos'], dtype=np.uint8),
+                              count=n).astype(bool)
+    larguras = _desempacotar_bits(
+        fluxo['larguras'], np.full(fluxo['quantidade'], _BITS_LARGURA)
+    ).astype(np.int64) + 1
+    saida = np.zeros(n, dtype=np.uint64)
+    saida[nao_nulos] = _desempacotar_bits(fluxo['bits'], larguras)
+    return saida
+
+
+def _tamanho_fluxo(fluxo: Dict) -> int:
+    return len(fluxo['nao_nulos']) + len(fluxo['larguras']) + len(fluxo['bits'])
+
+
+class BlocoComprimido:
+    """
+    Bloco selado (imutável) de leituras comprimidas
+
+    - timestamp: primeiro valor e primeiro delta; os demais como
+      delta-of-delta em zigzag (zero para leituras em intervalo regular)
+    - umidade, ph, temperatura: padrão de bits do float32 em XOR com a
+      leitura anterior (zero quando o valor se repete)
+    - flags: os três bits de cada leitura empacotados
+
+    A decodificação é exata (inclusive NaN) e vetorizada.
+    """
+
+    __slots__ = ('n', 'inicio_us', 'fim_us', '_cabecalho', '_fluxos', '_flags')
+
+    def __init__(self, colunas: Dict[str, np.ndarray]):
+        """
+        Comprime um bloco
+
+        Args:
+            colunas: Colunas no formato de HistoricoColunar
+        """
+        timestamps = np.asarray(colunas['timestamp'], dtype=np.int64)
+        self.n = len(timestamps)
+        if not self.n:
+            raise ValueError("Bloco comprimido não pode ser vazio")
+        self.inicio_us = int(timestamps.min())
+        self.fim_us = int(timestamps.max())
+
+        deltas = np.diff(timestamps)
+        primeiro_delta = int(deltas[0]) if len(deltas) else 0
+        dod = np.diff(deltas)
+        zigzag = ((dod << 1) ^ (dod >> 63)).view(np.uint64)
+        self._cabecalho = (int(timestamps[0]), primeiro_delta)
+        self._fluxos = {'timestamp': _codificar_fluxo(zigzag)}
+
+        for nome in _COLUNAS_FLOAT:
+            bits = np.asarray(colunas[nome], dtype=np.float32).view(np.uint32)
+            xor = np.empty(self.n, dtype=np.uint64)
+            xor[0] = bits[0]
+            xor[1:] = bits[1:] ^ bits[:-1]
+            self._fluxos[nome] = _codificar_fluxo(xor)
+
+        flags = np.asarray(colunas['flags'], dtype=np.uint8)
+        self._flags = np.packbits(
+            np.unpackbits(flags[:, None], axis=1)[:, -_BITS_FLAGS:]
+        ).tobytes()
+
+    @property
+    def tamanho_bytes(self) -> int:
+        """Bytes ocupados pelos dados comprimidos"""
+        return (16 + len(self._flags)
+                + sum(_tamanho_fluxo(f) for f in self._fluxos.values()))
+
+    def descomprimir(self) -> Dict[str, np.ndarray]:
+        """Retorna as colunas do bloco (arrays novos, com os dtypes de COLUNAS)"""
+        n = self.n
+        primeiro, primeiro_delta = self._cabecalho
+        zigzag = _decodificar_fluxo(self._fluxos['timestamp'], max(0, n - 2))
+        dod = (zigzag >> np.uint64(1)).view(np.int64) ^ -(zigzag & np.uint64(1)).view(np.int64)
+        deltas = np.empty(max(0, n - 1), dtype=np.int64)
+        if n > 1:
+            deltas[0] = primeiro_delta
+            deltas[1:] = primeiro_delta + np.cumsum(dod)
+        timestamps = np.empty(n, dtype=np.int64)
+        timestamps[0] = primeiro
+        timestamps[1:] = primeiro + np.cumsum(deltas)
+
+        colunas = {'timestamp': timestamps}
+        for nome in _COLUNAS_FLOAT:
+            xor = _decodificar_fluxo(self._fluxos[nome], n).astype(np.uint32)
+            colunas[nome] = np.bitwise_xor.accumulate(xor).view(np.float32)
+
+        bits = np.unpackbits(np.frombuffer(self._flags, dtype=np.uint8),
+                             count=n * _BITS_FLAGS).reshape(n, _BITS_FLAGS)
+        colunas['flags'] = (bits[:, 0] << 2 | bits[:, 1] << 1 | bits[:, 2]).astype(np.uint8)
+        return colunas
+
+
+class BlocoBruto:
+    """
+    Bloco completo ainda não comprimido
+
+    Tem a mesma interface de leitura de BlocoComprimido e é trocado por
+    ele quando a compressão termina (ver HistoricoComprimido).
+    """
+
+    __slots__ = ('n', 'inicio_us', 'fim_us', 'colunas')
+
+    def __init__(self, colunas: Dict[str, np.ndarray]):
+        self.colunas = colunas
+        self.n = len(colunas['timestamp'])
+        self.inicio_us = int(colunas['timestamp'].min())
+        self.fim_us = int(colunas['timestamp'].max())
+
+    @property
+    def tamanho_bytes(self) -> int:
+        return self.n * BYTES_POR_LEITURA
+
+    def descomprimir(self) -> Dict[str, np.ndarray]:
+        return self.colunas
+
+
+# Compressão dos blocos completos, em uma thread compartilhada por todos os
+# históricos: a ingestão só entrega o bloco e segue
+_fila_selagem: 'queue.SimpleQueue[HistoricoComprimido]' = queue.SimpleQueue()
+_thread_selagem: Optional[threading.Thread] = None
+_lock_thread_selagem = threading.Lock()
+
+
+def _selar_periodicamente():
+    while True:
+        historico = _fila_selagem.get()
+        try:
+            historico.selar_pendentes()
+        except Exception as e:
+            print(f"❌ Erro ao comprimir bloco do histórico: {e}")
+
+
+def _agendar_selagem(historico: 'HistoricoComprimido'):
+    global _thread_selagem
+    if _thread_selagem is None:
+        with _lock_thread_selagem:
+            if _thread_selagem is None:
+                _thread_selagem = threading.Thread(target=_selar_periodicamente, daemon=True)
+                _thread_selagem.start()
+    _fila_selagem.put(historico)
+
+
+class OrcamentoBytes:
+    """
+    Limite de memória compartilhado pelos blocos de vários históricos
+
+    Cada bloco fechado por um HistoricoComprimido é registrado aqui, na
+    ordem em que foi fechado. Quando o total passa de `maximo_bytes`, os
+    blocos mais antigos de todo o conjunto são descartados, qualquer que
+    seja o histórico dono, então o limite vale para o conjunto (ex.: todos
+    os dispositivos de um ArmazemSensores) e não para cada histórico.
+
+    Ordem dos locks: o do orçamento é obtido antes do _lock_blocos de um
+    histórico, nunca depois.
+    """
+
+    def __init__(self, maximo_bytes: int):
+        """
+        Args:
+            maximo_bytes: Memória máxima dos blocos de todos os históricos
+        """
+        self.maximo_bytes = maximo_bytes
+        self.bytes = 0
+        # (histórico, geração) de cada bloco registrado, do mais antigo ao mais novo
+        self._blocos: deque = deque()
+        self._lock = threading.Lock()
+
+    def registrar(self, historico: 'HistoricoComprimido', tamanho_bytes: int):
+        """Contabiliza um bloco recém-fechado e descarta os mais antigos acima do limite"""
+        with self._lock:
+            self._blocos.append((historico, historico.geracao))
+            self.bytes += tamanho_bytes
+            while self.bytes > self.maximo_bytes and len(self._blocos) > 1:
+                dono, geracao = self._blocos.popleft()
+                if geracao == dono.geracao:
+                    self.bytes -= dono._descartar_mais_antigo()
+
+    def ajustar(self, delta_bytes: int):
+        """Atualiza o total após um bloco mudar de tamanho ou ser liberado"""
+        with self._lock:
+            self.bytes += delta_bytes
+
+
+class HistoricoComprimido:
+    """
+    Leituras antigas em blocos comprimidos, descomprimidos sob demanda
+
+    As leituras chegam em ordem (ex.: as descartadas do HistoricoColunar)
+    e ficam em um bloco aberto sem compressão até completar
+    `tamanho_bloco`. O bloco completo entra como BlocoBruto e é
+    comprimido fora do caminho da ingestão, por uma thread em segundo
+    plano (ou por selar_pendentes), que o troca pelo BlocoComprimido.
+
+    Os blocos ocupam no máximo os bytes do seu OrcamentoBytes: acima disso
+    os mais antigos são descartados. O orçamento pode ser compartilhado
+    por vários históricos (um limite para o conjunto); sem ele, cada
+    histórico tem o próprio, de `maximo_bytes`. Uma consulta descomprime apenas os blocos cujo
+    intervalo de tempo a intersecta; os últimos blocos descomprimidos
+    ficam em um pequeno cache, com lock próprio (as consultas rodam em
+    paralelo com a escrita e entre si).
+    """
+
+    TAMANHO_BLOCO = 4096
+    BLOCOS_EM_CACHE = 8
+    MAXIMO_BYTES = 64 * 1024 * 1024
+
+    def __init__(self, tamanho_bloco: Optional[int] = None,
+                 blocos_em_cache: Optional[int] = None,
+                 maximo_bytes: Optional[int] = None,
+                 selar_em_segundo_plano: bool = True,
+                 orcamento: Optional[OrcamentoBytes] = None):
+        """
+        Args:
+            tamanho_bloco: Leituras por bloco
+            blocos_em_cache: Blocos descomprimidos mantidos em cache
+            maximo_bytes: Memória máxima dos blocos (comprimidos ou ainda
+                pendentes) quando não há orçamento compartilhado; os mais
+                antigos são descartados
+            selar_em_segundo_plano: Comprime os blocos completos na thread
+                compartilhada; False deixa a compressão para selar_pendentes
+            orcamento: Limite de memória compartilhado com outros
+                históricos (ignora maximo_bytes)
+        """
+        self.tamanho_bloco = tamanho_bloco or self.TAMANHO_BLOCO
+        self.blocos_em_cache = self.BLOCOS_EM_CACHE if blocos_em_cache is None else blocos_em_cache
+        self.orcamento = orcamento or OrcamentoBytes(maximo_bytes or self.MAXIMO_BYTES)
+        self.selar_em_segundo_plano = selar_em_segundo_plano
+        self.blocos: List[Union[BlocoComprimido, BlocoBruto]] = []
+        self._pendentes: deque = deque()  # BlocoBruto ainda não comprimidos, em ordem
+        self._bytes = 0
+        # Incrementada por limpar: invalida os registros antigos no orçamento
+        self.geracao = 0
+        self.leituras_descartadas = 0
+        self._lock_blocos = threading.Lock()
+        self._lock_selagem = threading.Lock()
+        self._novo_aberto()
+        self._cache: 'OrderedDict[BlocoComprimido, Dict[str, np.ndarray]]' = OrderedDict()
+        self._lock_cache = threading.Lock()
+
+    def __len__(self) -> int:
+        return sum(b.n for b in self.blocos) + self._n_aberto
+
+    @property
+    def maximo_bytes(self) -> int:
+        return self.orcamento.maximo_bytes
+
+    def _novo_aberto(self):
+        self._aberto = {
+            nome: np.empty(self.tamanho_bloco, dtype=dtype) for nome, dtype in COLUNAS.items()
+        }
+        self._n_aberto = 0
+
+    def adicionar(self, valores: tuple):
+        """Acrescenta uma leitura (valores na ordem de COLUNAS)"""
+        for coluna, valor in zip(self._aberto.values(), valores):
+            coluna[self._n_aberto] = valor
+        self._n_aberto += 1
+        if self._n_aberto == self.tamanho_bloco:
+            self._fechar_bloco()
+
+    def adicionar_lote(self, colunas: Dict[str, np.ndarray]):
+        """Acrescenta leituras em bloco, fechando cada bloco completo"""
+        m = len(colunas['timestamp'])
+        feitas = 0
+        while feitas < m:
+            k = min(m - feitas, self.tamanho_bloco - self._n_aberto)
+            for nome, coluna in self._aberto.items():
+                coluna[self._n_aberto:self._n_aberto + k] = colunas[nome][feitas:feitas + k]
+            self._n_aberto += k
+            feitas += k
+            if self._n_aberto == self.tamanho_bloco:
+                self._fechar_bloco()
+
+    def _fechar_bloco(self):
+        """Entrega o bloco aberto (completo) para compressão, sem comprimir"""
+        bloco = BlocoBruto(self._aberto)
+        with self._lock_blocos:
+            self.blocos.append(bloco)
+            self._pendentes.append(bloco)
+            self._bytes += bloco.tamanho_bytes
+        self._novo_aberto()
+        # Fora de _lock_blocos (ver a ordem dos locks em OrcamentoBytes)
+        self.orcamento.registrar(self, bloco.tamanho_bytes)
+        if self.selar_em_segundo_plano:
+            _agendar_selagem(self)
+
+    def _descartar_mais_antigo(self) -> int:
+        """Descarta o bloco mais antigo (chamado pelo orçamento); retorna os bytes liberados"""
+        with self._lock_blocos:
+            if not self.blocos:
+                return 0
+            antigo = self.blocos.pop(0)
+            if self._pendentes and self._pendentes[0] is antigo:
+                self._pendentes.popleft()
+            self._bytes -= antigo.tamanho_bytes
+            self.leituras_descartadas += antigo.n
+            return antigo.tamanho_bytes
+
+    def selar_pendentes(self) -> int:
+        """
+        Comprime os blocos completos ainda sem compressão
+
+        A compressão roda fora de _lock_blocos; cada bloco é trocado pelo
+        comprimido em uma única atribuição, então consultas simultâneas
+        veem um ou outro, com as mesmas leituras.
+
+        Returns:
+            Número de blocos comprimidos
+        """
+        selados = 0
+        with self._lock_selagem:
+            while True:
+                with self._lock_blocos:
+                    if not self._pendentes:
+                        return selados
+                    bloco = self._pendentes[0]
+                comprimido = BlocoComprimido(bloco.colunas)
+                with self._lock_blocos:
+                    # Descartado durante a compressão: já saiu das duas listas
+                    if self._pendentes and self._pendentes[0] is bloco:
+                        self._pendentes.popleft()
+                        i = len(self.blocos) - 1
+                        while self.blocos[i] is not bloco:
+                            i -= 1
+                        self.blocos[i] = comprimido
+                        delta = comprimido.tamanho_bytes - bloco.tamanho_bytes
+                        self._bytes += delta
+                        selados += 1
+                    else:
+                        delta = 0
+                if delta:
+                    self.orcamento.ajustar(delta)
+
+    def _bloco(self, bloco: Union[BlocoComprimido, BlocoBruto]) -> Dict[str, np.ndarray]:
+        """Colunas de um bloco, pelo cache se possível"""
+        if isinstance(bloco, BlocoBruto):
+            return bloco.colunas
+        with self._lock_cache:
+            colunas = self._cache.get(bloco)
+            if colunas is not None:
+                self._cache.move_to_end(bloco)
+                return colunas
+        colunas = bloco.descomprimir()
+        if self.blocos_em_cache:
+            with self._lock_cache:
+                self._cache[bloco] = colunas
+                if len(self._cache) > self.blocos_em_cache:
+                    self._cache.popitem(last=False)
+        return colunas
+
+    def intervalo(self, inicio_us: int, fim_us: int) -> Dict[str, np.ndarray]:
+        """
+        Leituras com inicio_us <= timestamp < fim_us, em ordem de chegada
+
+        Returns:
+            Dicionário coluna -> array NumPy
+        """
+        partes = []
+        for bloco in list(self.blocos):
+            if bloco.fim_us < inicio_us or bloco.inicio_us >= fim_us:
+                continue
+            partes.append(self._bloco(bloco))
+        if self._n_aberto:
+            partes.append({nome: coluna[:self._n_aberto] for nome, coluna in self._aberto.items()})
+
+        saida = {}
+        for nome, dtype in COLUNAS.items():
+            saida[nome] = (np.concatenate([p[nome] for p in partes]) if partes
+                           else np.empty(0, dtype=dtype))
+        dentro = (saida['timestamp'] >= inicio_us) & (saida['timestamp'] < fim_us)
+        return {nome: valores[dentro] for nome, valores in saida.items()}
+
+    def estatisticas(self) -> Dict:
+        """Leituras, bytes comprimidos e razão de compressão dos blocos selados"""
+        blocos = list(self.blocos)
+        selados = [b for b in blocos if isinstance(b, BlocoComprimido)]
+        leituras = sum(b.n for b in selados)
+        comprimidos = sum(b.tamanho_bytes for b in selados)
+        brutos = leituras * BYTES_POR_LEITURA
+        return {
+            'blocos': len(selados),
+            'blocos_pendentes': len(blocos) - len(selados),
+            'leituras_seladas': leituras,
+            'leituras_abertas': self._n_aberto + sum(b.n for b in blocos) - leituras,
+            'leituras_descartadas': self.leituras_descartadas,
+            'bytes_brutos': brutos,
+            'bytes_comprimidos': comprimidos,
+            'bytes_totais': sum(b.tamanho_bytes for b in blocos),
+            'razao_compressao': round(brutos / comprimidos, 2) if comprimidos else 0.0,
+        }
+
+    def limpar(self):
+        """Descarta todos os blocos"""
+        with self._lock_blocos:
+            self.blocos = []
+            self._pendentes.clear()
+            liberados, self._bytes = self._bytes, 0
+            self.geracao += 1
+        self.orcamento.ajustar(-liberados)
+        self._n_aberto = 0
+        with self._lock_cache:
+            self._cache.clear()
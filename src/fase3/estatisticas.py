@@ -0,0 +1,415 @@
+"""
+Estatísticas incrementais do histórico de sensores
+Agregados mantidos a cada leitura para consultas em tempo constante
+"""
+
+import math
+from collections import deque
+from typing import Dict, Iterable, Optional
+
+import numpy as np
+
+from .sketches import DDSketch
+
+
+class EstatisticaMetrica:
+    """Contagem, média/variância (Welford), extremos e quantis de uma métrica"""
+
+    __slots__ = ('n', 'media', 'm2', 'minimo', 'maximo', 'sketch')
+
+    def __init__(self):
+        self.sketch = DDSketch()
+        self.zerar()
+
+    def zerar(self):
+        """Volta ao estado vazio"""
+        self.n = 0
+        self.media = 0.0
+        self.m2 = 0.0
+        self.minimo = math.inf
+        self.maximo = -math.inf
+        self.sketch.zerar()
+
+    def adicionar(self, valor: float):
+        """Incorpora um valor (atualização de Welford); NaN é ignorado"""
+        if valor != valor:
+            return
+        self.n += 1
+        delta = valor - self.media
+        self.media += delta / self.n
+        self.m2 += delta * (valor - self.media)
+        if valor < self.minimo:
+            self.minimo = valor
+        if valor > self.maximo:
+            self.maximo = valor
+        self.sketch.adicionar(valor)
+
+    def remover(self, valor: float) -> bool:
+        """
+        Retira um valor previamente adicionado (Welford reverso)
+
+        Returns:
+            True se o valor era um extremo (min/max deixam de ser exatos;
+            EstatisticasSensores os mantém com ExtremosJanela)
+        """
+        if valor != valor:
+            return False
+        if self.n <= 1:
+            self.zerar()
+            return False
+
+        delta = valor - self.media
+        self.media -= delta / (self.n - 1)
+        self.m2 = max(0.0, self.m2 - delta * (valor - self.media))
+        self.n -= 1
+        self.sketch.remover(valor)
+        return valor <= self.minimo or valor >= self.maximo
+
+    @classmethod
+    def de_valores(cls, valores: np.ndarray) -> 'EstatisticaMetrica':
+        """Calcula as estatísticas de um array de uma só vez (vetorizado, sem NaN)"""
+        estat = cls()
+        valores = np.asarray(valores, dtype=np.float64)
+        valores = valores[~np.isnan(valores)]
+        if len(valores):
+            estat.n = len(valores)
+            estat.media = float(valores.mean())
+            estat.m2 = float(((valores - estat.media) ** 2).sum())
+            estat.minimo = float(valores.min())
+            estat.maximo = float(valores.max())
+            estat.sketch = DDSketch.de_valores(valores)
+        return estat
+
+    def remover_lote(self, lote: 'EstatisticaMetrica') -> bool:
+        """
+        Retira um subconjunto de valores (fórmula de Chan invertida)
+
+        Args:
+            lote: Estatísticas dos valores retirados
+
+        Returns:
+            True se min/max deixam de ser exatos
+        """
+        if lote.n >= self.n:
+            self.zerar()
+            return False
+
+        n = self.n - lote.n
+        media = (self.n * self.media - lote.n * lote.media) / n
+        delta = lote.media - media
+        self.m2 = max(0.0, self.m2 - lote.m2 - delta * delta * n * lote.n / self.n)
+        self.media = media
+        self.n = n
+        self.sketch.subtrair(lote.sketch)
+        return lote.minimo <= self.minimo or lote.maximo >= self.maximo
+
+    @classmethod
+    def combinar(cls, partes: Iterable['EstatisticaMetrica']) -> 'EstatisticaMetrica':
+        """
+        Combina estatísticas de conjuntos disjuntos (fórmula de Chan)
+
+        Args:
+            partes: Estatísticas a combinar
+
+        Returns:
+            Nova EstatisticaMetrica equivalente à união dos conjuntos
+        """
+        total = cls()
+        for parte in partes:
+            if not parte.n:
+                continue
+            n = total.n + parte.n
+            delta = parte.media - total.media
+            total.media += delta * parte.n / n
+            total.m2 += parte.m2 + delta * delta * total.n * parte.n / n
+            total.n = n
+            total.minimo = min(total.minimo, parte.minimo)
+            total.maximo = max(total.maximo, parte.maximo)
+            total.sketch.mesclar(parte.sketch)
+        return total
+
+    @property
+    def variancia(self) -> float:
+        """Variância amostral"""
+        return self.m2 / (self.n - 1) if self.n > 1 else 0.0
+
+
+class FilaMinimos:
+    """
+    Fila monotônica com o mínimo de uma janela deslizante
+
+    Guarda (posição, valor) só das leituras menores que todas as
+    posteriores, em ordem crescente de posição e de valor: a frente é o
+    mínimo da janela. Cada leitura entra e sai da fila no máximo uma vez,
+    então descartar o mínimo custa O(1) amortizado.
+    """
+
+    __slots__ = ('_fila',)
+
+    def __init__(self):
+        self._fila = deque()
+
+    def adicionar(self, posicao: int, valor: float):
+        """Inclui uma leitura no final da janela (NaN é ignorado)"""
+        if valor != valor:
+            return
+        fila = self._fila
+        while fila and fila[-1][1] >= valor:
+            fila.pop()
+        fila.append((posicao, valor))
+
+    def adicionar_lote(self, inicio: int, valores: np.ndarray):
+        """Inclui leituras consecutivas a partir da posição `inicio` (vetorizado)"""
+        valores = np.asarray(valores, dtype=np.float64)
+        validos = np.flatnonzero(~np.isnan(valores))
+        if not len(validos):
+            return
+        valores = valores[validos]
+        # Só sobrevivem os valores menores que tudo o que vem depois no lote
+        depois = np.append(np.minimum.accumulate(valores[::-1])[::-1][1:], math.inf)
+        mantidos = valores < depois
+        fila = self._fila
+        menor = valores[mantidos][0]
+        while fila and fila[-1][1] >= menor:
+            fila.pop()
+        fila.extend(zip((inicio + validos[mantidos]).tolist(), valores[mantidos].tolist()))
+
+    def descartar_ate(self, posicao: int):
+        """Retira as leituras de posição anterior a `posicao`"""
+        fila = self._fila
+        while fila and fila[0][0] < posicao:
+            fila.popleft()
+
+    def truncar(self, posicao: int):
+        """Retira as leituras a partir de `posicao` (para regravá-las)"""
+        fila = self._fila
+        while fila and fila[-1][0] >= posicao:
+            fila.pop()
+
+    def limpar(self):
+        self._fila.clear()
+
+    @property
+    def minimo(self) -> float:
+        return self._fila[0][1] if self._fila else math.inf
+
+
+class ExtremosJanela:
+    """
+    Min/max exatos das leituras do buffer circular
+
+    As posições são as posições lógicas do HistoricoColunar; o máximo é
+    uma FilaMinimos dos valores negados.
+    """
+
+    __slots__ = ('_minimos', '_maximos')
+
+    def __init__(self):
+        self._minimos = FilaMinimos()
+        self._maximos = FilaMinimos()
+
+    def adicionar(self, posicao: int, valor: float):
+        self._minimos.adicionar(posicao, valor)
+        self._maximos.adicionar(posicao, -valor)
+
+    def adicionar_lote(self, inicio: int, valores: np.ndarray):
+        valores = np.asarray(valores, dtype=np.float64)
+        self._minimos.adicionar_lote(inicio, valores)
+        self._maximos.adicionar_lote(inicio, -valores)
+
+    def descartar_ate(self, posicao: int):
+        self._minimos.descartar_ate(posicao)
+        self._maximos.descartar_ate(posicao)
+
+    def truncar(self, posicao: int):
+        self._minimos.truncar(posicao)
+        self._maximos.truncar(posicao)
+
+    def limpar(self):
+        self._minimos.limpar()
+        self._maximos.limpar()
+
+    @property
+    def minimo(self) -> float:
+        return self._minimos.minimo
+
+    @property
+    def maximo(self) -> float:
+        return -self._maximos.minimo
+
+
+class EstatisticasSensores:
+    """
+    Agregados correntes de umidade, pH e acionamentos da bomba
+
+    Min/max vêm de ExtremosJanela, indexados pela posição lógica de cada
+    leitura no histórico: descartar um extremo não percorre o buffer.
+    """
+
+    METRICAS = ('umidade', 'ph')
+
+    def __init__(self):
+        self.metricas: Dict[str, EstatisticaMetrica] = {
+            nome: EstatisticaMetrica() for nome in self.METRICAS
+        }
+        self.extremos: Dict[str, ExtremosJanela] = {
+            nome: ExtremosJanela() for nome in self.METRICAS
+        }
+        self.ativacoes_bomba = 0
+
+    @property
+    def total(self) -> int:
+        return self.metricas['umidade'].n
+
+    def _sincronizar_extremos(self):
+        for nome, extremos in self.extremos.items():
+            metrica = self.metricas[nome]
+            metrica.minimo, metrica.maximo = extremos.minimo, extremos.maximo
+
+    def adicionar(self, umidade: float, ph: float, bomba: bool,
+                  posicao: Optional[int] = None):
+        """
+        Atualiza os agregados com uma nova leitura
+
+        Args:
+            umidade, ph, bomba: Valores da leitura
+            posicao: Posição lógica da leitura no final do histórico; None se
+                ela foi intercalada no meio (seguir com reposicionar)
+        """
+        self.metricas['umidade'].adicionar(umidade)
+        self.metricas['ph'].adicionar(ph)
+        self.ativacoes_bomba += bool(bomba)
+        if posicao is not None:
+            self.extremos['umidade'].adicionar(posicao, umidade)
+            self.extremos['ph'].adicionar(posicao, ph)
+            self._sincronizar_extremos()
+
+    def remover(self, umidade: float, ph: float, bomba: bool, posicao_inicial: int):
+        """
+        Retira uma leitura descartada do histórico
+
+        Args:
+            umidade, ph, bomba: Valores da leitura descartada
+            posicao_inicial: Posição lógica da leitura mais antiga que
+                continua no histórico
+        """
+        for nome, valor in (('umidade', umidade), ('ph', ph)):
+            self.metricas[nome].remover(valor)
+            self.extremos[nome].descartar_ate(posicao_inicial)
+        self.ativacoes_bomba -= bool(bomba)
+        self._sincronizar_extremos()
+
+    def adicionar_lote(self, umidade: np.ndarray, ph: np.ndarray, bomba: np.ndarray,
+                       posicao: Optional[int] = None):
+        """
+        Atualiza os agregados com um lote de leituras
+
+        Args:
+            umidade, ph, bomba: Valores das leituras
+            posicao: Posição lógica da primeira leitura, se o lote entrou
+                inteiro no final do histórico; None se foi intercalado
+                (seguir com reposicionar)
+        """
+        for nome, valores in (('umidade', umidade), ('ph', ph)):
+            self.metricas[nome] = EstatisticaMetrica.combinar(
+                [self.metricas[nome], EstatisticaMetrica.de_valores(valores)]
+            )
+            if posicao is not None:
+                self.extremos[nome].adicionar_lote(posicao, valores)
+        self.ativacoes_bomba += int(np.count_nonzero(bomba))
+        if posicao is not None:
+            self._sincronizar_extremos()
+
+    def reposicionar(self, posicao: int, cauda: Dict[str, np.ndarray]):
+        """
+        Refaz min/max a partir de `posicao` depois de intercalar leituras
+
+        O custo é o da cauda regravada, como em HistoricoColunar.inserir_lote.
+
+        Args:
+            posicao: Posição lógica da primeira leitura da cauda
+            cauda: Colunas do histórico a partir de `posicao`
+        """
+        for nome, extremos in self.extremos.items():
+            extremos.truncar(posicao)
+            extremos.adicionar_lote(posicao, cauda[nome])
+        self._sincronizar_extremos()
+
+    def remover_lote(self, umidade: np.ndarray, ph: np.ndarray, bomba: np.ndarray,
+                     posicao_inicial: int):
+        """
+        Retira um lote de leituras descartadas do histórico
+
+        Args:
+            umidade, ph, bomba: Valores das leituras descartadas
+            posicao_inicial: Posição lógica da leitura mais antiga que
+                continua no histórico
+        """
+        for nome, valores in (('umidade', umidade), ('ph', ph)):
+            self.metricas[nome].remover_lote(EstatisticaMetrica.de_valores(valores))
+            self.extremos[nome].descartar_ate(posicao_inicial)
+        self.ativacoes_bomba -= int(np.count_nonzero(bomba))
+        self._sincronizar_extremos()
+
+    @classmethod
+    def combinar(cls, partes: Iterable['EstatisticasSensores']) -> 'EstatisticasSensores':
+        """Combina agregados de vários sensores em um único conjunto"""
+        partes = list(partes)
+        total = cls()
+        for nome in cls.METRICAS:
+            total.metricas[nome] = EstatisticaMetrica.combinar(
+                p.metricas[nome] for p in partes
+            )
+        total.ativacoes_bomba = sum(p.ativacoes_bomba for p in partes)
+        return total
+
+    def zerar(self):
+        """Descarta todos os agregados"""
+        for metrica in self.metricas.values():
+            metrica.zerar()
+        for extremos in self.extremos.values():
+            extremos.limpar()
+        self.ativacoes_bomba = 0
+
+    def resumo(self) -> Dict:
+        """
+        Monta o dicionário de estatísticas (custo constante)
+
+        Returns:
+            Dicionário no formato de SensorHandler.obter_estatisticas
+        """
+        total = self.total
+        if not total:
+            return {
+                'total_leituras': 0,
+                'umidade_media': 0,
+                'ph_medio': 0
+            }
+
+        umidade = self.metricas['umidade']
+        ph = self.metricas['ph']
+        # Leituras sem pH (NaN) não entram no agregado de pH
+        sem_ph = not ph.n
+        # Percentis pelos sketches (erro relativo de até 1%)
+        quantis_umidade = umidade.sketch.quantis()
+        quantis_ph = ph.sketch.quantis()
+
+        return {
+            'total_leituras': total,
+            'umidade_media': round(umidade.media, 2),
+            'umidade_minima': round(umidade.minimo, 2),
+            'umidade_maxima': round(umidade.maximo, 2),
+            'umidade_desvio': round(math.sqrt(umidade.variancia), 2),
+            'umidade_p50': round(quantis_umidade[0.5], 2),
+            'umidade_p95': round(quantis_umidade[0.95], 2),
+            'umidade_p99': round(quantis_umidade[0.99], 2),
+            'ph_medio': 0 if sem_ph else round(ph.media, 2),
+            'ph_minimo': None if sem_ph else round(ph.minimo, 2),
+            'ph_maximo': None if sem_ph else round(ph.maximo, 2),
+            'ph_desvio': 0 if sem_ph else round(math.sqrt(ph.variancia), 2),
+            'ph_p50': None if sem_ph else round(quantis_ph[0.5], 2),
+            'ph_p95': None if sem_ph else round(quantis_ph[0.95], 2),
+            'ph_p99': None if sem_ph else round(quantis_ph[0.99], 2),
+            'ativacoes_bomba': self.ativacoes_bomba,
+            'percentual_irrigacao': round(self.ativacoes_bomba / total * 100, 1)
+        }
@@ -0,0 +1,212 @@
+"""
+Gravação em lote das leituras de sensores no banco de dados (Fase 2)
+Buffer write-behind: acumula leituras e descarrega em transações agrupadas
+"""
+
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional
+
+import numpy as np
+from sqlalchemy import select
+
+from src.fase2.models import LeiturasSensor
+from .historico_colunar import FLAG_FOSFORO, FLAG_POTASSIO, FLAG_BOMBA
+
+
+class GravadorLeituras:
+    """
+    Buffer de escrita para a tabela leituras_sensor
+
+    As leituras ficam em memória e são gravadas em uma única transação
+    por uma thread auxiliar, quando o buffer atinge `tamanho_lote` ou
+    quando `intervalo` segundos se passam desde a última descarga. A
+    ingestão nunca grava nem espera o banco. Se a gravação falhar, as
+    leituras voltam ao buffer para a próxima tentativa; com o banco fora
+    do ar, o buffer guarda no máximo `maximo_pendentes` leituras e descarta
+    as mais antigas (contadas em `total_descartado`).
+    """
+
+    TAMANHO_LOTE = 1_000
+    INTERVALO = 5.0  # segundos
+    MAXIMO_PENDENTES = 100_000
+
+    def __init__(self, database, tamanho_lote: Optional[int] = None,
+                 intervalo: Optional[float] = None,
+                 maximo_pendentes: Optional[int] = None):
+        """
+        Inicializa o gravador
+
+        Args:
+            database: DatabaseHandler com as tabelas já criadas
+            tamanho_lote: Leituras acumuladas que disparam a descarga
+            intervalo: Tempo máximo (s) que uma leitura espera no buffer
+            maximo_pendentes: Leituras mantidas no buffer enquanto o banco
+                não aceita gravações
+        """
+        self.database = database
+        self.tamanho_lote = tamanho_lote or self.TAMANHO_LOTE
+        self.intervalo = intervalo or self.INTERVALO
+        self.maximo_pendentes = maximo_pendentes or self.MAXIMO_PENDENTES
+
+        self._lock = threading.Lock()
+        self._pendentes: List[Dict[str, np.ndarray]] = []
+        self._n_pendentes = 0
+        self._ultima_descarga = time.monotonic()
+        self.total_gravado = 0
+        self.total_descartado = 0
+        self.falhas = 0
+
+        self._parar = threading.Event()
+        self._cheio = threading.Event()
+        self._thread = threading.Thread(target=self._descarregar_periodicamente, daemon=True)
+        self._thread.start()
+
+    def _descarregar_periodicamente(self):
+        while not self._parar.is_set():
+            cheio = self._cheio.wait(self.intervalo / 2)
+            self._cheio.clear()
+            if self._parar.is_set() or not self._n_pendentes:
+                continue
+            if cheio or time.monotonic() - self._ultima_descarga >= self.intervalo:
+                try:
+                    self.descarregar()
+                except Exception:
+                    # Já registrado e devolvido ao buffer: tenta de novo no próximo intervalo
+                    pass
+
+    def _limitar_pendentes(self):
+        """Descarta as leituras mais antigas além de maximo_pendentes (sob _lock)"""
+        excesso = self._n_pendentes - self.maximo_pendentes
+        while excesso > 0 and self._pendentes:
+            pedaco = self._pendentes[0]
+            n = len(pedaco['timestamp'])
+            if n <= excesso:
+                self._pendentes.pop(0)
+                descartadas = n
+            else:
+                self._pendentes[0] = {
+                    nome: valores if nome == 'dispositivo' else valores[excesso:]
+                    for nome, valores in pedaco.items()
+                }
+                descartadas = excesso
+            self._n_pendentes -= descartadas
+            self.total_descartado += descartadas
+            excesso -= descartadas
+
+    def adicionar(self, dispositivo: str, colunas: Dict[str, np.ndarray]):
+        """
+        Enfileira leituras no buffer
+
+        Args:
+            dispositivo: Identificador do dispositivo
+            colunas: Colunas no formato de HistoricoColunar (arrays ou escalares)
+        """
+        pedaco = {nome: np.atleast_1d(valores) for nome, valores in colunas.items()}
+        pedaco['dispositivo'] = dispositivo
+        with self._lock:
+            self._pendentes.append(pedaco)
+            self._n_pendentes += len(pedaco['timestamp'])
+            self._limitar_pendentes()
+            cheio = self._n_pendentes >= self.tamanho_lote
+        if cheio:
+            # A gravação fica com a thread auxiliar, fora do caminho da ingestão
+            self._cheio.set()
+
+    @staticmethod
+    def _para_linhas(pedaco: Dict) -> List[Dict]:
+        """Converte um pedaço colunar em linhas para o INSERT em lote"""
+        flags = pedaco['flags']
+        temperatura = pedaco['temperatura'].astype(np.float64)
+        colunas = {
+            'timestamp': pedaco['timestamp'].astype('datetime64[us]').astype(object),
+            'umidade': np.round(pedaco['umidade'].astype(np.float64), 2).tolist(),
+            'ph': np.round(pedaco['ph'].astype(np.float64), 2).tolist(),
+            'temperatura': [None if t != t else t for t in np.round(temperatura, 1).tolist()],
+            'fosforo_presente': ((flags & FLAG_FOSFORO) != 0).tolist(),
+            'potassio_presente': ((flags & FLAG_POTASSIO) != 0).tolist(),
+            'bomba_ligada': ((flags & FLAG_BOMBA) != 0).tolist(),
+        }
+        dispositivo = pedaco['dispositivo']
+        return [
+            dict(zip(colunas, valores), dispositivo=dispositivo)
+            for valores in zip(*colunas.values())
+        ]
+
+    def descarregar(self) -> int:
+        """
+        Grava todas as leituras pendentes em uma única transação
+
+        Returns:
+            Número de leituras gravadas
+        """
+        with self._lock:
+            pendentes, self._pendentes = self._pendentes, []
+            self._n_pendentes = 0
+            self._ultima_descarga = time.monotonic()
+        if not pendentes:
+            return 0
+
+        linhas = [linha for pedaco in pendentes for linha in self._para_linhas(pedaco)]
+        try:
+            with self.database.engine.begin() as conexao:
+                conexao.execute(LeiturasSensor.__table__.insert(), linhas)
+        except Exception as e:
+            print(f"❌ Erro ao gravar leituras de sensores: {e}")
+            with self._lock:
+                # Devolve ao buffer para nova tentativa na próxima descarga
+                self._pendentes[:0] = pendentes
+                self._n_pendentes += len(linhas)
+                self.falhas += 1
+                self._limitar_pendentes()
+            raise
+
+        self.total_gravado += len(linhas)
+        return len(linhas)
+
+    def ler_intervalo(self, dispositivo: str, inicio: datetime, fim: datetime,
+                      tamanho_bloco: int = 10_000) -> Iterator[Dict[str, np.ndarray]]:
+        """
+        Lê as leituras de um dispositivo em [inicio, fim], em blocos
+
+        Usa o índice (dispositivo, timestamp). As leituras pendentes no
+        buffer são gravadas antes da consulta.
+
+        Args:
+            dispositivo: Identificador do dispositivo
+            inicio, fim: Intervalo de tempo
+            tamanho_bloco: Linhas por bloco
+
+        Yields:
+            Dicionário coluna -> array NumPy por bloco
+        """
+        self.descarregar()
+        tabela = LeiturasSensor.__table__
+        consulta = (
+            select(tabela.c.timestamp, tabela.c.umidade, tabela.c.ph, tabela.c.temperatura,
+                   tabela.c.fosforo_presente, tabela.c.potassio_presente, tabela.c.bomba_ligada)
+            .where(tabela.c.dispositivo == dispositivo)
+            .where(tabela.c.timestamp.between(inicio, fim))
+            .order_by(tabela.c.timestamp)
+        )
+        with self.database.engine.connect() as conexao:
+            resultado = conexao.execution_options(stream_results=True).execute(consulta)
+            for linhas in resultado.partitions(tamanho_bloco):
+                timestamps, umidade, ph, temperatura, fosforo, potassio, bomba = zip(*linhas)
+                yield {
+                    'timestamp': np.array(timestamps, dtype='datetime64[us]'),
+                    'umidade': np.array(umidade, dtype=np.float32),
+                    'ph': np.array(ph, dtype=np.float32),
+                    'temperatura': np.array(temperatura, dtype=np.float64).astype(np.float32),
+                    'fosforo': np.array(fosforo, dtype=bool),
+                    'potassio': np.array(potassio, dtype=bool),
+                    'bomba': np.array(bomba, dtype=bool),
+                }
+
+    def fechar(self):
+        """Interrompe a thread auxiliar e grava o que estiver pendente"""
+        self._parar.set()
+        self._cheio.set()
+        self._thread.join(timeout=self.intervalo)
+        self.descarregar()
@@ -0,0 +1,234 @@
+"""
+Armazenamento colunar de capacidade fixa para o histórico de sensores
+Substitui a lista ilimitada de SensorData por arrays NumPy pré-alocados
+"""
+
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+import numpy as np
+
+
+# Bits do campo 'flags' (booleanos empacotados em um único byte)
+FLAG_FOSFORO = 1
+FLAG_POTASSIO = 2
+FLAG_BOMBA = 4
+
+EPOCA = datetime(1970, 1, 1)
+US_POR_SEGUNDO = 1_000_000
+
+COLUNAS = {
+    'timestamp': np.int64,    # Microssegundos desde a época
+    'umidade': np.float32,
+    'ph': np.float32,
+    'temperatura': np.float32,  # NaN quando ausente
+    'flags': np.uint8,
+}
+
+
+def datetime_para_us(momento: datetime) -> int:
+    """Converte datetime (ingênuo) em microssegundos desde a época"""
+    return (momento - EPOCA) // timedelta(microseconds=1)
+
+
+def us_para_datetime(valor: int) -> datetime:
+    """Converte microssegundos desde a época em datetime"""
+    return EPOCA + timedelta(microseconds=int(valor))
+
+
+def empacotar_flags(fosforo, potassio, bomba):
+    """
+    Empacota os três booleanos em um byte (aceita escalares ou arrays)
+
+    Returns:
+        int ou np.ndarray[uint8] com os bits FLAG_*
+    """
+    if np.ndim(fosforo) == 0 and np.ndim(potassio) == 0 and np.ndim(bomba) == 0:
+        return ((FLAG_FOSFORO if fosforo else 0)
+                | (FLAG_POTASSIO if potassio else 0)
+                | (FLAG_BOMBA if bomba else 0))
+    return (np.asarray(fosforo, dtype=np.uint8) * FLAG_FOSFORO
+            | np.asarray(potassio, dtype=np.uint8) * FLAG_POTASSIO
+            | np.asarray(bomba, dtype=np.uint8) * FLAG_BOMBA).astype(np.uint8)
+
+
+class HistoricoColunar:
+    """
+    Buffer circular colunar com capacidade fixa
+
+    Cada campo é um array NumPy pré-alocado. Os dados são gravados em
+    espelho (posições i e i + capacidade), de modo que qualquer janela das
+    últimas n leituras é sempre contígua e pode ser devolvida como view,
+    mesmo após a volta do buffer.
+    """
+
+    CAPACIDADE_PADRAO = 100_000
+
+    def __init__(self, capacidade: Optional[int] = None):
+        """
+        Inicializa o buffer
+
+        Args:
+            capacidade: Número máximo de leituras mantidas em memória
+        """
+        capacidade = capacidade or self.CAPACIDADE_PADRAO
+        if capacidade <= 0:
+            raise ValueError("Capacidade do histórico deve ser positiva")
+
+        self.capacidade = capacidade
+        self._colunas: Dict[str, np.ndarray] = {
+            nome: np.zeros(2 * capacidade, dtype=dtype)
+            for nome, dtype in COLUNAS.items()
+        }
+        self.total_escrito = 0  # Leituras gravadas desde a criação/limpeza
+
+    def __len__(self) -> int:
+        return min(self.total_escrito, self.capacidade)
+
+    @property
+    def posicao_inicial(self) -> int:
+        """Posição lógica da leitura mais antiga (a mais recente é total_escrito - 1)"""
+        return self.total_escrito - len(self)
+
+    def adicionar(self, timestamp_us: int, umidade: float, ph: float,
+                  temperatura: float, flags: int) -> Optional[tuple]:
+        """
+        Grava uma leitura, sobrescrevendo a mais antiga se estiver cheio
+
+        Args:
+            timestamp_us: Timestamp em microssegundos desde a época
+            umidade: Umidade do solo (%)
+            ph: pH do solo
+            temperatura: Temperatura (NaN se ausente)
+            flags: Booleanos empacotados (FLAG_*)
+
+        Returns:
+            Valores da leitura descartada (na ordem de COLUNAS) ou None
+        """
+        pos = self.total_escrito % self.capacidade
+        espelho = pos + self.capacidade
+        valores = (timestamp_us, umidade, ph, temperatura, flags)
+
+        descartada = None
+        if self.total_escrito >= self.capacidade:
+            descartada = tuple(coluna[pos].item() for coluna in self._colunas.values())
+
+        for coluna, valor in zip(self._colunas.values(), valores):
+            coluna[pos] = valor
+            coluna[espelho] = valor
+
+        self.total_escrito += 1
+        return descartada
+
+    def adicionar_lote(self, colunas: Dict[str, np.ndarray]) -> Optional[Dict[str, np.ndarray]]:
+        """
+        Grava um lote de leituras com cópias em bloco (sem laço por leitura)
+
+        Args:
+            colunas: Dicionário coluna -> array, todos com o mesmo tamanho.
+                Se o lote exceder a capacidade, apenas o final é mantido.
+
+        Returns:
+            Cópia das leituras descartadas do buffer (mais antigas) ou None
+        """
+        m = len(colunas['timestamp'])
+        if m > self.capacidade:
+            colunas = {nome: valores[-self.capacidade:] for nome, valores in colunas.items()}
+            m = self.capacidade
+        if not m:
+            return None
+
+        n_descartes = max(0, len(self) + m - self.capacidade)
+        descartadas = None
+        if n_descartes:
+            descartadas = {
+                nome: view[:n_descartes].copy() for nome, view in self.ultimas().items()
+            }
+
+        self._escrever(self.total_escrito, colunas)
+        self.total_escrito += m
+        return descartadas
+
+    def _escrever(self, inicio: int, colunas: Dict[str, np.ndarray]):
+        """Grava colunas (no máximo `capacidade` leituras) a partir da posição lógica `inicio`"""
+        m = len(colunas['timestamp'])
+        pos = inicio % self.capacidade
+        k1 = min(m, self.capacidade - pos)
+        k2 = m - k1
+        cap = self.capacidade
+        for nome, coluna in self._colunas.items():
+            valores = colunas[nome]
+            coluna[pos:pos + k1] = valores[:k1]
+            coluna[pos + cap:pos + cap + k1] = valores[:k1]
+            if k2:
+                coluna[:k2] = valores[k1:]
+                coluna[cap:cap + k2] = valores[k1:]
+
+    def inserir_lote(self, colunas: Dict[str, np.ndarray]) -> Optional[Dict[str, np.ndarray]]:
+        """
+        Grava leituras mantendo o buffer ordenado por timestamp
+
+        Apenas a cauda do buffer a partir da leitura mais antiga do lote é
+        regravada (busca binária + intercalação), então o custo depende do
+        atraso das leituras e não do tamanho do histórico.
+
+        Args:
+            colunas: Leituras ordenadas por timestamp
+
+        Returns:
+            Cópia das leituras descartadas (as mais antigas do conjunto,
+            possivelmente do próprio lote) ou None
+        """
+        m = len(colunas['timestamp'])
+        if not m:
+            return None
+        atuais = self.ultimas()
+        n = len(self)
+        pos = int(np.searchsorted(atuais['timestamp'], colunas['timestamp'][0], side='right'))
+        if pos == n:
+            return self.adicionar_lote(colunas)
+
+        # Cauda do buffer intercalada com o lote (empates: buffer primeiro)
+        cauda = {nome: np.concatenate([atuais[nome][pos:], colunas[nome]]) for nome in COLUNAS}
+        ordem = np.argsort(cauda['timestamp'], kind='stable')
+        cauda = {nome: valores[ordem] for nome, valores in cauda.items()}
+
+        n_descartes = max(0, pos + len(ordem) - self.capacidade)
+        descartadas = None
+        if n_descartes:
+            mantidas = min(n_descartes, pos)
+            descartadas = {
+                nome: np.concatenate([atuais[nome][:mantidas], cauda[nome][:n_descartes - mantidas]])
+                for nome in COLUNAS
+            }
+            cauda = {nome: valores[n_descartes - mantidas:] for nome, valores in cauda.items()}
+
+        novo_total = self.total_escrito + m
+        self._escrever(novo_total - len(cauda['timestamp']), cauda)
+        self.total_escrito = novo_total
+        return descartadas
+
+    def ultimas(self, n: Optional[int] = None) -> Dict[str, np.ndarray]:
+        """
+        Retorna as n leituras mais recentes, em ordem cronológica
+
+        Args:
+            n: Quantidade de leituras (None = todas as disponíveis)
+
+        Returns:
+            Dicionário coluna -> view NumPy (sem cópia, somente leitura)
+        """
+        disponiveis = len(self)
+        n = disponiveis if n is None else max(0, min(n, disponiveis))
+        inicio = (self.total_escrito - n) % self.capacidade
+
+        views = {}
+        for nome, coluna in self._colunas.items():
+            view = coluna[inicio:inicio + n]
+            view.flags.writeable = False
+            views[nome] = view
+        return views
+
+    def limpar(self):
+        """Descarta todas as leituras (a memória continua alocada)"""
+        self.total_escrito = 0
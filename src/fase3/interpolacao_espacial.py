@@ -0,0 +1,220 @@
+"""
+Interpolação espacial das leituras dos dispositivos de um talhão
+Grade por ponderação pelo inverso da distância (IDW) com raio limitado,
+atualizada incrementalmente apenas nas células próximas aos dispositivos
+que mudaram
+"""
+
+import math
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+
+METRICAS = ('umidade', 'temperatura')
+
+_RAIO_TERRA = 6_371_000.0  # metros
+
+
+class GradeInterpolada:
+    """
+    Grade IDW de um talhão mantida por somas parciais
+
+    Cada célula guarda, por métrica, a soma dos pesos 1/d^potencia e a soma
+    dos valores ponderados dos dispositivos a até `raio` metros do seu
+    centro; o valor interpolado é a razão entre as duas. Como as somas são
+    aditivas, mudar a leitura ou a posição de um dispositivo é subtrair a
+    contribuição antiga e somar a nova, o que só toca as células no raio
+    dele. Posições em latitude/longitude são projetadas em metros em torno
+    da origem da grade (equiretangular, adequada à escala de um talhão).
+    """
+
+    TAMANHO_CELULA = 10.0  # metros
+    RAIO = 150.0  # metros
+    POTENCIA = 2.0
+    DISTANCIA_MINIMA = 1.0  # metros; evita peso infinito sobre o dispositivo
+    MAXIMO_CELULAS = 250_000
+
+    def __init__(self, latitudes: np.ndarray, longitudes: np.ndarray,
+                 tamanho_celula: Optional[float] = None, raio: Optional[float] = None,
+                 potencia: Optional[float] = None, metricas: Sequence[str] = METRICAS):
+        """
+        Cria a grade cobrindo as posições informadas (com margem do raio)
+
+        Args:
+            latitudes, longitudes: Posições (graus) que a grade deve cobrir
+            tamanho_celula: Lado de cada célula (m); aumentado se a grade
+                passar de MAXIMO_CELULAS
+            raio: Distância máxima de influência de um dispositivo (m)
+            potencia: Expoente do inverso da distância
+            metricas: Métricas interpoladas
+        """
+        latitudes = np.asarray(latitudes, dtype=np.float64)
+        longitudes = np.asarray(longitudes, dtype=np.float64)
+        self.raio = raio or self.RAIO
+        self.potencia = potencia or self.POTENCIA
+        self.metricas = tuple(metricas)
+
+        self.latitude_origem = float((latitudes.min() + latitudes.max()) / 2)
+        self.longitude_origem = float((longitudes.min() + longitudes.max()) / 2)
+        self._cos_origem = math.cos(math.radians(self.latitude_origem))
+        x, y = self.projetar(latitudes, longitudes)
+        self.x0 = float(x.min()) - self.raio
+        self.y0 = float(y.min()) - self.raio
+        largura = float(x.max()) + self.raio - self.x0
+        altura = float(y.max()) + self.raio - self.y0
+
+        tamanho = tamanho_celula or self.TAMANHO_CELULA
+        tamanho = max(tamanho, math.sqrt(largura * altura / self.MAXIMO_CELULAS))
+        self.tamanho_celula = tamanho
+        self.nx = max(1, math.ceil(largura / tamanho))
+        self.ny = max(1, math.ceil(altura / tamanho))
+
+        # Deslocamentos (linha, coluna) das células que podem estar no raio
+        alcance = math.ceil(self.raio / tamanho)
+        deslocamentos = np.arange(-alcance, alcance + 1)
+        di, dj = np.meshgrid(deslocamentos, deslocamentos, indexing='ij')
+        self._di, self._dj = di.ravel(), dj.ravel()
+
+        n_celulas = self.nx * self.ny
+        self._pesos = {m: np.zeros(n_celulas) for m in self.metricas}
+        self._ponderada = {m: np.zeros(n_celulas) for m in self.metricas}
+        self._contagem = {m: np.zeros(n_celulas, dtype=np.int64) for m in self.metricas}
+        self._valores_grade: Dict[str, np.ndarray] = {}
+
+        # Estado de cada dispositivo já incorporado
+        self._indices: Dict[str, int] = {}
+        self._x = np.empty(0)
+        self._y = np.empty(0)
+        self._valores = {m: np.empty(0) for m in self.metricas}
+
+    def projetar(self, latitudes, longitudes):
+        """Latitude/longitude (graus) -> (x, y) em metros a partir da origem"""
+        x = (np.radians(np.asarray(longitudes, dtype=np.float64) - self.longitude_origem)
+             * self._cos_origem * _RAIO_TERRA)
+        y = np.radians(np.asarray(latitudes, dtype=np.float64) - self.latitude_origem) * _RAIO_TERRA
+        return x, y
+
+    def cobre(self, latitudes, longitudes) -> np.ndarray:
+        """Se cada posição está dentro da grade (longe das bordas pelo raio)"""
+        x, y = self.projetar(latitudes, longitudes)
+        return ((x - self.raio >= self.x0) & (x + self.raio <= self.x0 + self.nx * self.tamanho_celula)
+                & (y - self.raio >= self.y0) & (y + self.raio <= self.y0 + self.ny * self.tamanho_celula))
+
+    def _contribuicoes(self, x: np.ndarray, y: np.ndarray):
+        """(célula, peso, dispositivo) de cada par dispositivo-célula no raio"""
+        linha = np.floor((y - self.y0) / self.tamanho_celula).astype(np.int64)
+        coluna = np.floor((x - self.x0) / self.tamanho_celula).astype(np.int64)
+        linhas = linha[:, None] + self._di[None, :]
+        colunas = coluna[:, None] + self._dj[None, :]
+        distancias = np.hypot(self.x0 + (colunas + 0.5) * self.tamanho_celula - x[:, None],
+                              self.y0 + (linhas + 0.5) * self.tamanho_celula - y[:, None])
+        dentro = ((linhas >= 0) & (linhas < self.ny) & (colunas >= 0) & (colunas < self.nx)
+                  & (distancias <= self.raio))
+        pesos = np.maximum(distancias[dentro], self.DISTANCIA_MINIMA) ** -self.potencia
+        dispositivo = np.nonzero(dentro)[0]
+        return (linhas * self.nx + colunas)[dentro], pesos, dispositivo
+
+    def _aplicar(self, x: np.ndarray, y: np.ndarray, valores: Dict[str, np.ndarray], sinal: int):
+        """Soma (sinal 1) ou subtrai (-1) as contribuições de dispositivos"""
+        if not len(x):
+            return
+        celulas, pesos, dispositivo = self._contribuicoes(x, y)
+        n_celulas = self.nx * self.ny
+        for m in self.metricas:
+            valor = valores[m][dispositivo]
+            presentes = ~np.isnan(valor)
+            alvo = celulas[presentes]
+            self._pesos[m] += sinal * np.bincount(alvo, pesos[presentes], n_celulas)
+            self._ponderada[m] += sinal * np.bincount(
+                alvo, pesos[presentes] * valor[presentes], n_celulas
+            )
+            self._contagem[m] += sinal * np.bincount(alvo, minlength=n_celulas)
+            # Sem dispositivos no raio a soma volta a zero exato (sem resíduo)
+            vazias = self._contagem[m][alvo] == 0
+            self._pesos[m][alvo[vazias]] = 0.0
+            self._ponderada[m][alvo[vazias]] = 0.0
+            self._valores_grade.pop(m, None)
+
+    def atualizar(self, dispositivos: List[str], latitudes: np.ndarray,
+                  longitudes: np.ndarray, valores: Dict[str, np.ndarray]) -> int:
+        """
+        Incorpora posições e leituras mais recentes de dispositivos
+
+        Dispositivos sem mudança de posição nem de valor são ignorados; os
+        demais têm a contribuição antiga retirada e a nova somada.
+
+        Args:
+            dispositivos: Identificadores
+            latitudes, longitudes: Posição de cada dispositivo (graus)
+            valores: Métrica -> valor de cada dispositivo (NaN = ausente)
+
+        Returns:
+            Número de dispositivos que mudaram
+        """
+        x, y = self.projetar(latitudes, longitudes)
+        novos = {m: np.asarray(valores[m], dtype=np.float64) for m in self.metricas}
+
+        indices = np.array([self._indices.get(d, -1) for d in dispositivos], dtype=np.int64)
+        conhecidos = indices >= 0
+        antigos = indices[conhecidos]
+        mudou = np.ones(len(dispositivos), dtype=bool)
+        if len(antigos):
+            igual = (self._x[antigos] == x[conhecidos]) & (self._y[antigos] == y[conhecidos])
+            for m in self.metricas:
+                a, b = self._valores[m][antigos], novos[m][conhecidos]
+                igual &= (a == b) | (np.isnan(a) & np.isnan(b))
+            mudou[conhecidos] = ~igual
+
+        # Retira as contribuições antigas dos dispositivos conhecidos que mudaram
+        saem = indices[conhecidos & mudou]
+        self._aplicar(self._x[saem], self._y[saem],
+                      {m: v[saem] for m, v in self._valores.items()}, -1)
+
+        # Novos dispositivos ganham uma posição no estado
+        chegam = np.flatnonzero(~conhecidos)
+        if len(chegam):
+            inicio = len(self._x)
+            for deslocamento, posicao in enumerate(chegam.tolist()):
+                self._indices[dispositivos[posicao]] = inicio + deslocamento
+            indices[chegam] = inicio + np.arange(len(chegam))
+            self._x = np.concatenate([self._x, np.full(len(chegam), np.nan)])
+            self._y = np.concatenate([self._y, np.full(len(chegam), np.nan)])
+            for m in self.metricas:
+                self._valores[m] = np.concatenate([self._valores[m], np.full(len(chegam), np.nan)])
+
+        alterados = indices[mudou]
+        self._x[alterados] = x[mudou]
+        self._y[alterados] = y[mudou]
+        for m in self.metricas:
+            self._valores[m][alterados] = novos[m][mudou]
+        self._aplicar(x[mudou], y[mudou], {m: v[mudou] for m, v in novos.items()}, 1)
+        return int(mudou.sum())
+
+    def valores(self, metrica: str = 'umidade') -> np.ndarray:
+        """
+        Grade interpolada (linhas = latitude crescente, colunas = longitude)
+
+        Returns:
+            Array (ny, nx); NaN nas células sem dispositivo no raio
+        """
+        grade = self._valores_grade.get(metrica)
+        if grade is None:
+            with np.errstate(invalid='ignore', divide='ignore'):
+                grade = np.where(self._contagem[metrica] > 0,
+                                 self._ponderada[metrica] / self._pesos[metrica], np.nan)
+            grade = grade.reshape(self.ny, self.nx)
+            grade.flags.writeable = False
+            self._valores_grade[metrica] = grade
+        return grade
+
+    def coordenadas(self):
+        """(latitudes das linhas, longitudes das colunas) dos centros das células"""
+        centros_y = self.y0 + (np.arange(self.ny) + 0.5) * self.tamanho_celula
+        centros_x = self.x0 + (np.arange(self.nx) + 0.5) * self.tamanho_celula
+        latitudes = self.latitude_origem + np.degrees(centros_y / _RAIO_TERRA)
+        longitudes = self.longitude_origem + np.degrees(centros_x / (_RAIO_TERRA * self._cos_origem))
+        return latitudes, longitudes
+
+    def __len__(self) -> int:
+        return len(self._indices)
@@ -0,0 +1,215 @@
+"""
+Índice de acionamentos da bomba em intervalos (run-length)
+Tempo ligado, ciclo de trabalho e acionamentos de um período em O(log n)
+"""
+
+from typing import Dict, Optional
+
+import numpy as np
+
+from .historico_colunar import US_POR_SEGUNDO
+
+
+class IntervalosBomba:
+    """
+    Períodos em que a bomba esteve ligada, como intervalos [início, fim)
+
+    Cada leitura com bomba ligada vale até a leitura seguinte, limitada a
+    `lacuna_maxima_us` (o mesmo critério do tempo de bomba dos rollups);
+    leituras ligadas contíguas formam um único intervalo. Os intervalos
+    fechados ficam em arrays ordenados com a soma acumulada das durações,
+    então qualquer período é respondido com duas buscas binárias. O
+    intervalo em curso (bomba ligada na última leitura) termina, até a
+    próxima leitura, no instante da última leitura.
+
+    Leituras atrasadas mudam apenas o trecho entre a leitura anterior a
+    elas e a seguinte: substituir_desde localiza por busca binária o
+    primeiro intervalo afetado e refaz somente os intervalos dali em
+    diante, então o custo depende do atraso e não do tamanho do índice.
+    """
+
+    CAPACIDADE_INICIAL = 256
+
+    def __init__(self, lacuna_maxima_us: int):
+        self.lacuna_maxima_us = lacuna_maxima_us
+        self.n = 0
+        self._inicios = np.zeros(self.CAPACIDADE_INICIAL, dtype=np.int64)
+        self._fins = np.zeros(self.CAPACIDADE_INICIAL, dtype=np.int64)
+        # _acumulado[i] = duração total dos i primeiros intervalos
+        self._acumulado = np.zeros(self.CAPACIDADE_INICIAL + 1, dtype=np.int64)
+        self._aberto: Optional[int] = None
+        self._ultimo_ts: Optional[int] = None
+
+    def __len__(self) -> int:
+        return self.n + (self._aberto is not None)
+
+    def _reservar(self, extra: int):
+        capacidade = len(self._inicios)
+        if self.n + extra <= capacidade:
+            return
+        nova = max(2 * capacidade, self.n + extra)
+        for nome, tamanho in (('_inicios', nova), ('_fins', nova), ('_acumulado', nova + 1)):
+            maior = np.zeros(tamanho, dtype=np.int64)
+            atual = getattr(self, nome)
+            maior[:len(atual)] = atual
+            setattr(self, nome, maior)
+
+    def _fechar(self, inicios: np.ndarray, fins: np.ndarray):
+        """Anexa intervalos fechados (ordenados, posteriores aos existentes)"""
+        k = len(inicios)
+        if not k:
+            return
+        self._reservar(k)
+        self._inicios[self.n:self.n + k] = inicios
+        self._fins[self.n:self.n + k] = fins
+        self._acumulado[self.n + 1:self.n + k + 1] = (
+            self._acumulado[self.n] + np.cumsum(fins - inicios)
+        )
+        self.n += k
+
+    def adicionar(self, timestamp_us: int, ligada: bool):
+        """
+        Registra o estado da bomba em uma leitura posterior às anteriores
+
+        Leituras atrasadas são ignoradas aqui; para incorporá-las use
+        substituir_desde.
+        """
+        ultimo = self._ultimo_ts
+        if ultimo is not None and timestamp_us < ultimo:
+            return
+        if self._aberto is not None:
+            limite = ultimo + self.lacuna_maxima_us
+            if timestamp_us > limite:
+                self._fechar(np.array([self._aberto]), np.array([limite]))
+                self._aberto = None
+            elif not ligada:
+                self._fechar(np.array([self._aberto]), np.array([timestamp_us]))
+                self._aberto = None
+        if ligada and self._aberto is None:
+            self._aberto = timestamp_us
+        self._ultimo_ts = timestamp_us
+
+    def adicionar_lote(self, timestamp_us: np.ndarray, ligada: np.ndarray):
+        """
+        Registra um lote ordenado por tempo (vetorizado)
+
+        Leituras anteriores à última registrada são ignoradas (ver
+        substituir_desde).
+
+        Args:
+            timestamp_us: Timestamps em ordem crescente
+            ligada: Estado da bomba em cada leitura
+        """
+        ts = np.asarray(timestamp_us, dtype=np.int64)
+        ligada = np.asarray(ligada, dtype=bool)
+        if self._ultimo_ts is not None:
+            em_ordem = ts >= self._ultimo_ts
+            ts, ligada = ts[em_ordem], ligada[em_ordem]
+        if not len(ts):
+            return
+        if self._ultimo_ts is not None:
+            # A última leitura anterior ao lote abre a sequência
+            ts = np.r_[self._ultimo_ts, ts]
+            ligada = np.r_[self._aberto is not None, ligada]
+
+        # Trecho de cada leitura ligada: até a próxima, limitado pela lacuna;
+        # a última fica em aberto (termina no próprio instante)
+        fins = np.minimum(np.append(ts[1:], ts[-1]), ts + self.lacuna_maxima_us)
+        inicios = ts[ligada]
+        fins = fins[ligada]
+        if self._aberto is not None:
+            inicios[0] = self._aberto
+        if not len(inicios):
+            self._ultimo_ts = int(ts[-1])
+            return
+
+        # Trechos contíguos formam um intervalo
+        novos = np.flatnonzero(np.r_[True, inicios[1:] > fins[:-1]])
+        ultimos = np.r_[novos[1:] - 1, len(inicios) - 1]
+        inicios, fins = inicios[novos], fins[ultimos]
+        if ligada[-1]:
+            self._fechar(inicios[:-1], fins[:-1])
+            self._aberto = int(inicios[-1])
+        else:
+            self._fechar(inicios, fins)
+            self._aberto = None
+        self._ultimo_ts = int(ts[-1])
+
+    def substituir_desde(self, timestamp_us: np.ndarray, ligada: np.ndarray):
+        """
+        Refaz o índice a partir de timestamp_us[0] com a sequência informada
+
+        Usado para leituras atrasadas: a sequência deve conter todas as
+        leituras (já registradas e novas) com timestamp a partir do
+        primeiro. Os intervalos que começam antes dele são mantidos; o que
+        o contém (ou termina nele) é reaberto e continua com a sequência.
+
+        Args:
+            timestamp_us: Timestamps em ordem crescente
+            ligada: Estado da bomba em cada leitura
+        """
+        ts = np.asarray(timestamp_us, dtype=np.int64)
+        if not len(ts):
+            return
+        inicio = int(ts[0])
+        if self._ultimo_ts is None or inicio > self._ultimo_ts:
+            self.adicionar_lote(ts, ligada)
+            return
+
+        reaberto = None
+        k = int(np.searchsorted(self._fins[:self.n], inicio, side='left'))
+        if self._aberto is not None and self._aberto < inicio:
+            reaberto = self._aberto
+        elif k < self.n and self._inicios[k] < inicio:
+            reaberto = int(self._inicios[k])
+        # As somas acumuladas dos intervalos mantidos continuam válidas
+        self.n = k
+        self._aberto = reaberto
+        self._ultimo_ts = inicio if reaberto is not None else None
+        self.adicionar_lote(ts, ligada)
+
+    def _tempo_fechados(self, inicio_us: int, fim_us: int):
+        """Tempo ligado (µs) e intervalos fechados que intersectam o período"""
+        inicios, fins = self._inicios[:self.n], self._fins[:self.n]
+        a = int(np.searchsorted(fins, inicio_us, side='right'))
+        b = int(np.searchsorted(inicios, fim_us, side='left'))
+        if a >= b:
+            return 0, a, a
+        tempo = int(self._acumulado[b] - self._acumulado[a])
+        tempo -= max(0, inicio_us - int(inicios[a]))
+        tempo -= max(0, int(fins[b - 1]) - fim_us)
+        return tempo, a, b
+
+    def uso(self, inicio_us: int, fim_us: int) -> Dict:
+        """
+        Uso da bomba em [inicio_us, fim_us)
+
+        Returns:
+            Dicionário com 'segundos_ligada', 'ciclo_trabalho' (% do
+            período) e 'acionamentos' (intervalos iniciados no período)
+        """
+        tempo, _, _ = self._tempo_fechados(inicio_us, fim_us)
+        inicios = self._inicios[:self.n]
+        acionamentos = int(np.searchsorted(inicios, fim_us) - np.searchsorted(inicios, inicio_us))
+        if self._aberto is not None:
+            tempo += max(0, min(self._ultimo_ts, fim_us) - max(self._aberto, inicio_us))
+            acionamentos += inicio_us <= self._aberto < fim_us
+        duracao = fim_us - inicio_us
+        return {
+            'segundos_ligada': tempo / US_POR_SEGUNDO,
+            'ciclo_trabalho': round(tempo / duracao * 100, 2) if duracao > 0 else 0.0,
+            'acionamentos': int(acionamentos),
+        }
+
+    def intervalos(self, inicio_us: int, fim_us: int) -> Dict[str, np.ndarray]:
+        """Intervalos ligados que intersectam o período (cortados nas bordas)"""
+        _, a, b = self._tempo_fechados(inicio_us, fim_us)
+        inicios = self._inicios[a:b]
+        fins = self._fins[a:b]
+        if self._aberto is not None and self._aberto < fim_us and self._ultimo_ts >= inicio_us:
+            inicios = np.append(inicios, self._aberto)
+            fins = np.append(fins, self._ultimo_ts)
+        return {
+            'inicio': np.maximum(inicios, inicio_us).astype('datetime64[us]'),
+            'fim': np.minimum(fins, fim_us).astype('datetime64[us]'),
+        }
@@ -0,0 +1,319 @@
+"""
+Agregação em janelas deslizantes de tempo para leituras de sensores
+Responde "últimos 15 min / 1 h / 24 h" sem percorrer o histórico
+"""
+
+import math
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Union
+
+import numpy as np
+
+from .historico_colunar import datetime_para_us, US_POR_SEGUNDO
+
+
+# Janelas consultadas pelo dashboard (nome -> segundos)
+JANELAS_PADRAO = {
+    '15min': 15 * 60,
+    '1h': 60 * 60,
+    '24h': 24 * 60 * 60,
+}
+
+# Faixas dos histogramas usados no percentil 95 (mínimo, máximo, nº de classes)
+FAIXAS_HISTOGRAMA = {
+    'umidade': (0.0, 100.0, 100),
+    'ph': (0.0, 14.0, 70),
+    'temperatura': (-20.0, 60.0, 80),
+}
+
+
+class AgregadorJanelas:
+    """
+    Agregados por janela de tempo com buckets de largura fixa
+
+    Cada leitura atualiza as somas parciais do seu bucket (contagem, soma,
+    min, max e histograma por métrica, mais leituras com bomba ligada),
+    compartilhadas por todas as janelas. O bucket em curso é acumulado em
+    objetos Python e copiado para os arrays uma vez, quando chega uma
+    leitura de outro bucket; leituras fora de ordem vão direto para o seu
+    bucket. Uma consulta combina apenas os buckets da janela (mais o
+    bucket em curso, sem fechá-lo), com custo O(buckets) em vez de
+    O(leituras).
+    """
+
+    METRICAS = ('umidade', 'ph', 'temperatura')
+
+    def __init__(self, largura_bucket: int = 60,
+                 horizonte: int = JANELAS_PADRAO['24h']):
+        """
+        Inicializa o agregador
+
+        Args:
+            largura_bucket: Largura de cada bucket em segundos
+            horizonte: Maior janela consultável em segundos
+        """
+        self._parametros = (largura_bucket, horizonte)
+        self.largura_us = largura_bucket * US_POR_SEGUNDO
+        self.n_buckets = -(-horizonte // largura_bucket)
+        n = self.n_buckets
+
+        self._ids = np.full(n, -1, dtype=np.int64)
+        self._bomba = np.zeros(n, dtype=np.int64)
+        self._contagem = {m: np.zeros(n, dtype=np.int64) for m in self.METRICAS}
+        self._soma = {m: np.zeros(n, dtype=np.float64) for m in self.METRICAS}
+        self._minimo = {m: np.full(n, np.inf) for m in self.METRICAS}
+        self._maximo = {m: np.full(n, -np.inf) for m in self.METRICAS}
+        self._histograma = {
+            m: np.zeros((n, classes), dtype=np.int32)
+            for m, (_, _, classes) in FAIXAS_HISTOGRAMA.items()
+        }
+        # (início, classes por unidade, classes) de cada métrica, na ordem de METRICAS
+        self._faixas = [(inicio, classes / (fim - inicio), classes)
+                        for inicio, fim, classes in map(FAIXAS_HISTOGRAMA.get, self.METRICAS)]
+
+        # Bucket em curso: [bucket, leituras com bomba] + [contagem, soma,
+        # min, max] por métrica, e o histograma de cada métrica
+        self._aberto: Optional[list] = None
+        self._aberto_histogramas: Optional[List[List[int]]] = None
+        self._ultimo_bucket = -1
+
+    def _preparar_slot(self, bucket: int) -> Optional[int]:
+        """Retorna o slot do bucket, zerando-o se pertencia a um bucket antigo"""
+        slot = bucket % self.n_buckets
+        atual = self._ids[slot]
+        if atual == bucket:
+            return slot
+        if atual > bucket:
+            return None  # Bucket já saiu do horizonte
+
+        self._ids[slot] = bucket
+        self._bomba[slot] = 0
+        for m in self.METRICAS:
+            self._contagem[m][slot] = 0
+            self._soma[m][slot] = 0.0
+            self._minimo[m][slot] = np.inf
+            self._maximo[m][slot] = -np.inf
+            self._histograma[m][slot] = 0
+        return slot
+
+    def _fechar_aberto(self):
+        """Soma o bucket em curso ao seu slot"""
+        aberto, histogramas = self._aberto, self._aberto_histogramas
+        if aberto is None:
+            return
+        slot = self._preparar_slot(aberto[0])
+        if slot is not None:
+            self._bomba[slot] += aberto[1]
+            i = 2
+            for m, histograma in zip(self.METRICAS, histogramas):
+                if aberto[i]:
+                    self._contagem[m][slot] += aberto[i]
+                    self._soma[m][slot] += aberto[i + 1]
+                    self._minimo[m][slot] = min(self._minimo[m][slot], aberto[i + 2])
+                    self._maximo[m][slot] = max(self._maximo[m][slot], aberto[i + 3])
+                    self._histograma[m][slot] += np.array(histograma, dtype=np.int32)
+                i += 4
+        self._aberto = None
+        self._aberto_histogramas = None
+
+    def adicionar(self, timestamp_us: int, umidade: float, ph: float,
+                  temperatura: Optional[float], bomba: bool):
+        """
+        Incorpora uma leitura aos buckets
+
+        Args:
+            timestamp_us: Timestamp da leitura (µs desde a época)
+            umidade, ph, temperatura: Valores medidos (temperatura pode ser None/NaN)
+            bomba: Estado da bomba
+        """
+        bucket = timestamp_us // self.largura_us
+        aberto = self._aberto
+        if aberto is None or bucket != aberto[0]:
+            if bucket < self._ultimo_bucket:
+                # Fora de ordem: vai direto para o slot do seu bucket
+                self.adicionar_lote(
+                    np.array([timestamp_us]), np.array([umidade], dtype=np.float64),
+                    np.array([ph], dtype=np.float64),
+                    np.array([np.nan if temperatura is None else temperatura]),
+                    np.array([bool(bomba)])
+                )
+                return
+            self._fechar_aberto()
+            aberto = self._aberto = [bucket, 0] + [0, 0.0, math.inf, -math.inf] * len(self.METRICAS)
+            self._aberto_histogramas = [[0] * classes for _, _, classes in self._faixas]
+            self._ultimo_bucket = bucket
+
+        if bomba:
+            aberto[1] += 1
+        i = 2
+        for valor, histograma, (inicio, escala, classes) in zip(
+                (umidade, ph, temperatura), self._aberto_histogramas, self._faixas):
+            if valor is not None and valor == valor:
+                aberto[i] += 1
+                aberto[i + 1] += valor
+                if valor < aberto[i + 2]:
+                    aberto[i + 2] = valor
+                if valor > aberto[i + 3]:
+                    aberto[i + 3] = valor
+                classe = int((valor - inicio) * escala)
+                histograma[0 if classe < 0 else classes - 1 if classe >= classes else classe] += 1
+            i += 4
+
+    def adicionar_lote(self, timestamp_us: np.ndarray, umidade: np.ndarray,
+                       ph: np.ndarray, temperatura: np.ndarray, bomba: np.ndarray):
+        """
+        Incorpora um lote de leituras de forma vetorizada
+
+        Os valores são agrupados por bucket (bincount/reduceat) e somados aos
+        slots de uma vez.
+
+        Args:
+            timestamp_us: Timestamps (µs desde a época)
+            umidade, ph, temperatura: Valores medidos (NaN = ausente)
+            bomba: Estado da bomba por leitura
+        """
+        buckets = np.asarray(timestamp_us, dtype=np.int64) // self.largura_us
+        if not len(buckets):
+            return
+        self._fechar_aberto()
+
+        ultimo = max(self._ultimo_bucket, int(buckets.max()))
+        recentes = buckets > ultimo - self.n_buckets
+        if not recentes.all():
+            buckets = buckets[recentes]
+            umidade, ph = umidade[recentes], ph[recentes]
+            temperatura, bomba = temperatura[recentes], bomba[recentes]
+            if not len(buckets):
+                return
+
+        ordem = None
+        if len(buckets) > 1 and (buckets[1:] < buckets[:-1]).any():
+            ordem = np.argsort(buckets, kind='stable')
+            buckets = buckets[ordem]
+        unicos, inicios = np.unique(buckets, return_index=True)
+        grupo = np.repeat(np.arange(len(unicos)), np.diff(np.append(inicios, len(buckets))))
+
+        # Prepara os slots: zera os que pertenciam a buckets mais antigos
+        slots = unicos % self.n_buckets
+        atuais = self._ids[slots]
+        aceitos = atuais <= unicos
+        zerar = slots[atuais < unicos]
+        self._ids[zerar] = unicos[atuais < unicos]
+        self._bomba[zerar] = 0
+        for m in self.METRICAS:
+            self._contagem[m][zerar] = 0
+            self._soma[m][zerar] = 0.0
+            self._minimo[m][zerar] = np.inf
+            self._maximo[m][zerar] = -np.inf
+            self._histograma[m][zerar] = 0
+
+        n_grupos = len(unicos)
+        bomba = np.asarray(bomba if ordem is None else bomba[ordem], dtype=np.float64)
+        self._bomba[slots[aceitos]] += np.bincount(grupo, bomba, n_grupos)[aceitos].astype(np.int64)
+
+        valores_por_metrica = (('umidade', umidade), ('ph', ph), ('temperatura', temperatura))
+        for m, valores in valores_por_metrica:
+            valores = np.asarray(valores if ordem is None else valores[ordem], dtype=np.float64)
+            presentes = ~np.isnan(valores)
+            contagem = np.bincount(grupo[presentes], minlength=n_grupos)
+            soma = np.bincount(grupo[presentes], valores[presentes], n_grupos)
+            minimo = np.fmin.reduceat(valores, inicios)
+            maximo = np.fmax.reduceat(valores, inicios)
+
+            inicio, fim, classes = FAIXAS_HISTOGRAMA[m]
+            classe = ((valores[presentes] - inicio) * (classes / (fim - inicio))).astype(np.int64)
+            np.clip(classe, 0, classes - 1, out=classe)
+            histograma = np.bincount(
+                grupo[presentes] * classes + classe, minlength=n_grupos * classes
+            ).reshape(n_grupos, classes)
+
+            alvo = slots[aceitos]
+            self._contagem[m][alvo] += contagem[aceitos]
+            self._soma[m][alvo] += soma[aceitos]
+            self._minimo[m][alvo] = np.fmin(self._minimo[m][alvo], minimo[aceitos])
+            self._maximo[m][alvo] = np.fmax(self._maximo[m][alvo], maximo[aceitos])
+            self._histograma[m][alvo] += histograma[aceitos].astype(np.int32)
+        self._ultimo_bucket = ultimo
+
+    def _percentil(self, metrica: str, histograma: np.ndarray, q: float) -> Optional[float]:
+        total = histograma.sum()
+        if not total:
+            return None
+        inicio, fim, classes = FAIXAS_HISTOGRAMA[metrica]
+        classe = int(np.searchsorted(np.cumsum(histograma), q * total))
+        # Limite superior da classe: estimativa conservadora do percentil
+        return inicio + (classe + 1) * (fim - inicio) / classes
+
+    def consultar(self, janela: Union[str, int],
+                  referencia: Optional[datetime] = None) -> Dict:
+        """
+        Agregados de uma janela terminando em `referencia`
+
+        Args:
+            janela: Nome de JANELAS_PADRAO ou duração em segundos
+            referencia: Fim da janela (padrão: agora)
+
+        Returns:
+            Dicionário com total de leituras, média/min/max/p95 por métrica
+            e ciclo de trabalho da bomba (% das leituras com bomba ligada).
+            A janela é alinhada aos buckets (resolução de um bucket).
+        """
+        nome = janela if isinstance(janela, str) else None
+        segundos = JANELAS_PADRAO[janela] if nome else int(janela)
+        referencia = referencia or datetime.now()
+        bucket_ref = datetime_para_us(referencia) // self.largura_us
+        n = -(-segundos * US_POR_SEGUNDO // self.largura_us)
+        primeiro = bucket_ref - min(n, self.n_buckets) + 1
+
+        mascara = (self._ids >= primeiro) & (self._ids <= bucket_ref)
+        # Bucket em curso, copiado (a consulta não o fecha)
+        aberto, histogramas = self._aberto, self._aberto_histogramas
+        if aberto is not None and primeiro <= aberto[0] <= bucket_ref:
+            aberto, histogramas = list(aberto), [list(h) for h in histogramas]
+        else:
+            aberto = None
+
+        resultado = {'janela_s': segundos}
+        total = 0
+        for i, m in enumerate(self.METRICAS):
+            contagem = int(self._contagem[m][mascara].sum())
+            soma = float(self._soma[m][mascara].sum())
+            minimo = self._minimo[m][mascara].min(initial=np.inf)
+            maximo = self._maximo[m][mascara].max(initial=-np.inf)
+            histograma = self._histograma[m][mascara].sum(axis=0)
+            if aberto is not None and aberto[2 + 4 * i]:
+                contagem_aberto, soma_aberto, minimo_aberto, maximo_aberto = aberto[2 + 4 * i:6 + 4 * i]
+                contagem += contagem_aberto
+                soma += soma_aberto
+                minimo = min(minimo, minimo_aberto)
+                maximo = max(maximo, maximo_aberto)
+                histograma = histograma + np.array(histogramas[i])
+            if m == 'umidade':
+                total = contagem
+            if not contagem:
+                resultado[m] = None
+                continue
+
+            p95 = min(max(self._percentil(m, histograma, 0.95), minimo), maximo)
+            resultado[m] = {
+                'media': round(soma / contagem, 2),
+                'minimo': round(float(minimo), 2),
+                'maximo': round(float(maximo), 2),
+                'p95': round(float(p95), 2),
+            }
+
+        bomba = int(self._bomba[mascara].sum()) + (aberto[1] if aberto is not None else 0)
+        resultado['total_leituras'] = total
+        resultado['ciclo_bomba'] = round(bomba / total * 100, 1) if total else 0.0
+        return resultado
+
+    def consultar_varias(self, janelas: Optional[Iterable] = None,
+                         referencia: Optional[datetime] = None) -> Dict[str, Dict]:
+        """Consulta várias janelas com a mesma referência"""
+        referencia = referencia or datetime.now()
+        janelas = janelas or JANELAS_PADRAO.keys()
+        return {str(j): self.consultar(j, referencia) for j in janelas}
+
+    def limpar(self):
+        """Descarta todos os buckets"""
+        self.__init__(*self._parametros)
@@ -0,0 +1,327 @@
+"""
+Log persistente de leituras em segmentos binários mapeados em memória
+Mantém o histórico de sensores entre reinícios do dashboard
+"""
+
+import json
+import os
+import struct
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+import numpy as np
+
+from .historico_colunar import US_POR_SEGUNDO
+
+
+# Registro de largura fixa (24 bytes, little-endian)
+DTYPE_REGISTRO = np.dtype([
+    ('timestamp', '<i8'),
+    ('umidade', '<f4'),
+    ('ph', '<f4'),
+    ('temperatura', '<f4'),
+    ('flags', 'u1'),
+    ('_reservado', 'V3'),
+])
+_FORMATO_REGISTRO = struct.Struct('<qfffB3x')
+
+MAGICO = b'FTLOG001'
+_CABECALHO = struct.Struct('<8sII')  # mágico, tamanho do registro, reservado
+TAMANHO_CABECALHO = _CABECALHO.size
+
+ARQUIVO_INDICE = 'indice.json'
+
+
+class _Segmento:
+    """Metadados de um arquivo de segmento"""
+
+    __slots__ = ('caminho', 'registros', 'ts_min', 'ts_max')
+
+    def __init__(self, caminho: Path, registros: int = 0,
+                 ts_min: Optional[int] = None, ts_max: Optional[int] = None):
+        self.caminho = caminho
+        self.registros = registros
+        self.ts_min = ts_min
+        self.ts_max = ts_max
+
+    def mapear(self) -> np.ndarray:
+        """Mapeia os registros do segmento (somente leitura)"""
+        if not self.registros:
+            return np.empty(0, dtype=DTYPE_REGISTRO)
+        return np.memmap(self.caminho, dtype=DTYPE_REGISTRO, mode='r',
+                         offset=TAMANHO_CABECALHO, shape=(self.registros,))
+
+    def para_dict(self) -> Dict:
+        return {
+            'arquivo': self.caminho.name,
+            'registros': self.registros,
+            'ts_min': self.ts_min,
+            'ts_max': self.ts_max,
+        }
+
+
+class LogSensores:
+    """
+    Log append-only de leituras em segmentos de registros de largura fixa
+
+    Cada segmento é um arquivo com cabeçalho curto seguido de registros
+    DTYPE_REGISTRO. O segmento ativo é fechado e um novo é aberto ao
+    atingir o tamanho máximo ou a duração máxima. Um índice (indice.json)
+    guarda o intervalo de tempo de cada segmento fechado, de modo que a
+    abertura só precisa mapear os arquivos. Um registro incompleto no fim
+    do segmento ativo (queda durante a escrita) é truncado na abertura.
+    """
+
+    TAMANHO_SEGMENTO = 64 * 1024 * 1024     # bytes
+    DURACAO_SEGMENTO = 24 * 60 * 60          # segundos
+
+    def __init__(self, diretorio: str,
+                 tamanho_segmento: Optional[int] = None,
+                 duracao_segmento: Optional[int] = None):
+        """
+        Abre (ou cria) o log no diretório informado
+
+        Args:
+            diretorio: Pasta dos segmentos
+            tamanho_segmento: Tamanho máximo de um segmento em bytes
+            duracao_segmento: Intervalo de tempo máximo de um segmento em segundos
+        """
+        self.diretorio = Path(diretorio)
+        self.diretorio.mkdir(parents=True, exist_ok=True)
+        tamanho = tamanho_segmento or self.TAMANHO_SEGMENTO
+        self.registros_por_segmento = max(1, (tamanho - TAMANHO_CABECALHO) // DTYPE_REGISTRO.itemsize)
+        self.duracao_us = (duracao_segmento or self.DURACAO_SEGMENTO) * US_POR_SEGUNDO
+
+        self._segmentos: List[_Segmento] = []
+        self._arquivo = None
+        self._recuperar()
+
+    # ------------------------------------------------------------------
+    # Abertura e recuperação
+    # ------------------------------------------------------------------
+
+    def _caminho_segmento(self, numero: int) -> Path:
+        return self.diretorio / f"segmento_{numero:08d}.log"
+
+    def _ler_indice(self) -> Dict[str, Dict]:
+        caminho = self.diretorio / ARQUIVO_INDICE
+        if not caminho.exists():
+            return {}
+        try:
+            with open(caminho, 'r', encoding='utf-8') as f:
+                return {s['arquivo']: s for s in json.load(f)['segmentos']}
+        except (ValueError, KeyError):
+            return {}  # Índice corrompido: intervalos são recalculados
+
+    def _gravar_indice(self):
+        """Grava o índice de forma atômica (arquivo temporário + replace)"""
+        caminho = self.diretorio / ARQUIVO_INDICE
+        temporario = caminho.with_suffix('.tmp')
+        fechados = [s.para_dict() for s in self._segmentos[:-1]]
+        with open(temporario, 'w', encoding='utf-8') as f:
+            json.dump({'versao': 1, 'segmentos': fechados}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporario, caminho)
+
+    def _recuperar(self):
+        """Mapeia os segmentos existentes e repara o segmento ativo"""
+        indice = self._ler_indice()
+        arquivos = sorted(self.diretorio.glob('segmento_*.log'))
+
+        for posicao, caminho in enumerate(arquivos):
+            ativo = posicao == len(arquivos) - 1
+            info = indice.get(caminho.name)
+            if info and not ativo:
+                self._segmentos.append(_Segmento(
+                    caminho, info['registros'], info['ts_min'], info['ts_max']
+                ))
+                continue
+
+            registros = self._reparar(caminho)
+            segmento = _Segmento(caminho, registros)
+            self._atualizar_intervalo(segmento, segmento.mapear()['timestamp'])
+            self._segmentos.append(segmento)
+
+        if not self._segmentos:
+            self._novo_segmento()
+        else:
+            self._arquivo = open(self._segmentos[-1].caminho, 'ab')
+
+    def _reparar(self, caminho: Path) -> int:
+        """
+        Trunca um registro incompleto no final do arquivo
+
+        Returns:
+            Número de registros íntegros
+        """
+        tamanho = caminho.stat().st_size
+        if tamanho < TAMANHO_CABECALHO:
+            with open(caminho, 'wb') as f:
+                f.write(_CABECALHO.pack(MAGICO, DTYPE_REGISTRO.itemsize, 0))
+            return 0
+
+        with open(caminho, 'rb') as f:
+            magico, tamanho_registro, _ = _CABECALHO.unpack(f.read(TAMANHO_CABECALHO))
+        if magico != MAGICO or tamanho_registro != DTYPE_REGISTRO.itemsize:
+            raise ValueError(f"Segmento inválido ou de versão incompatível: {caminho}")
+
+        registros = (tamanho - TAMANHO_CABECALHO) // DTYPE_REGISTRO.itemsize
+        integro = TAMANHO_CABECALHO + registros * DTYPE_REGISTRO.itemsize
+        if integro != tamanho:
+            print(f"⚠️ Registro incompleto truncado em {caminho.name} "
+                  f"({tamanho - integro} bytes)")
+            os.truncate(caminho, integro)
+        return registros
+
+    @staticmethod
+    def _atualizar_intervalo(segmento: _Segmento, timestamps: np.ndarray):
+        if len(timestamps):
+            minimo, maximo = int(timestamps.min()), int(timestamps.max())
+            segmento.ts_min = minimo if segmento.ts_min is None else min(segmento.ts_min, minimo)
+            segmento.ts_max = maximo if segmento.ts_max is None else max(segmento.ts_max, maximo)
+
+    # ------------------------------------------------------------------
+    # Escrita
+    # ------------------------------------------------------------------
+
+    def _novo_segmento(self):
+        """Fecha o segmento ativo e abre o próximo"""
+        if self._arquivo:
+            self._arquivo.flush()
+            os.fsync(self._arquivo.fileno())
+            self._arquivo.close()
+
+        numero = int(self._segmentos[-1].caminho.stem.split('_')[1]) + 1 if self._segmentos else 0
+        caminho = self._caminho_segmento(numero)
+        self._arquivo = open(caminho, 'wb')
+        self._arquivo.write(_CABECALHO.pack(MAGICO, DTYPE_REGISTRO.itemsize, 0))
+        self._segmentos.append(_Segmento(caminho))
+        if len(self._segmentos) > 1:
+            self._gravar_indice()
+
+    def _precisa_rolar(self, timestamp_us: int) -> bool:
+        ativo = self._segmentos[-1]
+        if ativo.registros >= self.registros_por_segmento:
+            return True
+        return ativo.ts_min is not None and timestamp_us - ativo.ts_min >= self.duracao_us
+
+    def anexar(self, timestamp_us: int, umidade: float, ph: float,
+               temperatura: float, flags: int):
+        """Anexa uma leitura ao segmento ativo"""
+        if self._precisa_rolar(timestamp_us):
+            self._novo_segmento()
+        self._arquivo.write(_FORMATO_REGISTRO.pack(timestamp_us, umidade, ph, temperatura, flags))
+        self._arquivo.flush()
+
+        ativo = self._segmentos[-1]
+        ativo.registros += 1
+        ativo.ts_min = timestamp_us if ativo.ts_min is None else min(ativo.ts_min, timestamp_us)
+        ativo.ts_max = timestamp_us if ativo.ts_max is None else max(ativo.ts_max, timestamp_us)
+
+    def anexar_lote(self, colunas: Dict[str, np.ndarray]):
+        """
+        Anexa um lote de leituras (colunas no formato de HistoricoColunar)
+
+        O lote é dividido entre segmentos conforme os limites de tamanho e
+        duração e gravado com uma escrita por segmento.
+        """
+        n = len(colunas['timestamp'])
+        registros = np.zeros(n, dtype=DTYPE_REGISTRO)
+        for nome in ('timestamp', 'umidade', 'ph', 'temperatura', 'flags'):
+            registros[nome] = colunas[nome]
+
+        posicao = 0
+        while posicao < n:
+            if self._precisa_rolar(int(registros['timestamp'][posicao])):
+                self._novo_segmento()
+            ativo = self._segmentos[-1]
+            fim = min(n, posicao + self.registros_por_segmento - ativo.registros)
+
+            limite = (ativo.ts_min if ativo.ts_min is not None
+                      else int(registros['timestamp'][posicao])) + self.duracao_us
+            fora = np.flatnonzero(registros['timestamp'][posicao:fim] >= limite)
+            if len(fora):
+                fim = posicao + max(1, int(fora[0]))
+
+            parte = registros[posicao:fim]
+            self._arquivo.write(parte.tobytes())
+            ativo.registros += len(parte)
+            self._atualizar_intervalo(ativo, parte['timestamp'])
+            posicao = fim
+        self._arquivo.flush()
+
+    def sincronizar(self):
+        """Força a gravação em disco do segmento ativo (fsync)"""
+        self._arquivo.flush()
+        os.fsync(self._arquivo.fileno())
+
+    def fechar(self):
+        """Sincroniza e fecha o segmento ativo"""
+        if self._arquivo:
+            self.sincronizar()
+            self._arquivo.close()
+            self._arquivo = None
+
+    # ------------------------------------------------------------------
+    # Leitura
+    # ------------------------------------------------------------------
+
+    def __len__(self) -> int:
+        return sum(s.registros for s in self._segmentos)
+
+    @staticmethod
+    def _colunas(registros: np.ndarray) -> Dict[str, np.ndarray]:
+        return {nome: registros[nome] for nome in ('timestamp', 'umidade', 'ph', 'temperatura', 'flags')}
+
+    def ultimos(self, n: int) -> Dict[str, np.ndarray]:
+        """
+        Retorna os n registros mais recentes (ordem de gravação)
+
+        Returns:
+            Dicionário coluna -> array; são views do arquivo mapeado quando
+            os registros estão em um único segmento
+        """
+        partes = []
+        restantes = n
+        for segmento in reversed(self._segmentos):
+            if restantes <= 0:
+                break
+            mapa = segmento.mapear()
+            partes.append(mapa[max(0, len(mapa) - restantes):])
+            restantes -= len(mapa)
+
+        if not partes:
+            return self._colunas(np.empty(0, dtype=DTYPE_REGISTRO))
+        if len(partes) == 1:
+            return self._colunas(partes[0])
+        return self._colunas(np.concatenate(partes[::-1]))
+
+    def ler_intervalo(self, inicio_us: int, fim_us: int) -> Dict[str, np.ndarray]:
+        """
+        Retorna os registros com timestamp em [inicio_us, fim_us]
+
+        Apenas os segmentos cujo intervalo no índice cruza o pedido são mapeados.
+        """
+        partes = []
+        for segmento in self._segmentos:
+            if segmento.ts_min is None or segmento.ts_max < inicio_us or segmento.ts_min > fim_us:
+                continue
+            mapa = segmento.mapear()
+            ts = mapa['timestamp']
+            partes.append(mapa[(ts >= inicio_us) & (ts <= fim_us)])
+
+        if not partes:
+            return self._colunas(np.empty(0, dtype=DTYPE_REGISTRO))
+        return self._colunas(np.concatenate(partes))
+
+    def iterar_segmentos(self) -> Iterator[Dict[str, np.ndarray]]:
+        """Percorre todo o log, um segmento mapeado por vez (ordem de gravação)"""
+        for segmento in self._segmentos:
+            mapa = segmento.mapear()
+            if len(mapa):
+                yield self._colunas(mapa)
+
+    def segmentos(self) -> List[Dict]:
+        """Lista os segmentos com contagem e intervalo de tempo"""
+        return [s.para_dict() for s in self._segmentos]
@@ -0,0 +1,80 @@
+"""
+Monitoramento de dispositivos que pararam de enviar dados
+Heap de mínimo com o prazo do próximo envio esperado de cada dispositivo
+"""
+
+import heapq
+from typing import Dict, List, Tuple
+
+
+class MonitorAtividade:
+    """
+    Prazos de envio de muitos dispositivos, ordenados em um heap de mínimo
+
+    Cada dispositivo tem no máximo um item no heap. Como os prazos só
+    avançam a cada envio, registrar um envio apenas atualiza o prazo no
+    dicionário (O(1)); o item antigo é corrigido quando chega ao topo do
+    heap, sendo reinserido com o prazo atual (O(log n)). Encontrar os
+    dispositivos vencidos custa O(k log n) para k itens vencidos, sem
+    percorrer os dispositivos em dia.
+    """
+
+    def __init__(self):
+        self._heap: List[Tuple[float, str]] = []
+        self._prazos: Dict[str, float] = {}
+        # Prazo do item de cada dispositivo no heap (itens com outro prazo
+        # são cópias obsoletas e são descartadas ao sair do topo)
+        self._no_heap: Dict[str, float] = {}
+        self._vencidos: Dict[str, float] = {}
+
+    def __len__(self) -> int:
+        return len(self._prazos)
+
+    def registrar(self, dispositivo: str, prazo: float):
+        """
+        Registra um envio do dispositivo
+
+        Args:
+            dispositivo: Identificador do dispositivo
+            prazo: Instante (time.monotonic) até o qual o próximo envio
+                deve chegar
+        """
+        self._prazos[dispositivo] = prazo
+        self._vencidos.pop(dispositivo, None)
+        no_heap = self._no_heap.get(dispositivo)
+        if no_heap is None or prazo < no_heap:
+            heapq.heappush(self._heap, (prazo, dispositivo))
+            self._no_heap[dispositivo] = prazo
+
+    def remover(self, dispositivo: str):
+        """Deixa de acompanhar o dispositivo"""
+        self._prazos.pop(dispositivo, None)
+        self._no_heap.pop(dispositivo, None)
+        self._vencidos.pop(dispositivo, None)
+
+    def vencidos(self, agora: float) -> Dict[str, float]:
+        """
+        Dispositivos cujo prazo de envio já passou
+
+        Args:
+            agora: Instante atual (time.monotonic)
+
+        Returns:
+            Dicionário dispositivo -> segundos de atraso além do prazo,
+            do mais atrasado ao menos atrasado
+        """
+        heap = self._heap
+        while heap and heap[0][0] <= agora:
+            prazo, dispositivo = heapq.heappop(heap)
+            if self._no_heap.get(dispositivo) != prazo:
+                continue
+            atual = self._prazos[dispositivo]
+            if atual > prazo:
+                # Houve envios depois deste item: volta ao heap com o prazo atual
+                heapq.heappush(heap, (atual, dispositivo))
+                self._no_heap[dispositivo] = atual
+            else:
+                del self._no_heap[dispositivo]
+                self._vencidos[dispositivo] = prazo
+        return {dispositivo: agora - prazo
+                for dispositivo, prazo in sorted(self._vencidos.items(), key=lambda item: item[1])}
@@ -0,0 +1,233 @@
+"""
+Previsão de umidade do solo por dispositivo
+Modelo autorregressivo (AR) ajustado por mínimos quadrados sobre uma grade
+regular, com estatísticas suficientes atualizadas a cada intervalo
+"""
+
+import math
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from .historico_colunar import US_POR_SEGUNDO
+
+
+class PrevisorUmidade:
+    """
+    Modelos AR(p) de umidade de muitos dispositivos
+
+    Cada dispositivo tem um modelo u[t] = c + a1·u[t-1] + ... + ap·u[t-p]
+    sobre a média da umidade em intervalos de `passo` segundos. O ajuste só
+    depende das somas X'X e X'y, mantidas por dispositivo com fator de
+    esquecimento (os intervalos antigos perdem peso, e o modelo acompanha a
+    estação): incorporar novos intervalos custa O(p²) por intervalo, sem
+    rever o histórico. Os coeficientes ficam em cache e apenas os
+    dispositivos com estatísticas novas são reajustados, todos em uma única
+    chamada de np.linalg.solve. A previsão itera o modelo a partir dos
+    últimos p intervalos, para todos os dispositivos de uma vez.
+
+    Todos os dispositivos compartilham a mesma grade de tempo (intervalos
+    alinhados a múltiplos de `passo` desde a época).
+    """
+
+    PASSO = 15 * 60  # segundos
+    ORDEM = 4
+    ESQUECIMENTO = 0.998  # por intervalo (meia-vida de ~3,6 dias com 15 min)
+    REGULARIZACAO = 1.0
+    # Abaixo deste número efetivo de intervalos o modelo é a persistência
+    # (repete o último valor)
+    MINIMO_AMOSTRAS = 24
+    JANELA_INICIAL = 7 * 24 * 3600  # segundos de histórico no primeiro ajuste
+
+    def __init__(self, passo: Optional[float] = None, ordem: Optional[int] = None,
+                 esquecimento: Optional[float] = None):
+        """
+        Args:
+            passo: Largura de cada intervalo da grade (segundos)
+            ordem: Número de intervalos anteriores usados pelo modelo
+            esquecimento: Peso de cada intervalo em relação ao seguinte (0 a 1]
+        """
+        self.passo = passo or self.PASSO
+        self.passo_us = int(self.passo * US_POR_SEGUNDO)
+        self.ordem = ordem or self.ORDEM
+        self.esquecimento = esquecimento or self.ESQUECIMENTO
+        # Início do próximo intervalo esperado (None = nenhum ainda)
+        self.proximo_us: Optional[int] = None
+
+        p = self.ordem
+        self._indices: Dict[str, int] = {}
+        self._dispositivos: List[str] = []
+        self._recentes = np.empty((0, p))  # Últimos p intervalos, do mais antigo ao mais novo
+        self._xtx = np.empty((0, p + 1, p + 1))
+        self._xty = np.empty((0, p + 1))
+        self._amostras = np.empty(0)  # Número efetivo (ponderado) de intervalos
+        self._coeficientes = np.empty((0, p + 1))
+        self._desatualizados = np.empty(0, dtype=bool)
+
+    def __len__(self) -> int:
+        return len(self._dispositivos)
+
+    @property
+    def dispositivos(self) -> List[str]:
+        return list(self._dispositivos)
+
+    def intervalos_pendentes(self, agora_us: int) -> Tuple[int, int]:
+        """
+        Período [inicio, fim) dos intervalos já fechados e ainda não incorporados
+
+        No primeiro ajuste cobre JANELA_INICIAL; o intervalo em curso só
+        entra quando fecha.
+        """
+        fim = agora_us // self.passo_us * self.passo_us
+        if self.proximo_us is None:
+            return fim - math.ceil(self.JANELA_INICIAL / self.passo) * self.passo_us, fim
+        return self.proximo_us, max(self.proximo_us, fim)
+
+    def _incluir(self, dispositivos: List[str]):
+        novos = [d for d in dict.fromkeys(dispositivos) if d not in self._indices]
+        if not novos:
+            return
+        inicio = len(self._dispositivos)
+        for deslocamento, dispositivo in enumerate(novos):
+            self._indices[dispositivo] = inicio + deslocamento
+        self._dispositivos.extend(novos)
+        k, p = len(novos), self.ordem
+        self._recentes = np.concatenate([self._recentes, np.full((k, p), np.nan)])
+        self._xtx = np.concatenate([self._xtx, np.zeros((k, p + 1, p + 1))])
+        self._xty = np.concatenate([self._xty, np.zeros((k, p + 1))])
+        self._amostras = np.concatenate([self._amostras, np.zeros(k)])
+        self._coeficientes = np.concatenate([self._coeficientes, np.zeros((k, p + 1))])
+        self._desatualizados = np.concatenate([self._desatualizados, np.ones(k, dtype=bool)])
+
+    def atualizar(self, dispositivos: List[str], inicio_us: int, grade: np.ndarray) -> int:
+        """
+        Incorpora intervalos fechados da grade
+
+        Intervalos anteriores a `proximo_us` (já incorporados) são
+        ignorados; um salto depois dele conta como intervalos sem leituras.
+        Dispositivos conhecidos ausentes de `dispositivos` também ficam
+        sem leituras nesses intervalos.
+
+        Args:
+            dispositivos: Dispositivo de cada linha da grade
+            inicio_us: Início do primeiro intervalo (múltiplo de passo_us)
+            grade: Média da umidade (dispositivos x intervalos); NaN =
+                intervalo sem leituras
+
+        Returns:
+            Número de intervalos incorporados
+        """
+        grade = np.asarray(grade, dtype=np.float64).reshape(len(dispositivos), -1)
+        if self.proximo_us is not None:
+            ja_vistos = max(0, -(-(self.proximo_us - inicio_us) // self.passo_us))
+            grade = grade[:, ja_vistos:]
+            inicio_us += ja_vistos * self.passo_us
+        k = grade.shape[1]
+        if not k:
+            return 0
+
+        self._incluir(dispositivos)
+        p = self.ordem
+        salto = 0 if self.proximo_us is None else (inicio_us - self.proximo_us) // self.passo_us
+        novos = np.full((len(self._dispositivos), min(salto, p) + k), np.nan)
+        novos[[self._indices[d] for d in dispositivos], -k:] = grade
+
+        # Janelas (p anteriores + alvo) de cada novo intervalo, em todos os dispositivos
+        serie = np.concatenate([self._recentes, novos], axis=1)
+        janelas = sliding_window_view(serie, p + 1, axis=1)
+        x = np.concatenate([np.ones(janelas.shape[:2] + (1,)), janelas[..., :p]], axis=2)
+        y = janelas[..., p]
+        validas = ~(np.isnan(y) | np.isnan(janelas[..., :p]).any(axis=2))
+        x = np.where(validas[..., None], x, 0.0)
+        y = np.where(validas, y, 0.0)
+
+        # Peso de cada janela: esquecimento elevado ao número de intervalos
+        # até o fim da atualização (o salto também desconta as somas antigas)
+        n = janelas.shape[1]
+        pesos = self.esquecimento ** np.arange(n - 1, -1, -1, dtype=np.float64)
+        decaimento = self.esquecimento ** (salto + k)
+        ponderado = np.swapaxes(x * pesos[None, :, None], 1, 2)
+        self._xtx = decaimento * self._xtx + ponderado @ x
+        self._xty = decaimento * self._xty + (ponderado @ y[..., None])[..., 0]
+        self._amostras = decaimento * self._amostras + validas @ pesos
+        self._desatualizados |= validas.any(axis=1)
+
+        self._recentes = serie[:, -p:]
+        self.proximo_us = inicio_us + k * self.passo_us
+        return k
+
+    def _ajustar(self):
+        """Resolve os mínimos quadrados dos dispositivos com estatísticas novas"""
+        indices = np.flatnonzero(self._desatualizados)
+        if not len(indices):
+            return
+        p = self.ordem
+        persistencia = np.zeros(p + 1)
+        persistencia[p] = 1.0  # Coeficiente do intervalo mais recente
+
+        suficientes = indices[self._amostras[indices] >= self.MINIMO_AMOSTRAS]
+        self._coeficientes[indices] = persistencia
+        if len(suficientes):
+            # Regularização só nos coeficientes AR: uma série constante
+            # (sensor travado) deixa X'X singular
+            regularizacao = self.REGULARIZACAO * np.diag(np.r_[0.0, np.ones(p)])
+            self._coeficientes[suficientes] = np.linalg.solve(
+                self._xtx[suficientes] + regularizacao, self._xty[suficientes][..., None]
+            )[..., 0]
+        self._desatualizados[indices] = False
+
+    def coeficientes(self) -> Dict[str, np.ndarray]:
+        """Coeficientes (c, a_p, ..., a_1) de cada dispositivo"""
+        self._ajustar()
+        return {d: self._coeficientes[i].copy() for d, i in self._indices.items()}
+
+    def prever(self, horas: float = 6.0,
+               dispositivos: Optional[List[str]] = None) -> Dict:
+        """
+        Prevê a umidade dos próximos intervalos
+
+        Args:
+            horas: Horizonte da previsão (recomendado até 6 h)
+            dispositivos: Dispositivos previstos (padrão: todos)
+
+        Returns:
+            Dicionário com 'timestamp' (início de cada intervalo previsto,
+            datetime64), 'dispositivos' e 'umidade' (dispositivos x
+            intervalos, limitada a 0-100%; NaN para dispositivos sem
+            leituras nos últimos `ordem` intervalos)
+        """
+        if horas <= 0:
+            raise ValueError("O horizonte da previsão deve ser positivo")
+        self._ajustar()
+        if dispositivos is None:
+            dispositivos = self._dispositivos
+        nomes = [d for d in dispositivos if d in self._indices]
+        linhas = np.array([self._indices[d] for d in nomes], dtype=np.int64)
+        passos = math.ceil(horas * 3600 / self.passo)
+
+        # Intervalos recentes sem leitura repetem o último valor conhecido
+        recentes = self._recentes[linhas]
+        if recentes.size:
+            recentes = recentes.copy()
+            for j in range(1, self.ordem):
+                vazios = np.isnan(recentes[:, j])
+                recentes[vazios, j] = recentes[vazios, j - 1]
+            for j in range(self.ordem - 2, -1, -1):
+                vazios = np.isnan(recentes[:, j])
+                recentes[vazios, j] = recentes[vazios, j + 1]
+
+        coeficientes = self._coeficientes[linhas]
+        previsao = np.empty((len(linhas), passos))
+        for h in range(passos):
+            valor = coeficientes[:, 0] + np.einsum('di,di->d', coeficientes[:, 1:], recentes)
+            valor = np.clip(valor, 0.0, 100.0)
+            previsao[:, h] = valor
+            recentes = np.concatenate([recentes[:, 1:], valor[:, None]], axis=1)
+
+        inicio = self.proximo_us or 0
+        return {
+            'timestamp': (inicio + np.arange(passos) * self.passo_us).astype('datetime64[us]'),
+            'dispositivos': nomes,
+            'umidade': previsao,
+        }
@@ -0,0 +1,282 @@
+"""
+Regras de alerta declarativas avaliadas em lote
+Cada regra vira uma máscara NumPy sobre as colunas do histórico
+"""
+
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .alertas import TipoAlerta
+from .historico_colunar import FLAG_FOSFORO, FLAG_POTASSIO, FLAG_BOMBA
+
+
+OPERADORES = {
+    '<': np.less,
+    '<=': np.less_equal,
+    '>': np.greater,
+    '>=': np.greater_equal,
+    '==': np.equal,
+    '!=': np.not_equal,
+}
+
+SEVERIDADES = ('OK', 'ATENÇÃO', 'CRÍTICO')
+
+# Campos booleanos extraídos da coluna de flags (valem 0/1 nas regras)
+_METRICAS_FLAGS = {
+    'fosforo': FLAG_FOSFORO,
+    'potassio': FLAG_POTASSIO,
+    'bomba': FLAG_BOMBA,
+}
+
+# Atributo de SensorData de cada métrica, para a máquina de alertas
+_CAMPOS_LEITURA = {
+    'fosforo': 'fosforo_presente',
+    'potassio': 'potassio_presente',
+    'bomba': 'bomba_ligada',
+}
+
+
+@dataclass(frozen=True)
+class RegraAlerta:
+    """
+    Regra de alerta sobre uma métrica
+
+    O escopo (dispositivo, talhão, cultura) restringe onde a regra vale;
+    campos None valem para qualquer valor. Entre regras de mesmo nome que
+    se aplicam a uma leitura, vale a mais específica
+    (dispositivo > talhão > cultura > geral).
+
+    A mesma regra alimenta a avaliação em lote (TabelaRegras.avaliar) e a
+    máquina de alertas (TabelaRegras.tipos_alerta), que usa a mensagem e
+    a histerese.
+    """
+    nome: str
+    metrica: str  # 'umidade', 'ph', 'temperatura', 'fosforo', 'potassio' ou 'bomba'
+    operador: str  # Chave de OPERADORES
+    limiar: float
+    severidade: str = 'ATENÇÃO'  # 'ATENÇÃO' ou 'CRÍTICO'
+    mensagem: str = ''  # Aceita {valor}
+    dispositivo: Optional[str] = None
+    talhao: Optional[str] = None
+    cultura: Optional[str] = None
+    histerese: float = 0.0
+
+    def __post_init__(self):
+        if self.operador not in OPERADORES:
+            raise ValueError(f"Operador inválido: {self.operador}")
+        if self.severidade not in SEVERIDADES[1:]:
+            raise ValueError(f"Severidade inválida: {self.severidade}")
+
+    def especificidade(self, dispositivo: Optional[str], talhao: Optional[str],
+                       cultura: Optional[str]) -> int:
+        """Peso do escopo para o contexto informado (-1 = não se aplica)"""
+        peso = 0
+        for valor_regra, valor, peso_campo in ((self.dispositivo, dispositivo, 4),
+                                               (self.talhao, talhao, 2),
+                                               (self.cultura, cultura, 1)):
+            if valor_regra is None:
+                continue
+            if valor_regra != valor:
+                return -1
+            peso += peso_campo
+        return peso
+
+
+def regras_padrao(limiar_umidade: float, limiar_umidade_critica: float,
+                  ph_minimo: float, ph_maximo: float) -> List[RegraAlerta]:
+    """Regras gerais do SensorHandler (limiares de umidade e pH)"""
+    return [
+        RegraAlerta('umidade_baixa', 'umidade', '<', limiar_umidade, 'ATENÇÃO',
+                    "ATENÇÃO: Umidade do solo baixa", histerese=2.0),
+        RegraAlerta('umidade_critica', 'umidade', '<', limiar_umidade_critica, 'CRÍTICO',
+                    f"CRÍTICO: Umidade do solo muito baixa (<{limiar_umidade_critica:g}%)",
+                    histerese=2.0),
+        RegraAlerta('ph_acido', 'ph', '<', ph_minimo, 'ATENÇÃO', "pH muito ácido ({valor})",
+                    histerese=0.1),
+        RegraAlerta('ph_alcalino', 'ph', '>', ph_maximo, 'ATENÇÃO',
+                    "pH muito alcalino ({valor})", histerese=0.1),
+        RegraAlerta('fosforo_ausente', 'fosforo', '==', 0, 'ATENÇÃO',
+                    "Fósforo (P) não detectado"),
+        RegraAlerta('potassio_ausente', 'potassio', '==', 0, 'ATENÇÃO',
+                    "Potássio (K) não detectado"),
+    ]
+
+
+def _direcao(regra: RegraAlerta) -> Optional[Tuple[bool, float]]:
+    """(abaixo, limiar) da regra como TipoAlerta; None se não for um limiar"""
+    if regra.operador in ('<', '<='):
+        return True, regra.limiar
+    if regra.operador in ('>', '>='):
+        return False, regra.limiar
+    if regra.metrica in _METRICAS_FLAGS:
+        # Flags valem 0/1: igualdade vira limiar em 0,5
+        ligada = bool(regra.limiar) == (regra.operador == '==')
+        return not ligada, 0.5
+    return None
+
+
+class TabelaRegras:
+    """
+    Tabela de regras compilada em máscaras vetorizadas
+
+    O escopo é resolvido uma vez por dispositivo distinto do lote; a
+    comparação em si é uma operação NumPy por regra efetiva, então avaliar
+    um lote ou o histórico inteiro de vários dispositivos custa uma
+    passada sobre os dados.
+    """
+
+    def __init__(self, regras: Sequence[RegraAlerta]):
+        self.regras = list(regras)
+        # Nomes na ordem de primeira definição
+        self.nomes = list(dict.fromkeys(r.nome for r in self.regras))
+
+    def tipos_alerta(self, dispositivo: Optional[str] = None, talhao: Optional[str] = None,
+                     cultura: Optional[str] = None) -> List[TipoAlerta]:
+        """
+        Tipos de alerta da MaquinaAlertas para um dispositivo
+
+        Usa a regra efetiva de cada nome no contexto informado. Regras
+        ATENÇÃO e CRÍTICO sobre a mesma métrica e direção formam um único
+        tipo com dois níveis (nomeado pela primeira delas). '<=' e '>='
+        são tratados como '<' e '>'; igualdades só valem para as flags
+        (nas demais métricas ficam restritas à avaliação em lote).
+        """
+        tipos: List[dict] = []
+        for nome in self.nomes:
+            regra = self._resolver(nome, dispositivo, talhao, cultura)
+            direcao = regra and _direcao(regra)
+            if not direcao:
+                continue
+            abaixo, limiar = direcao
+            nivel = 'critico' if regra.severidade == 'CRÍTICO' else 'atencao'
+            mensagem = "⚠️ " + (regra.mensagem or f"{regra.nome} ({{valor}})")
+            grupo = next((t for t in tipos
+                          if t['metrica'] == regra.metrica and t['abaixo'] == abaixo
+                          and nivel not in t), None)
+            if grupo is None:
+                grupo = {'nome': nome, 'metrica': regra.metrica, 'abaixo': abaixo,
+                         'histerese': 0.0}
+                tipos.append(grupo)
+            grupo[nivel] = (limiar, mensagem)
+            grupo['histerese'] = max(grupo['histerese'], regra.histerese)
+
+        # Nível ausente (ex.: só regra CRÍTICO) fica sem limiar
+        return [
+            TipoAlerta(
+                t['nome'], _CAMPOS_LEITURA.get(t['metrica'], t['metrica']), t['abaixo'],
+                *t.get('atencao', (None, '')),
+                *t.get('critico', (None, None)),
+                histerese=t['histerese'],
+            )
+            for t in tipos
+        ]
+
+    def _resolver(self, nome: str, dispositivo: Optional[str], talhao: Optional[str],
+                  cultura: Optional[str]) -> Optional[RegraAlerta]:
+        """Regra de maior especificidade para o contexto (a última em empate)"""
+        melhor, melhor_peso = None, -1
+        for regra in self.regras:
+            if regra.nome != nome:
+                continue
+            peso = regra.especificidade(dispositivo, talhao, cultura)
+            if peso >= melhor_peso and peso >= 0:
+                melhor, melhor_peso = regra, peso
+        return melhor
+
+    @staticmethod
+    def _codificar(dispositivos: np.ndarray, nomes: Optional[Sequence[str]]):
+        """(dispositivos distintos, índice de cada leitura nessa lista)"""
+        if nomes is not None:
+            return list(nomes), np.asarray(dispositivos, dtype=np.intp)
+        unicos, indices = np.unique(np.asarray(dispositivos), return_inverse=True)
+        return unicos.tolist(), indices
+
+    @staticmethod
+    def _valores(colunas: Dict[str, np.ndarray], metrica: str) -> np.ndarray:
+        if metrica in _METRICAS_FLAGS:
+            return (colunas['flags'] & _METRICAS_FLAGS[metrica]) != 0
+        return colunas[metrica]
+
+    def avaliar(self, colunas: Dict[str, np.ndarray],
+                dispositivos: Optional[np.ndarray] = None,
+                talhoes: Optional[Dict[str, str]] = None,
+                culturas: Optional[Dict[str, str]] = None,
+                nomes_dispositivos: Optional[Sequence[str]] = None) -> Dict[str, np.ndarray]:
+        """
+        Avalia todas as regras sobre um lote de leituras
+
+        Args:
+            colunas: Colunas no formato de HistoricoColunar ('umidade',
+                'ph', 'temperatura', 'flags')
+            dispositivos: Dispositivo de cada leitura (padrão: todas do
+                mesmo dispositivo, sem nome)
+            talhoes: Dispositivo -> talhão
+            culturas: Talhão -> cultura
+            nomes_dispositivos: Se informado, `dispositivos` contém índices
+                inteiros nesta lista (evita comparar strings por leitura)
+
+        Returns:
+            Dicionário nome da regra -> máscara booleana por leitura
+        """
+        talhoes = talhoes or {}
+        culturas = culturas or {}
+        n = len(colunas['flags'])
+        if dispositivos is None:
+            unicos, indices = [None], np.zeros(n, dtype=np.intp)
+        else:
+            unicos, indices = self._codificar(dispositivos, nomes_dispositivos)
+
+        mascaras = {}
+        for nome in self.nomes:
+            # Regra efetiva de cada dispositivo distinto
+            efetivas = []
+            for dispositivo in unicos:
+                talhao = talhoes.get(dispositivo)
+                efetivas.append(self._resolver(nome, dispositivo, talhao, culturas.get(talhao)))
+
+            mascara = np.zeros(n, dtype=bool)
+            distintas = {id(r): r for r in efetivas if r is not None}
+            for regra in distintas.values():
+                valores = self._valores(colunas, regra.metrica)
+                comparacao = OPERADORES[regra.operador](valores, regra.limiar)
+                if len(distintas) == 1 and all(r is regra for r in efetivas):
+                    mascara = comparacao
+                else:
+                    aplica = np.array([r is regra for r in efetivas])[indices]
+                    mascara |= comparacao & aplica
+            mascaras[nome] = mascara
+        return mascaras
+
+    def severidade(self, mascaras: Dict[str, np.ndarray]) -> np.ndarray:
+        """
+        Maior severidade ativa por leitura (0 = OK, 1 = ATENÇÃO, 2 = CRÍTICO)
+
+        A severidade de cada nome é a maior entre as regras com esse nome.
+        """
+        n = len(next(iter(mascaras.values()))) if mascaras else 0
+        saida = np.zeros(n, dtype=np.int8)
+        for nome, mascara in mascaras.items():
+            nivel = max(SEVERIDADES.index(r.severidade) for r in self.regras if r.nome == nome)
+            np.maximum(saida, np.where(mascara, nivel, 0).astype(np.int8), out=saida)
+        return saida
+
+    def resumir(self, mascaras: Dict[str, np.ndarray],
+                dispositivos: Optional[np.ndarray] = None,
+                nomes_dispositivos: Optional[Sequence[str]] = None) -> Dict:
+        """
+        Contagem de leituras em alerta por regra (e por dispositivo)
+
+        Returns:
+            Dicionário nome -> total ou nome -> {dispositivo: total}
+        """
+        if dispositivos is None:
+            return {nome: int(m.sum()) for nome, m in mascaras.items()}
+        unicos, indices = self._codificar(dispositivos, nomes_dispositivos)
+        return {
+            nome: dict(zip(unicos,
+                           np.bincount(indices, weights=m, minlength=len(unicos))
+                           .astype(int).tolist()))
+            for nome, m in mascaras.items()
+        }
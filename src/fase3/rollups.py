@@ -0,0 +1,545 @@
+"""
+Rollups em múltiplas resoluções para históricos longos de sensores
+Agregados de 1 min, 15 min, 1 h e 1 dia mantidos incrementalmente, com
+um sketch de quantis por bucket
+"""
+
+import math
+from datetime import datetime
+from typing import Callable, Dict, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .historico_colunar import datetime_para_us, US_POR_SEGUNDO
+from .intervalos_bomba import IntervalosBomba
+from .sketches import (
+    DDSketch, SketchesPorBucket, NUM_INDICES, QUANTIS_PADRAO,
+    indice_valor, indices_valores
+)
+
+
+# Níveis de agregação (nome -> largura em segundos), do mais fino ao mais grosso
+NIVEIS = {
+    '1min': 60,
+    '15min': 15 * 60,
+    '1h': 60 * 60,
+    '1d': 24 * 60 * 60,
+}
+
+# Retenção de cada nível em segundos (None = sem limite)
+RETENCAO = {
+    '1min': 7 * 24 * 60 * 60,
+    '15min': 90 * 24 * 60 * 60,
+    '1h': 2 * 365 * 24 * 60 * 60,
+    '1d': None,
+}
+
+METRICAS = ('umidade', 'ph', 'temperatura')
+
+
+def _campos():
+    campos = {'bucket': np.int64, 'bomba_segundos': np.float64}
+    for m in METRICAS:
+        campos[f'{m}_contagem'] = np.int64
+        campos[f'{m}_soma'] = np.float64
+        campos[f'{m}_min'] = np.float64
+        campos[f'{m}_max'] = np.float64
+    return campos
+
+
+CAMPOS = _campos()
+
+# Instante (µs) -> (timestamps, bomba) das leituras já incorporadas a partir
+# dele, em ordem; None se não forem todas conhecidas
+LeiturasDesde = Callable[[int], Optional[Tuple[np.ndarray, np.ndarray]]]
+
+
+def agregar_por_bucket(buckets: np.ndarray, valores: Dict[str, np.ndarray],
+                       bomba_segundos: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    Agrega leituras por bucket de forma vetorizada
+
+    Args:
+        buckets: Bucket de cada leitura (não precisa estar ordenado)
+        valores: Métrica -> valores por leitura (NaN = ausente)
+        bomba_segundos: Segundos de bomba ligada atribuídos a cada leitura
+
+    Returns:
+        Dicionário no formato de CAMPOS, um item por bucket (ordenado)
+    """
+    ordem = np.argsort(buckets, kind='stable')
+    buckets = buckets[ordem]
+    unicos, inicios = np.unique(buckets, return_index=True)
+    grupo = np.repeat(np.arange(len(unicos)), np.diff(np.append(inicios, len(buckets))))
+    n = len(unicos)
+
+    saida = {
+        'bucket': unicos,
+        'bomba_segundos': np.bincount(grupo, bomba_segundos[ordem], n),
+    }
+    for m in METRICAS:
+        v = np.asarray(valores[m], dtype=np.float64)[ordem]
+        presentes = ~np.isnan(v)
+        saida[f'{m}_contagem'] = np.bincount(grupo[presentes], minlength=n)
+        saida[f'{m}_soma'] = np.bincount(grupo[presentes], v[presentes], n)
+        saida[f'{m}_min'] = np.fmin.reduceat(v, inicios)
+        saida[f'{m}_max'] = np.fmax.reduceat(v, inicios)
+    return saida
+
+
+class NivelRollup:
+    """
+    Série de buckets de um nível, em arrays que crescem por duplicação
+
+    Os buckets ficam ordenados; leituras no bucket corrente são somadas
+    em Python e buckets atrasados são mesclados por busca binária. Cada
+    métrica tem também um DDSketch esparso por bucket (SketchesPorBucket).
+    """
+
+    CAPACIDADE_INICIAL = 1024
+
+    def __init__(self, largura: int, retencao: Optional[int] = None):
+        """
+        Args:
+            largura: Largura do bucket em segundos
+            retencao: Tempo mantido em segundos (None = sem limite)
+        """
+        self.largura = largura
+        self.largura_us = largura * US_POR_SEGUNDO
+        self.retencao_buckets = retencao // largura if retencao else None
+        self.n = 0
+        # Bucket mais recente mantido em lista Python enquanto recebe leituras
+        # (mesma ordem de CAMPOS), gravado nos arrays ao ser fechado
+        self._aberto: Optional[list] = None
+        # Contagens por índice do sketch de cada métrica no bucket aberto
+        self._aberto_sketches = [{} for _ in METRICAS]
+        self._dados = {
+            nome: np.zeros(self.CAPACIDADE_INICIAL, dtype=dtype)
+            for nome, dtype in CAMPOS.items()
+        }
+        self.sketches = {m: SketchesPorBucket() for m in METRICAS}
+
+    def _reservar(self, extra: int):
+        capacidade = len(self._dados['bucket'])
+        if self.n + extra <= capacidade:
+            return
+        nova = max(2 * capacidade, self.n + extra)
+        for nome, array in self._dados.items():
+            maior = np.zeros(nova, dtype=array.dtype)
+            maior[:self.n] = array[:self.n]
+            self._dados[nome] = maior
+
+    def _aplicar_retencao(self):
+        """Descarta buckets antigos quando excedem a retenção (em blocos)"""
+        if self.retencao_buckets is None or not self.n:
+            return
+        ids = self._dados['bucket']
+        limite = ids[self.n - 1] - self.retencao_buckets
+        if ids[0] > limite:
+            return
+        corte = int(np.searchsorted(ids[:self.n], limite, side='right'))
+        # Compacta apenas quando vale a pena (amortizado)
+        if corte < max(64, self.n // 4):
+            return
+        for array in self._dados.values():
+            array[:self.n - corte] = array[corte:self.n]
+        self.n -= corte
+        for sketches in self.sketches.values():
+            sketches.descartar_antes(int(ids[0]))
+
+    def _fechar_aberto(self):
+        """Grava o bucket aberto nos arrays"""
+        if self._aberto is None:
+            return
+        self._reservar(1)
+        for array, valor in zip(self._dados.values(), self._aberto):
+            array[self.n] = valor
+        self.n += 1
+        base = self._aberto[0] * NUM_INDICES
+        for m, contagens in zip(METRICAS, self._aberto_sketches):
+            if contagens:
+                indices = sorted(contagens)
+                self.sketches[m].mesclar(
+                    base + np.array(indices, dtype=np.int64),
+                    np.array([contagens[i] for i in indices], dtype=np.int64)
+                )
+                contagens.clear()
+        self._aberto = None
+        self._aplicar_retencao()
+
+    def _ultimo_bucket(self) -> Optional[int]:
+        if self._aberto is not None:
+            return self._aberto[0]
+        return int(self._dados['bucket'][self.n - 1]) if self.n else None
+
+    def adicionar(self, timestamp_us: int, umidade: float, ph: float,
+                  temperatura: Optional[float], indices: Optional[tuple] = None):
+        """
+        Incorpora uma leitura (caminho rápido para o bucket corrente)
+
+        Args:
+            indices: Índice do sketch de cada métrica (None = ausente),
+                quando já calculado para outro nível
+        """
+        valores = (umidade, ph, temperatura)
+        if indices is None:
+            indices = tuple(indice_valor(v) if v is not None and v == v else None
+                            for v in valores)
+        bucket = timestamp_us // self.largura_us
+        aberto = self._aberto
+        if aberto is None or bucket != aberto[0]:
+            ultimo = self._ultimo_bucket()
+            self._fechar_aberto()
+            if ultimo is not None and bucket < ultimo:
+                self.mesclar(agregar_por_bucket(
+                    np.array([bucket]),
+                    {'umidade': np.array([umidade]), 'ph': np.array([ph]),
+                     'temperatura': np.array([np.nan if temperatura is None else temperatura])},
+                    np.zeros(1)
+                ))
+                for m, indice in zip(METRICAS, indices):
+                    if indice is not None:
+                        self.sketches[m].mesclar(np.array([bucket * NUM_INDICES + indice]),
+                                                 np.ones(1, dtype=np.int64))
+                return
+            if bucket == ultimo:
+                # Reabre o último bucket gravado (fechado por um lote)
+                self.n -= 1
+                aberto = [array[self.n].item() for array in self._dados.values()]
+            else:
+                aberto = [bucket, 0.0] + [0, 0.0, math.inf, -math.inf] * len(METRICAS)
+            self._aberto = aberto
+
+        # Campos de cada métrica no bucket aberto: contagem, soma, min, max
+        i = 2
+        for valor, indice, contagens in zip(valores, indices, self._aberto_sketches):
+            if indice is not None:
+                aberto[i] += 1
+                aberto[i + 1] += valor
+                if valor < aberto[i + 2]:
+                    aberto[i + 2] = valor
+                if valor > aberto[i + 3]:
+                    aberto[i + 3] = valor
+                contagens[indice] = contagens.get(indice, 0) + 1
+            i += 4
+
+    def adicionar_bomba(self, timestamp_us: int, segundos: float):
+        """Soma tempo de bomba ligada ao bucket do instante informado"""
+        bucket = timestamp_us // self.largura_us
+        if self._aberto is not None and self._aberto[0] == bucket:
+            self._aberto[1] += segundos
+            return
+        ids = self._dados['bucket'][:self.n]
+        i = int(np.searchsorted(ids, bucket))
+        if i < self.n and ids[i] == bucket:
+            self._dados['bomba_segundos'][i] += segundos
+
+    def mesclar(self, agregados: Dict[str, np.ndarray]):
+        """
+        Mescla agregados por bucket (saída de agregar_por_bucket)
+
+        Buckets existentes são combinados; novos são anexados ao fim ou,
+        se atrasados, inseridos na posição ordenada.
+        """
+        novos_ids = agregados['bucket']
+        if not len(novos_ids):
+            return
+        self._fechar_aberto()
+        d = self._dados
+        ids = d['bucket'][:self.n]
+        pos = np.searchsorted(ids, novos_ids)
+        existe = pos < self.n
+        existe[existe] = ids[pos[existe]] == novos_ids[existe]
+
+        alvo = pos[existe]
+        d['bomba_segundos'][alvo] += agregados['bomba_segundos'][existe]
+        for m in METRICAS:
+            d[f'{m}_contagem'][alvo] += agregados[f'{m}_contagem'][existe]
+            d[f'{m}_soma'][alvo] += agregados[f'{m}_soma'][existe]
+            d[f'{m}_min'][alvo] = np.fmin(d[f'{m}_min'][alvo], agregados[f'{m}_min'][existe])
+            d[f'{m}_max'][alvo] = np.fmax(d[f'{m}_max'][alvo], agregados[f'{m}_max'][existe])
+
+        faltantes = ~existe
+        if not faltantes.any():
+            return
+        k = int(faltantes.sum())
+        self._reservar(k)
+        d = self._dados
+        if not self.n or novos_ids[faltantes][0] > d['bucket'][self.n - 1]:
+            for nome in CAMPOS:
+                d[nome][self.n:self.n + k] = agregados[nome][faltantes]
+        else:
+            posicoes = pos[faltantes]
+            for nome in CAMPOS:
+                atual = d[nome][:self.n]
+                d[nome][:self.n + k] = np.insert(atual, posicoes, agregados[nome][faltantes])
+        self.n += k
+        self._aplicar_retencao()
+
+    # Consultas não alteram o nível (rodam sem lock, ver SensorHandler._ler):
+    # o bucket aberto é somado ao resultado sem ser fechado. Ele é sempre
+    # posterior aos buckets gravados.
+
+    def sketch(self, metrica: str, inicio_us: int, fim_us: int) -> DDSketch:
+        """Sketch mesclado dos buckets que cobrem [inicio_us, fim_us]"""
+        bucket_inicio, bucket_fim = inicio_us // self.largura_us, fim_us // self.largura_us
+        sketch = self.sketches[metrica].intervalo(bucket_inicio, bucket_fim)
+        aberto = self._aberto
+        if aberto is not None and bucket_inicio <= aberto[0] <= bucket_fim:
+            contagens = dict(self._aberto_sketches[METRICAS.index(metrica)])
+            if contagens:
+                sketch.contagens[np.fromiter(contagens.keys(), dtype=np.int64)] += (
+                    np.fromiter(contagens.values(), dtype=np.int64)
+                )
+                sketch.n += sum(contagens.values())
+        return sketch
+
+    def intervalo(self, inicio_us: int, fim_us: int) -> Dict[str, np.ndarray]:
+        """Cópia dos buckets que cobrem [inicio_us, fim_us], inclusive o aberto"""
+        bucket_inicio, bucket_fim = inicio_us // self.largura_us, fim_us // self.largura_us
+        ids = self._dados['bucket'][:self.n]
+        a = int(np.searchsorted(ids, bucket_inicio))
+        b = int(np.searchsorted(ids, bucket_fim, side='right'))
+        dados = {nome: array[a:b].copy() for nome, array in self._dados.items()}
+        aberto = self._aberto
+        if aberto is not None and bucket_inicio <= aberto[0] <= bucket_fim:
+            dados = {nome: np.append(valores, valor)
+                     for (nome, valores), valor in zip(dados.items(), list(aberto))}
+        return dados
+
+
+class RollupsSensores:
+    """
+    Conjunto de níveis de rollup alimentados a cada leitura
+
+    O tempo de bomba ligada é ponderado pelo tempo: cada leitura com bomba
+    ligada contribui com o intervalo até a leitura seguinte (limitado a
+    `lacuna_maxima`), atribuído ao bucket da leitura.
+
+    Uma leitura atrasada encurta o trecho da leitura anterior a ela e
+    ganha o seu próprio. Para recalculá-los, adicionar e adicionar_lote
+    recebem `leituras_desde`: função que, dado um instante em µs, devolve
+    (timestamps, bomba) das leituras já incorporadas a partir dele, em
+    ordem, ou None se não as conhece todas. Sem ela (ou com None), as
+    leituras atrasadas entram nos agregados mas não no tempo de bomba.
+    """
+
+    LACUNA_MAXIMA = 10 * 60  # segundos
+
+    def __init__(self, lacuna_maxima: Optional[int] = None):
+        self.niveis = {nome: NivelRollup(largura, RETENCAO[nome])
+                       for nome, largura in NIVEIS.items()}
+        self.lacuna_maxima_us = (lacuna_maxima or self.LACUNA_MAXIMA) * US_POR_SEGUNDO
+        self._ultimo_ts: Optional[int] = None
+        self._ultima_bomba = False
+        self.intervalos_bomba = IntervalosBomba(self.lacuna_maxima_us)
+
+    def _intercalar_bomba(self, ts: np.ndarray, bomba: np.ndarray,
+                          leituras_desde: LeiturasDesde) -> Optional[np.ndarray]:
+        """
+        Recalcula o tempo de bomba em torno de leituras atrasadas
+
+        Corrige nos níveis o trecho das leituras já incorporadas cuja
+        seguinte mudou e refaz o índice de intervalos a partir delas.
+
+        Args:
+            ts, bomba: Leituras novas, ordenadas por tempo
+
+        Returns:
+            Segundos de bomba de cada leitura nova, ou None se as leituras
+            vizinhas não forem conhecidas
+        """
+        existentes = leituras_desde(int(ts[0]) - self.lacuna_maxima_us)
+        if existentes is None:
+            return None
+        ts_existentes = np.asarray(existentes[0], dtype=np.int64)
+        bomba_existentes = np.asarray(existentes[1], dtype=bool)
+        k = len(ts_existentes)
+
+        # Sequência intercalada (empates: leitura já incorporada primeiro)
+        todas_ts = np.concatenate([ts_existentes, ts])
+        todas_bomba = np.concatenate([bomba_existentes, bomba])
+        ordem = np.argsort(todas_ts, kind='stable')
+        posicao = np.empty(len(ordem), dtype=np.int64)
+        posicao[ordem] = np.arange(len(ordem))
+
+        def segundos(t, b):
+            # Trecho até a leitura seguinte; a última ainda não tem seguinte
+            trechos = np.append(np.minimum(np.diff(t), self.lacuna_maxima_us), 0)
+            return np.where(b, trechos, 0) / US_POR_SEGUNDO
+
+        antes = segundos(ts_existentes, bomba_existentes)
+        depois = segundos(todas_ts[ordem], todas_bomba[ordem])[posicao]
+        correcoes = depois[:k] - antes
+        for i in np.flatnonzero(correcoes).tolist():
+            for nivel in self.niveis.values():
+                nivel.adicionar_bomba(int(ts_existentes[i]), float(correcoes[i]))
+
+        self.intervalos_bomba.substituir_desde(todas_ts[ordem], todas_bomba[ordem])
+        return depois[k:]
+
+    def adicionar(self, timestamp_us: int, umidade: float, ph: float,
+                  temperatura: Optional[float], bomba: bool,
+                  leituras_desde: Optional[LeiturasDesde] = None):
+        """Incorpora uma leitura em todos os níveis (ver leituras_desde na classe)"""
+        indices = tuple(indice_valor(v) if v is not None and v == v else None
+                        for v in (umidade, ph, temperatura))
+        for nivel in self.niveis.values():
+            nivel.adicionar(timestamp_us, umidade, ph, temperatura, indices)
+
+        if self._ultimo_ts is not None and timestamp_us < self._ultimo_ts:
+            # Atrasada: não altera a última leitura da sequência
+            segundos = None
+            if leituras_desde is not None:
+                segundos = self._intercalar_bomba(np.array([timestamp_us], dtype=np.int64),
+                                                  np.array([bool(bomba)]), leituras_desde)
+            if segundos is not None and segundos[0]:
+                for nivel in self.niveis.values():
+                    nivel.adicionar_bomba(timestamp_us, float(segundos[0]))
+            return
+        self.intervalos_bomba.adicionar(timestamp_us, bool(bomba))
+        if self._ultimo_ts is not None and self._ultima_bomba:
+            segundos = min(timestamp_us - self._ultimo_ts, self.lacuna_maxima_us) / US_POR_SEGUNDO
+            for nivel in self.niveis.values():
+                nivel.adicionar_bomba(self._ultimo_ts, segundos)
+        self._ultimo_ts = timestamp_us
+        self._ultima_bomba = bool(bomba)
+
+    def adicionar_lote(self, timestamp_us: np.ndarray, umidade: np.ndarray, ph: np.ndarray,
+                       temperatura: np.ndarray, bomba: np.ndarray,
+                       leituras_desde: Optional[LeiturasDesde] = None):
+        """Incorpora um lote em todos os níveis (vetorizado; ver leituras_desde na classe)"""
+        timestamp_us = np.asarray(timestamp_us, dtype=np.int64)
+        if not len(timestamp_us):
+            return
+        ordem = np.argsort(timestamp_us, kind='stable')
+        ts = timestamp_us[ordem]
+        bomba = np.asarray(bomba, dtype=bool)[ordem]
+        valores = {'umidade': np.asarray(umidade)[ordem], 'ph': np.asarray(ph)[ordem],
+                   'temperatura': np.asarray(temperatura)[ordem]}
+
+        # Tempo de bomba de cada leitura = intervalo até a próxima (limitado)
+        bomba_segundos = None
+        atrasado = self._ultimo_ts is not None and ts[0] < self._ultimo_ts
+        if atrasado and leituras_desde is not None:
+            bomba_segundos = self._intercalar_bomba(ts, bomba, leituras_desde)
+        intercalado = bomba_segundos is not None
+        if not intercalado:
+            proximos = np.append(ts[1:], ts[-1])
+            duracoes = np.minimum(proximos - ts, self.lacuna_maxima_us) / US_POR_SEGUNDO
+            bomba_segundos = np.where(bomba, duracoes, 0.0)
+
+        # Sketches: índices calculados uma vez; cada nível agrega as
+        # entradas do nível mais fino (as larguras são múltiplas entre si)
+        entradas = {}
+        for m, v in valores.items():
+            v = np.asarray(v, dtype=np.float64)
+            presentes = ~np.isnan(v)
+            entradas[m] = (ts[presentes], indices_valores(v[presentes]), None)
+
+        emenda = (not intercalado and self._ultimo_ts is not None and self._ultima_bomba
+                  and ts[0] >= self._ultimo_ts)
+        largura_anterior = None
+        for nivel in self.niveis.values():
+            nivel.mesclar(agregar_por_bucket(ts // nivel.largura_us, valores, bomba_segundos))
+            for m, (chaves, indices, contagens) in entradas.items():
+                if largura_anterior is None:
+                    codigos = chaves // nivel.largura_us * NUM_INDICES + indices
+                    codigos, contagens = np.unique(codigos, return_counts=True)
+                else:
+                    codigos = chaves * largura_anterior // nivel.largura_us * NUM_INDICES + indices
+                    ordem = np.argsort(codigos, kind='stable')
+                    codigos = codigos[ordem]
+                    inicios = np.flatnonzero(np.diff(codigos, prepend=-1))
+                    codigos = codigos[inicios]
+                    contagens = np.add.reduceat(contagens[ordem], inicios)
+                contagens = contagens.astype(np.int64, copy=False)
+                nivel.sketches[m].mesclar(codigos, contagens)
+                entradas[m] = (*np.divmod(codigos, NUM_INDICES), contagens)
+            largura_anterior = nivel.largura_us
+            if emenda:
+                segundos = min(int(ts[0]) - self._ultimo_ts, self.lacuna_maxima_us) / US_POR_SEGUNDO
+                nivel.adicionar_bomba(self._ultimo_ts, segundos)
+
+        if not intercalado:
+            self.intervalos_bomba.adicionar_lote(ts, bomba)
+        if self._ultimo_ts is None or ts[-1] >= self._ultimo_ts:
+            self._ultimo_ts = int(ts[-1])
+            self._ultima_bomba = bool(bomba[-1])
+
+    def escolher_nivel(self, inicio_us: int, fim_us: int, pontos: int) -> str:
+        """
+        Nível mais grosso que ainda fornece `pontos` pontos no intervalo
+
+        Se nenhum nível tiver resolução suficiente, usa o mais fino. Um
+        nível cuja retenção não cobre `inicio_us` nunca é escolhido: vale
+        o mais grosso entre esse e nivel_retido.
+        """
+        duracao = max(0, fim_us - inicio_us)
+        nomes = list(self.niveis)
+        escolhido = nomes[0]
+        for nome, nivel in self.niveis.items():
+            if duracao // nivel.largura_us >= pontos:
+                escolhido = nome
+        return max(escolhido, self.nivel_retido(inicio_us), key=nomes.index)
+
+    def nivel_retido(self, inicio_us: int) -> str:
+        """Nível mais fino cuja retenção ainda cobre `inicio_us`"""
+        for nome, nivel in self.niveis.items():
+            ultimo = nivel._ultimo_bucket()
+            if (nivel.retencao_buckets is None or ultimo is None
+                    or inicio_us // nivel.largura_us >= ultimo - nivel.retencao_buckets):
+                return nome
+        return nome
+
+    def sketch(self, inicio: datetime, fim: datetime, metrica: str = 'umidade',
+               nivel: Optional[str] = None) -> DDSketch:
+        """
+        Sketch de quantis de uma métrica no intervalo
+
+        O intervalo é estendido aos limites dos buckets do nível usado
+        (por padrão, o mais fino que ainda retém o início do intervalo).
+        """
+        inicio_us, fim_us = datetime_para_us(inicio), datetime_para_us(fim)
+        nivel = nivel or self.nivel_retido(inicio_us)
+        return self.niveis[nivel].sketch(metrica, inicio_us, fim_us)
+
+    def percentis(self, inicio: datetime, fim: datetime, metrica: str = 'umidade',
+                  quantis: Sequence[float] = QUANTIS_PADRAO,
+                  nivel: Optional[str] = None) -> Dict[float, Optional[float]]:
+        """Quantil -> valor de uma métrica no intervalo (erro relativo de até 1%)"""
+        return self.sketch(inicio, fim, metrica, nivel).quantis(quantis)
+
+    def consultar(self, inicio: datetime, fim: datetime, pontos: int = 500,
+                  nivel: Optional[str] = None) -> Dict:
+        """
+        Série agregada para um gráfico de `pontos` de largura
+
+        Args:
+            inicio, fim: Intervalo desejado
+            pontos: Quantidade de pontos desejada (ex.: largura do gráfico em px)
+            nivel: Força um nível específico ('1min', '15min', '1h', '1d');
+                por padrão, escolher_nivel (respeita a retenção de cada nível)
+
+        Returns:
+            Dicionário com 'nivel', 'timestamp' (início do bucket, datetime64),
+            'contagem', 'bomba_segundos' e média/min/max por métrica
+        """
+        inicio_us, fim_us = datetime_para_us(inicio), datetime_para_us(fim)
+        nivel = nivel or self.escolher_nivel(inicio_us, fim_us, pontos)
+        dados = self.niveis[nivel].intervalo(inicio_us, fim_us)
+        largura_us = self.niveis[nivel].largura_us
+
+        resultado = {
+            'nivel': nivel,
+            'timestamp': (dados['bucket'] * largura_us).astype('datetime64[us]'),
+            'contagem': dados['umidade_contagem'],
+            'bomba_segundos': dados['bomba_segundos'],
+        }
+        for m in METRICAS:
+            contagem = dados[f'{m}_contagem']
+            with np.errstate(invalid='ignore', divide='ignore'):
+                resultado[f'{m}_media'] = np.where(contagem > 0, dados[f'{m}_soma'] / contagem, np.nan)
+            resultado[f'{m}_min'] = np.where(contagem > 0, dados[f'{m}_min'], np.nan)
+            resultado[f'{m}_max'] = np.where(contagem > 0, dados[f'{m}_max'], np.nan)
+        return resultado
@@ -4,14 +4,39 @@ Adaptado da Fase 3 (painel_monitoramento.py)
 """
 
 import random
+import threading
+import time
+from contextlib import contextmanager
 from datetime import datetime, timedelta
-from typing import List, Dict, Optional
-from dataclasses import dataclass, asdict
+from typing import Callable, List, Dict, Optional, Tuple, TypeVar
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
 from aws_alert import send_alert
+from .alertas import (
+    MaquinaAlertas, tipos_alerta_anomalia, tipos_alerta_monitoramento
+)
+from .anomalias import DetectorAnomalias
+from .compressao import HistoricoComprimido, OrcamentoBytes
+from .estatisticas import EstatisticasSensores
+from .regras_alerta import TabelaRegras, regras_padrao
+from .janelas import AgregadorJanelas
+from .log_persistente import LogSensores
+from .previsao_umidade import PrevisorUmidade
+from .reamostragem import reamostrar
+from .rollups import RollupsSensores
+from .sketches import DDSketch, QUANTIS_PADRAO
+from .historico_colunar import (
+    HistoricoColunar, COLUNAS, FLAG_FOSFORO, FLAG_POTASSIO, FLAG_BOMBA,
+    datetime_para_us, us_para_datetime, empacotar_flags, US_POR_SEGUNDO
+)
 
+T = TypeVar('T')
 
 
-@dataclass
+@dataclass(slots=True)
 class SensorData:
     """Estrutura de dados para leituras de sensores"""
     timestamp: datetime
@@ -24,29 +49,519 @@ class SensorData:
     
     def to_dict(self) -> Dict:
         """Converte para dicionário"""
-        data = asdict(self)
-        data['timestamp'] = self.timestamp.isoformat()
-        return data
+        return {
+            'timestamp': self.timestamp.isoformat(),
+            'umidade': self.umidade,
+            'ph': self.ph,
+            'fosforo_presente': self.fosforo_presente,
+            'potassio_presente': self.potassio_presente,
+            'bomba_ligada': self.bomba_ligada,
+            'temperatura': self.temperatura,
+        }
     
     @classmethod
     def from_dict(cls, data: Dict) -> 'SensorData':
-        """Cria instância a partir de dicionário"""
-        data['timestamp'] = datetime.fromisoformat(data['timestamp'])
-        return cls(**data)
+        """Cria instância a partir de dicionário (não altera o dicionário)"""
+        timestamp = data['timestamp']
+        if isinstance(timestamp, str):
+            timestamp = datetime.fromisoformat(timestamp)
+        return cls(
+            timestamp,
+            data['umidade'],
+            data['ph'],
+            data['fosforo_presente'],
+            data['potassio_presente'],
+            data['bomba_ligada'],
+            data.get('temperatura'),
+        )
+    
+    @staticmethod
+    def to_records(leituras: List['SensorData']) -> List[Dict]:
+        """Converte uma lista de leituras em dicionários (ver to_dict)"""
+        return [
+            {
+                'timestamp': s.timestamp.isoformat(),
+                'umidade': s.umidade,
+                'ph': s.ph,
+                'fosforo_presente': s.fosforo_presente,
+                'potassio_presente': s.potassio_presente,
+                'bomba_ligada': s.bomba_ligada,
+                'temperatura': s.temperatura,
+            }
+            for s in leituras
+        ]
+
+
+@dataclass(frozen=True, slots=True)
+class InstantaneoSensores:
+    """
+    Estado publicado de um SensorHandler em uma versão
+
+    Contém apenas valores escalares (custo constante para montar, qualquer
+    que seja o tamanho do histórico) e não muda depois de criado, então
+    leitores podem usá-lo sem lock enquanto novas leituras chegam. As
+    colunas do histórico são copiadas à parte, só quando pedidas (ver
+    SensorHandler.colunas).
+    """
+    versao: int
+    ultima_leitura: Optional[SensorData]
+    estatisticas: Dict  # Resumo no formato de obter_estatisticas
+    escores_anomalia: Dict[str, float]
+    repeticoes: Dict[str, int]  # Leituras idênticas seguidas por métrica
+
+
+def colunas_para_sensor_data(colunas: Dict[str, np.ndarray]) -> List[SensorData]:
+    """
+    Materializa colunas do histórico em objetos SensorData
+
+    Args:
+        colunas: Dicionário coluna -> array (ver HistoricoColunar.ultimas)
+
+    Returns:
+        Lista de SensorData em ordem cronológica
+    """
+    flags = colunas['flags']
+    return [
+        SensorData(
+            timestamp=us_para_datetime(ts),
+            umidade=round(umidade, 2),
+            ph=round(ph, 2),
+            fosforo_presente=bool(f & FLAG_FOSFORO),
+            potassio_presente=bool(f & FLAG_POTASSIO),
+            bomba_ligada=bool(f & FLAG_BOMBA),
+            temperatura=None if temperatura != temperatura else round(temperatura, 1)
+        )
+        for ts, umidade, ph, temperatura, f in zip(
+            colunas['timestamp'].tolist(),
+            colunas['umidade'].tolist(),
+            colunas['ph'].tolist(),
+            colunas['temperatura'].tolist(),
+            flags.tolist()
+        )
+    ]
+
+
+def colunas_para_registros(colunas: Dict[str, np.ndarray]) -> List[Dict]:
+    """
+    Converte colunas do histórico direto em dicionários no formato de
+    SensorData.to_dict, sem criar objetos SensorData
+    
+    Args:
+        colunas: Dicionário coluna -> array (ver HistoricoColunar.ultimas)
+        
+    Returns:
+        Lista de dicionários em ordem cronológica
+    """
+    flags = colunas['flags']
+    # Mesmo texto de datetime.isoformat(): sem fração quando os µs são zero
+    timestamps = colunas['timestamp']
+    texto = timestamps.astype('datetime64[us]').astype(str)
+    sem_fracao = timestamps % 1_000_000 == 0
+    texto[sem_fracao] = texto[sem_fracao].astype('U19')
+    return [
+        {
+            'timestamp': ts,
+            'umidade': round(umidade, 2),
+            'ph': round(ph, 2),
+            'fosforo_presente': fosforo,
+            'potassio_presente': potassio,
+            'bomba_ligada': bomba,
+            'temperatura': None if temperatura != temperatura else round(temperatura, 1),
+        }
+        for ts, umidade, ph, fosforo, potassio, bomba, temperatura in zip(
+            texto.tolist(),
+            colunas['umidade'].tolist(),
+            colunas['ph'].tolist(),
+            ((flags & FLAG_FOSFORO) != 0).tolist(),
+            ((flags & FLAG_POTASSIO) != 0).tolist(),
+            ((flags & FLAG_BOMBA) != 0).tolist(),
+            colunas['temperatura'].tolist()
+        )
+    ]
 
 
 class SensorHandler:
-    """Gerenciador de dados de sensores IoT"""
+    """
+    Gerenciador de dados de sensores IoT
+    
+    Escritas são serializadas por um lock interno e incrementam a versão
+    do handler antes e depois de alterar o estado (ímpar = escrita em
+    andamento). Leituras não usam o lock: obtêm o instantâneo da versão
+    corrente (InstantaneoSensores), montado uma vez por versão, ou repetem
+    a consulta se uma escrita ocorreu no meio dela (seqlock).
+    """
     
     # Limiares padrão para decisões
     LIMIAR_UMIDADE_BAIXA = 50  # % abaixo disso considera seco
+    LIMIAR_UMIDADE_CRITICA = 30  # % abaixo disso o alerta é crítico
     LIMIAR_PH_MINIMO = 5.5
     LIMIAR_PH_MAXIMO = 7.5
     
-    def __init__(self):
-        """Inicializa o handler de sensores"""
-        self.historico: List[SensorData] = []
+    # Identificador usado no banco quando o handler não tem dispositivo_id
+    DISPOSITIVO_PADRAO = 'local'
+    
+    # Consultas interrompidas por escritas antes de aguardar o lock
+    TENTATIVAS_LEITURA = 3
+    
+    # Intervalo de envio assumido até haver envios para estimá-lo
+    # (TELEMETRY_FREQUENCY_MILLISECS do firmware do ESP8266)
+    INTERVALO_ENVIO_PADRAO = 30  # segundos
+    # Silêncio, em intervalos de envio, a partir do qual o dispositivo está atrasado
+    TOLERANCIA_SILENCIO = 3.0
+    TOLERANCIA_SILENCIO_CRITICA = 10.0
+    
+    def __init__(self, capacidade: Optional[int] = None,
+                 dispositivo_id: Optional[str] = None,
+                 largura_bucket_janelas: int = 60,
+                 log: Optional[LogSensores] = None,
+                 gravador=None,
+                 anomalias: Optional[DetectorAnomalias] = None,
+                 comprimir_descartadas: bool = True,
+                 atraso_permitido: Optional[float] = None,
+                 intervalo_envio: Optional[float] = None,
+                 monitorar_silencio: Optional[bool] = None,
+                 orcamento_compressao: Optional[OrcamentoBytes] = None):
+        """
+        Inicializa o handler de sensores
+        
+        Args:
+            capacidade: Máximo de leituras mantidas no histórico em memória
+                (as mais antigas são descartadas ao atingir o limite)
+            dispositivo_id: Identificador do dispositivo (usado nos alertas)
+            largura_bucket_janelas: Resolução, em segundos, dos agregados
+                por janela de tempo
+            log: Log persistente; as leituras mais recentes são carregadas
+                dos segmentos mapeados e as novas são anexadas a ele
+            gravador: GravadorLeituras para gravação em lote no banco
+                (tabela leituras_sensor)
+            anomalias: Detector de anomalias (padrão: EWMA sobre umidade
+                e pH)
+            comprimir_descartadas: Mantém as leituras que saem do histórico
+                em blocos comprimidos (consultáveis por obter_intervalo),
+                dentro do limite de orcamento_compressao; a compressão roda
+                em segundo plano
+            atraso_permitido: Atraso máximo, em segundos, de uma leitura em
+                relação à mais recente já recebida (marca d'água). Leituras
+                mais antigas que a marca d'água são recusadas; None aceita
+                qualquer atraso
+            intervalo_envio: Intervalo esperado entre envios do dispositivo,
+                em segundos, usado no alerta de dispositivo sem dados
+                (padrão: estimado pelos envios recebidos)
+            monitorar_silencio: Gera o alerta de dispositivo sem enviar
+                dados. Padrão: apenas com intervalo_envio informado (um
+                handler alimentado manualmente, como o do dashboard, não
+                tem envios periódicos)
+            orcamento_compressao: Limite de memória dos blocos comprimidos,
+                compartilhado com outros handlers (ex.: todos os shards de
+                um ArmazemSensores). Padrão: limite próprio de
+                HistoricoComprimido.MAXIMO_BYTES
+        """
+        self.dispositivo_id = dispositivo_id
+        self._lock_escrita = threading.Lock()
+        self._lock_alertas = threading.Lock()
+        self._lock_previsao = threading.Lock()
+        self._versao = 0
+        self._instantaneo: Optional[InstantaneoSensores] = None
+        # (versão, cópia somente leitura das colunas do histórico)
+        self._colunas_versao: Optional[Tuple[int, Dict[str, np.ndarray]]] = None
+        self._historico = HistoricoColunar(capacidade)
+        self._comprimido = (HistoricoComprimido(orcamento=orcamento_compressao)
+                            if comprimir_descartadas else None)
+        self._estatisticas = EstatisticasSensores()
+        self._janelas = AgregadorJanelas(largura_bucket_janelas)
+        self._rollups = RollupsSensores()
+        self._anomalias = anomalias or DetectorAnomalias()
+        # Limiares de umidade e pH vêm da tabela de regras (ver definir_regras)
+        self.regras = TabelaRegras(regras_padrao(
+            self.LIMIAR_UMIDADE_BAIXA, self.LIMIAR_UMIDADE_CRITICA,
+            self.LIMIAR_PH_MINIMO, self.LIMIAR_PH_MAXIMO
+        ))
+        self._tipos_monitoramento = (
+            tipos_alerta_anomalia(self._anomalias.metricas)
+            + tipos_alerta_monitoramento(
+                self._anomalias.metricas, self._anomalias.leituras_travamento,
+                self.TOLERANCIA_SILENCIO, self.TOLERANCIA_SILENCIO_CRITICA
+            )
+        )
+        self._alertas = MaquinaAlertas(
+            self.regras.tipos_alerta(dispositivo_id) + self._tipos_monitoramento
+        )
         self.ultima_leitura: Optional[SensorData] = None
+        self._previsor = PrevisorUmidade()
+        
+        # Ordenação por tempo de evento
+        self.atraso_permitido_us = (
+            None if atraso_permitido is None else int(atraso_permitido * US_POR_SEGUNDO)
+        )
+        self._maior_ts_us: Optional[int] = None
+        self.leituras_fora_de_ordem = 0
+        self.leituras_recusadas = 0
+        
+        # Chegada dos envios (time.monotonic), para detectar silêncio
+        self._intervalo_envio_fixo = intervalo_envio
+        self.monitorar_silencio = (intervalo_envio is not None if monitorar_silencio is None
+                                   else monitorar_silencio)
+        self._intervalo_envio: Optional[float] = None
+        self._ultima_chegada: Optional[float] = None
+        
+        self._gravador = gravador
+        self._log = log
+        # Com log existente, os rollups são montados do log inteiro na
+        # primeira consulta (as leituras novas também estão no log)
+        self._rollups_pendentes = log is not None and len(log) > 0
+        if self._rollups_pendentes:
+            self._registrar_lote(log.ultimos(self._historico.capacidade))
+    
+    @property
+    def historico(self) -> List[SensorData]:
+        """Histórico como lista de SensorData (camada de compatibilidade)"""
+        return colunas_para_sensor_data(self.colunas)
+    
+    @contextmanager
+    def _escrita(self):
+        """Serializa uma escrita e marca a versão como em andamento"""
+        with self._lock_escrita:
+            self._versao += 1
+            try:
+                yield
+            finally:
+                self._versao += 1
+    
+    def _ler(self, consulta: Callable[[], T]) -> T:
+        """
+        Executa uma consulta sem bloquear os escritores
+        
+        Se a versão mudar durante a consulta, o resultado pode misturar
+        dois estados e a consulta é repetida; após TENTATIVAS_LEITURA
+        tentativas, roda com o lock de escrita. A consulta não deve
+        devolver views de estruturas que as escritas alteram.
+        """
+        for _ in range(self.TENTATIVAS_LEITURA):
+            versao = self._versao
+            if versao & 1:
+                time.sleep(0)
+                continue
+            try:
+                resultado = consulta()
+            except Exception:
+                # Estado lido no meio de uma escrita; só é erro se não houve escrita
+                if self._versao == versao:
+                    raise
+                continue
+            if self._versao == versao:
+                return resultado
+        with self._lock_escrita:
+            return consulta()
+    
+    def _montar_instantaneo(self) -> InstantaneoSensores:
+        return InstantaneoSensores(
+            versao=self._versao,
+            ultima_leitura=self.ultima_leitura,
+            estatisticas=self._estatisticas.resumo(),
+            escores_anomalia=dict(self._anomalias.escores),
+            repeticoes=self._anomalias.repeticoes()
+        )
+    
+    def instantaneo(self) -> InstantaneoSensores:
+        """
+        Retorna o instantâneo da versão corrente sem bloquear escritores
+        
+        O instantâneo é montado pelo primeiro leitor após cada escrita e
+        reaproveitado pelos demais até a próxima. Não toca o histórico,
+        então estatísticas, alertas e a última leitura custam O(1).
+        """
+        atual = self._instantaneo
+        if atual is None or atual.versao != self._versao:
+            atual = self._ler(self._montar_instantaneo)
+            self._instantaneo = atual
+        return atual
+    
+    def _copiar_colunas(self):
+        colunas = {}
+        for nome, valores in self._historico.ultimas().items():
+            copia = valores.copy()
+            copia.flags.writeable = False
+            colunas[nome] = copia
+        return self._versao, colunas
+    
+    @property
+    def colunas(self) -> Dict[str, np.ndarray]:
+        """
+        Cópia somente leitura das colunas do histórico na versão corrente
+        
+        Copiada pelo primeiro leitor que pede o histórico após cada escrita
+        (O(capacidade)) e reaproveitada pelos demais até a próxima.
+        """
+        atual = self._colunas_versao
+        if atual is None or atual[0] != self._versao:
+            atual = self._ler(self._copiar_colunas)
+            self._colunas_versao = atual
+        return atual[1]
+    
+    @property
+    def versao(self) -> int:
+        """Versão do estado (incrementada a cada escrita)"""
+        return self._versao
+    
+    def marca_dagua_us(self) -> Optional[int]:
+        """
+        Marca d'água em µs: leituras anteriores a ela são recusadas e os
+        buckets que terminam antes dela não mudam mais (None = sem limite)
+        """
+        if self.atraso_permitido_us is None or self._maior_ts_us is None:
+            return None
+        return self._maior_ts_us - self.atraso_permitido_us
+    
+    def marca_dagua(self) -> Optional[datetime]:
+        """Marca d'água como datetime (ver marca_dagua_us)"""
+        marca = self.marca_dagua_us()
+        return None if marca is None else us_para_datetime(marca)
+    
+    def _marcar_chegada(self):
+        """Registra a chegada de um envio e atualiza o intervalo estimado"""
+        agora = time.monotonic()
+        if self._ultima_chegada is not None:
+            intervalo = agora - self._ultima_chegada
+            self._intervalo_envio = (
+                intervalo if self._intervalo_envio is None
+                else 0.8 * self._intervalo_envio + 0.2 * intervalo
+            )
+        self._ultima_chegada = agora
+    
+    def intervalo_envio(self) -> float:
+        """Intervalo esperado entre envios (s): fixo, estimado ou o padrão"""
+        if self._intervalo_envio_fixo is not None:
+            return self._intervalo_envio_fixo
+        if self._intervalo_envio is None:
+            return self.INTERVALO_ENVIO_PADRAO
+        return max(self._intervalo_envio, 1.0)
+    
+    def prazo_envio(self) -> Optional[float]:
+        """
+        Instante (time.monotonic) até o qual o próximo envio deve chegar
+        (None se nenhum envio foi recebido)
+        """
+        if self._ultima_chegada is None:
+            return None
+        return self._ultima_chegada + self.TOLERANCIA_SILENCIO * self.intervalo_envio()
+    
+    def silencio(self, agora: Optional[float] = None) -> Optional[float]:
+        """Tempo desde o último envio, em intervalos de envio esperados"""
+        if self._ultima_chegada is None:
+            return None
+        agora = time.monotonic() if agora is None else agora
+        return (agora - self._ultima_chegada) / self.intervalo_envio()
+    
+    def _registrar(self, sensor_data: SensorData) -> bool:
+        """
+        Grava uma leitura no buffer colunar e atualiza os agregados
+        
+        Returns:
+            True se a leitura foi registrada; False se for anterior à
+            marca d'água (recusada)
+        """
+        timestamp_us = datetime_para_us(sensor_data.timestamp)
+        marca = self.marca_dagua_us()
+        if marca is not None and timestamp_us < marca:
+            self.leituras_recusadas += 1
+            return False
+        atrasada = self._maior_ts_us is not None and timestamp_us < self._maior_ts_us
+        
+        temperatura = sensor_data.temperatura
+        # Agregados usam o valor como armazenado (float32) para que a
+        # remoção de leituras descartadas seja exata
+        umidade = float(np.float32(sensor_data.umidade))
+        ph = float(np.float32(sensor_data.ph))
+        
+        registro = (
+            timestamp_us,
+            umidade,
+            ph,
+            np.nan if temperatura is None else temperatura,
+            empacotar_flags(sensor_data.fosforo_presente,
+                            sensor_data.potassio_presente,
+                            sensor_data.bomba_ligada)
+        )
+        if self._log is not None:
+            self._log.anexar(*registro)
+        if self._gravador is not None:
+            self._gravador.adicionar(self.dispositivo_id or self.DISPOSITIVO_PADRAO,
+                                     dict(zip(COLUNAS, registro)))
+        if not self._rollups_pendentes:
+            # Antes do buffer: as leituras vizinhas consultadas pelos
+            # rollups são as já registradas
+            self._rollups.adicionar(timestamp_us, umidade, ph, temperatura,
+                                    sensor_data.bomba_ligada, self._leituras_desde)
+        if atrasada:
+            # Intercala no buffer na posição do seu timestamp
+            self.leituras_fora_de_ordem += 1
+            descartadas = self._historico.inserir_lote(
+                {nome: np.array([valor]) for nome, valor in zip(COLUNAS, registro)}
+            )
+            descartada = (tuple(valores[0].item() for valores in descartadas.values())
+                          if descartadas else None)
+        else:
+            descartada = self._historico.adicionar(*registro)
+            self._maior_ts_us = timestamp_us
+            self.ultima_leitura = sensor_data
+        
+        if atrasada:
+            self._estatisticas.adicionar(umidade, ph, sensor_data.bomba_ligada)
+            self._reposicionar_extremos(timestamp_us)
+        else:
+            self._estatisticas.adicionar(umidade, ph, sensor_data.bomba_ligada,
+                                         self._historico.total_escrito - 1)
+        self._janelas.adicionar(timestamp_us, umidade, ph, temperatura,
+                                sensor_data.bomba_ligada)
+        if not atrasada:
+            # Leituras atrasadas descrevem o passado: não alimentam os detectores
+            self._anomalias.atualizar({'umidade': umidade, 'ph': ph, 'temperatura': temperatura})
+        if descartada:
+            if self._comprimido is not None:
+                self._comprimido.adicionar(descartada)
+            _, umidade_antiga, ph_antigo, _, flags_antigas = descartada
+            self._estatisticas.remover(
+                umidade_antiga, ph_antigo, flags_antigas & FLAG_BOMBA,
+                self._historico.posicao_inicial
+            )
+        return True
+    
+    def _reposicionar_extremos(self, inicio_us: int):
+        """Refaz min/max da cauda do buffer regravada ao intercalar leituras atrasadas"""
+        atuais = self._historico.ultimas()
+        i = int(np.searchsorted(atuais['timestamp'], inicio_us, side='left'))
+        self._estatisticas.reposicionar(
+            self._historico.posicao_inicial + i,
+            {nome: atuais[nome][i:] for nome in EstatisticasSensores.METRICAS}
+        )
+    
+    def _leituras_desde(self, inicio_us: int):
+        """
+        (timestamps, bomba) das leituras em memória a partir de inicio_us
+        
+        Usado pelos rollups para recalcular o tempo de bomba em torno de
+        leituras atrasadas. Retorna None se leituras desse período já
+        saíram da memória (buffer e blocos comprimidos).
+        """
+        recentes = self._historico.ultimas()
+        pos = int(np.searchsorted(recentes['timestamp'], inicio_us))
+        ts, flags = recentes['timestamp'][pos:], recentes['flags'][pos:]
+        if pos == 0 and self._historico.total_escrito > len(self._historico):
+            # Leituras anteriores ao buffer: só nos blocos comprimidos, se
+            # nenhum bloco do período foi descartado
+            comprimido = self._comprimido
+            if comprimido is None:
+                return None
+            blocos = list(comprimido.blocos)
+            if comprimido.leituras_descartadas and (
+                    not blocos or blocos[0].inicio_us > inicio_us):
+                return None
+            antigas = comprimido.intervalo(inicio_us, np.iinfo(np.int64).max)
+            ts = np.concatenate([antigas['timestamp'], ts])
+            flags = np.concatenate([antigas['flags'], flags])
+            ordem = np.argsort(ts, kind='stable')
+            ts, flags = ts[ordem], flags[ordem]
+        return ts, (flags & FLAG_BOMBA) != 0
     
     def gerar_dados_simulados(self, n_leituras: int = 20, 
                              intervalo_minutos: int = 5) -> List[SensorData]:
@@ -63,58 +578,66 @@ class SensorHandler:
         dados = []
         tempo_inicial = datetime.now() - timedelta(minutes=n_leituras * intervalo_minutos)
         
-        for i in range(n_leituras):
-            tempo_atual = tempo_inicial + timedelta(minutes=i * intervalo_minutos)
-            
-            # Gerar valores aleatórios realistas
-            umidade = random.uniform(30, 85)
-            ph = random.uniform(5.5, 7.5)
-            fosforo = random.choice([True, False])
-            potassio = random.choice([True, False])
-            temperatura = random.uniform(15, 35)
-            
-            # Lógica: bomba liga se umidade < limiar
-            bomba_ligada = umidade < self.LIMIAR_UMIDADE_BAIXA
-            
-            sensor_data = SensorData(
-                timestamp=tempo_atual,
-                umidade=round(umidade, 2),
-                ph=round(ph, 2),
-                fosforo_presente=fosforo,
-                potassio_presente=potassio,
-                bomba_ligada=bomba_ligada,
-                temperatura=round(temperatura, 1)
-            )
+        with self._escrita():
+            self._marcar_chegada()
+            for i in range(n_leituras):
+                tempo_atual = tempo_inicial + timedelta(minutes=i * intervalo_minutos)
+                
+                # Gerar valores aleatórios realistas
+                umidade = random.uniform(30, 85)
+                ph = random.uniform(5.5, 7.5)
+                fosforo = random.choice([True, False])
+                potassio = random.choice([True, False])
+                temperatura = random.uniform(15, 35)
+                
+                # Lógica: bomba liga se umidade < limiar
+                bomba_ligada = umidade < self.LIMIAR_UMIDADE_BAIXA
+                
+                sensor_data = SensorData(
+                    timestamp=tempo_atual,
+                    umidade=round(umidade, 2),
+                    ph=round(ph, 2),
+                    fosforo_presente=fosforo,
+                    potassio_presente=potassio,
+                    bomba_ligada=bomba_ligada,
+                    temperatura=round(temperatura, 1)
+                )
+                
+                dados.append(sensor_data)
+                self._registrar(sensor_data)
             
-            dados.append(sensor_data)
-        
-        self.historico.extend(dados)
-        if dados:
-            self.ultima_leitura = dados[-1]
+            if dados:
+                self.ultima_leitura = dados[-1]
         
         return dados
     
     def adicionar_leitura(self, umidade: float, ph: float, 
                          fosforo: bool, potassio: bool,
-                         temperatura: Optional[float] = None) -> SensorData:
+                         temperatura: Optional[float] = None,
+                         timestamp: Optional[datetime] = None) -> Optional[SensorData]:
         """
         Adiciona uma nova leitura de sensor (dados reais ou simulados)
         
+        Leituras fora de ordem são intercaladas no histórico pelo
+        timestamp do evento.
+        
         Args:
             umidade: Umidade do solo (%)
             ph: pH do solo
             fosforo: Presença de fósforo
             potassio: Presença de potássio
             temperatura: Temperatura ambiente (opcional)
+            timestamp: Momento da medição no dispositivo (padrão: agora)
             
         Returns:
-            SensorData criado
+            SensorData criado, ou None se a leitura for anterior à marca
+            d'água (recusada)
         """
         # Decide se deve ligar a bomba
         bomba_ligada = self.decidir_irrigacao(umidade, ph)
         
         sensor_data = SensorData(
-            timestamp=datetime.now(),
+            timestamp=timestamp or datetime.now(),
             umidade=round(umidade, 2),
             ph=round(ph, 2),
             fosforo_presente=fosforo,
@@ -123,35 +646,304 @@ class SensorHandler:
             temperatura=round(temperatura, 1) if temperatura else None
         )
         
-        self.historico.append(sensor_data)
-        self.ultima_leitura = sensor_data
-        
+        with self._escrita():
+            self._marcar_chegada()
+            if not self._registrar(sensor_data):
+                return None
         return sensor_data
     
+    def adicionar_leituras_lote(self, dados) -> int:
+        """
+        Adiciona um lote de leituras de uma só vez (operações vetorizadas)
+        
+        A decisão da bomba é calculada para o lote inteiro com comparações
+        NumPy e as leituras são gravadas no buffer com cópias em bloco.
+        
+        Args:
+            dados: DataFrame ou dicionário de arrays com as colunas
+                'umidade', 'ph', 'fosforo', 'potassio' e, opcionalmente,
+                'temperatura' (NaN = ausente) e 'timestamp' (datetime64 ou
+                µs desde a época; padrão: agora)
+                
+        Returns:
+            Número de leituras adicionadas (sem as recusadas pela marca
+            d'água)
+        """
+        umidade = np.round(np.asarray(dados['umidade'], dtype=np.float64), 2)
+        n = len(umidade)
+        if not n:
+            return 0
+        
+        ph = np.round(np.asarray(dados['ph'], dtype=np.float64), 2)
+        fosforo = np.asarray(dados['fosforo'], dtype=bool)
+        potassio = np.asarray(dados['potassio'], dtype=bool)
+        if 'temperatura' in dados:
+            temperatura = np.round(np.asarray(dados['temperatura'], dtype=np.float64), 1)
+        else:
+            temperatura = np.full(n, np.nan)
+        
+        if 'timestamp' in dados:
+            timestamps = np.asarray(dados['timestamp'])
+            if np.issubdtype(timestamps.dtype, np.datetime64):
+                timestamps = timestamps.astype('datetime64[us]').view(np.int64)
+            timestamps = timestamps.astype(np.int64, copy=False)
+        else:
+            timestamps = np.full(n, datetime_para_us(datetime.now()), dtype=np.int64)
+        
+        bomba = self.decidir_irrigacao_lote(umidade, ph)
+        colunas = {
+            'timestamp': timestamps,
+            'umidade': umidade.astype(np.float32),
+            'ph': ph.astype(np.float32),
+            'temperatura': temperatura.astype(np.float32),
+            'flags': empacotar_flags(fosforo, potassio, bomba),
+        }
+        
+        with self._escrita():
+            self._marcar_chegada()
+            # Leituras do mesmo lote chegam juntas: a marca d'água é a de antes do lote
+            marca = self.marca_dagua_us()
+            if marca is not None:
+                aceitas = timestamps >= marca
+                if not aceitas.all():
+                    self.leituras_recusadas += int(n - aceitas.sum())
+                    colunas = {nome: valores[aceitas] for nome, valores in colunas.items()}
+                    n = len(colunas['timestamp'])
+                    if not n:
+                        return 0
+            
+            if self._log is not None:
+                self._log.anexar_lote(colunas)
+            if self._gravador is not None:
+                self._gravador.adicionar(self.dispositivo_id or self.DISPOSITIVO_PADRAO, colunas)
+            self._registrar_lote(colunas)
+        return n
+    
+    def _registrar_lote(self, colunas: Dict[str, np.ndarray]):
+        """Grava colunas já normalizadas no buffer e atualiza os agregados"""
+        timestamps = colunas['timestamp']
+        if len(timestamps) > 1 and (timestamps[1:] < timestamps[:-1]).any():
+            ordem = np.argsort(timestamps, kind='stable')
+            colunas = {nome: valores[ordem] for nome, valores in colunas.items()}
+        bomba = (colunas['flags'] & FLAG_BOMBA).astype(bool)
+        
+        # Leituras anteriores à mais recente já gravada vão para o meio do
+        # buffer; as demais seguem o caminho de anexação
+        anterior = self._maior_ts_us
+        em_ordem = None
+        if anterior is not None and colunas['timestamp'][0] < anterior:
+            atrasadas = int(np.searchsorted(colunas['timestamp'], anterior))
+            self.leituras_fora_de_ordem += atrasadas
+            em_ordem = {nome: valores[atrasadas:] for nome, valores in colunas.items()}
+        
+        if not self._rollups_pendentes:
+            # Antes do buffer: as leituras vizinhas consultadas pelos
+            # rollups são as já registradas
+            self._rollups.adicionar_lote(
+                colunas['timestamp'], colunas['umidade'], colunas['ph'],
+                colunas['temperatura'], bomba, self._leituras_desde
+            )
+        
+        capacidade = self._historico.capacidade
+        if em_ordem is not None:
+            descartadas = self._historico.inserir_lote(colunas)
+            if self._comprimido is not None and descartadas:
+                self._comprimido.adicionar_lote(descartadas)
+            self._estatisticas.adicionar_lote(colunas['umidade'], colunas['ph'], bomba)
+            self._reposicionar_extremos(int(colunas['timestamp'][0]))
+        else:
+            # Apenas o final de um lote maior que a capacidade fica no buffer
+            armazenadas = {nome: valores[-capacidade:] for nome, valores in colunas.items()}
+            descartadas = self._historico.adicionar_lote(armazenadas)
+            if self._comprimido is not None:
+                if descartadas:
+                    self._comprimido.adicionar_lote(descartadas)
+                if len(colunas['timestamp']) > capacidade:
+                    self._comprimido.adicionar_lote(
+                        {nome: valores[:-capacidade] for nome, valores in colunas.items()}
+                    )
+            self._estatisticas.adicionar_lote(
+                armazenadas['umidade'], armazenadas['ph'], bomba[-capacidade:],
+                self._historico.total_escrito - len(armazenadas['timestamp'])
+            )
+        if descartadas:
+            self._estatisticas.remover_lote(
+                descartadas['umidade'], descartadas['ph'],
+                descartadas['flags'] & FLAG_BOMBA, self._historico.posicao_inicial
+            )
+        
+        self._janelas.adicionar_lote(
+            colunas['timestamp'], colunas['umidade'], colunas['ph'],
+            colunas['temperatura'], bomba
+        )
+        self._anomalias.atualizar_lote(colunas if em_ordem is None else em_ordem)
+        
+        if anterior is None or colunas['timestamp'][-1] > anterior:
+            self._maior_ts_us = int(colunas['timestamp'][-1])
+        self.ultima_leitura = colunas_para_sensor_data(self._historico.ultimas(1))[0]
+    
+    def decidir_irrigacao_lote(self, umidade: np.ndarray, ph: np.ndarray) -> np.ndarray:
+        """
+        Versão vetorizada de decidir_irrigacao
+        
+        Args:
+            umidade: Array de umidades do solo
+            ph: Array de pH do solo (NaN = sem sensor de pH)
+            
+        Returns:
+            Array booleano (True = irrigar)
+        """
+        umidade = np.asarray(umidade)
+        ph = np.asarray(ph)
+        ph_adequado = (ph >= self.LIMIAR_PH_MINIMO) & (ph <= self.LIMIAR_PH_MAXIMO)
+        return (umidade < self.LIMIAR_UMIDADE_BAIXA) & (ph_adequado | np.isnan(ph))
+    
     def decidir_irrigacao(self, umidade: float, ph: float) -> bool:
         """
         Decide se deve ligar a bomba de irrigação
         
         Args:
             umidade: Umidade do solo atual
-            ph: pH do solo atual
+            ph: pH do solo atual (NaN = sem sensor de pH)
             
         Returns:
             True se deve irrigar, False caso contrário
         """
-        # Lógica: irrigar se umidade baixa E pH está na faixa adequada
+        # Lógica: irrigar se umidade baixa E pH está na faixa adequada.
+        # Sem leitura de pH (firmware ESP8266) decide só pela umidade
         umidade_baixa = umidade < self.LIMIAR_UMIDADE_BAIXA
-        ph_adequado = self.LIMIAR_PH_MINIMO <= ph <= self.LIMIAR_PH_MAXIMO
+        ph_adequado = ph != ph or self.LIMIAR_PH_MINIMO <= ph <= self.LIMIAR_PH_MAXIMO
         
         return umidade_baixa and ph_adequado
     
     def obter_ultima_leitura(self) -> Optional[SensorData]:
         """Retorna a última leitura registrada"""
+        # Uma única referência a um objeto que não é alterado depois de
+        # publicado: não precisa do instantâneo completo
         return self.ultima_leitura
     
-    def obter_historico(self, limite: Optional[int] = None) -> List[SensorData]:
+    def obter_historico(self, limite: Optional[int] = None) -> Dict[str, np.ndarray]:
+        """
+        Retorna histórico de leituras em formato colunar
+        
+        Args:
+            limite: Número máximo de leituras (mais recentes)
+            
+        Returns:
+            Dicionário coluna -> array NumPy somente leitura da versão
+            corrente (ver colunas; não muda com novas leituras). Colunas: timestamp (µs
+            desde a época), umidade, ph, temperatura (NaN se ausente) e
+            flags (bits FLAG_*)
+        """
+        colunas = self.colunas
+        if not limite:
+            return dict(colunas)
+        return {nome: valores[-limite:] for nome, valores in colunas.items()}
+    
+    def obter_intervalo(self, inicio: datetime, fim: datetime) -> Dict[str, np.ndarray]:
+        """
+        Retorna as leituras em memória de um intervalo de tempo
+        
+        Inclui as leituras que já saíram do histórico e estão em blocos
+        comprimidos; só os blocos que intersectam o intervalo são
+        descomprimidos.
+        
+        Args:
+            inicio: Início do intervalo (inclusivo)
+            fim: Fim do intervalo (exclusivo)
+            
+        Returns:
+            Dicionário coluna -> array NumPy, em ordem de chegada
+        """
+        return self._ler(lambda: self._intervalo(datetime_para_us(inicio),
+                                                 datetime_para_us(fim)))
+    
+    def _intervalo(self, inicio_us: int, fim_us: int) -> Dict[str, np.ndarray]:
+        recentes = self._historico.ultimas()
+        dentro = (recentes['timestamp'] >= inicio_us) & (recentes['timestamp'] < fim_us)
+        recentes = {nome: valores[dentro] for nome, valores in recentes.items()}
+        if self._comprimido is None or not len(self._comprimido):
+            return recentes
+        antigas = self._comprimido.intervalo(inicio_us, fim_us)
+        return {nome: np.concatenate([antigas[nome], recentes[nome]]) for nome in COLUNAS}
+    
+    def ler_intervalo(self, inicio: datetime, fim: datetime) -> Dict[str, np.ndarray]:
         """
-        Retorna histórico de leituras
+        Retorna as leituras de um intervalo, inclusive as que saíram da memória
+        
+        O trecho que a memória (buffer e blocos comprimidos) não cobre mais
+        é lido do log persistente ou, sem log, do banco
+        (GravadorLeituras.ler_intervalo). Sem nenhum dos dois, equivale a
+        obter_intervalo.
+        
+        Args:
+            inicio: Início do intervalo (inclusivo)
+            fim: Fim do intervalo (exclusivo)
+            
+        Returns:
+            Dicionário coluna -> array NumPy
+        """
+        inicio_us, fim_us = datetime_para_us(inicio), datetime_para_us(fim)
+        recentes, corte = self._ler(
+            lambda: (self._intervalo(inicio_us, fim_us), self._inicio_memoria_us())
+        )
+        if (corte is None or corte < inicio_us
+                or (self._log is None and self._gravador is None)):
+            return recentes
+        # Leituras até o corte (inclusive) vêm do armazenamento persistente
+        limite = min(corte, fim_us - 1)
+        antigas = self._ler_persistente(inicio_us, limite)
+        depois = recentes['timestamp'] > limite
+        return {nome: np.concatenate([antigas[nome], recentes[nome][depois]])
+                for nome in COLUNAS}
+    
+    def _inicio_memoria_us(self) -> Optional[int]:
+        """Timestamp a partir do qual todas as leituras estão em memória (None = todas)"""
+        if self._historico.total_escrito <= len(self._historico):
+            return None
+        comprimido = self._comprimido
+        if comprimido is not None:
+            if not comprimido.leituras_descartadas:
+                return None
+            blocos = list(comprimido.blocos)
+            if blocos:
+                return blocos[0].inicio_us
+        return int(self._historico.ultimas(len(self._historico))['timestamp'][0])
+    
+    def _ler_persistente(self, inicio_us: int, fim_us: int) -> Dict[str, np.ndarray]:
+        """Leituras em [inicio_us, fim_us] do log ou, sem log, do banco"""
+        if self._log is not None:
+            # O log é anexado pelos escritores: lido sob o mesmo lock
+            with self._lock_escrita:
+                colunas = self._log.ler_intervalo(inicio_us, fim_us)
+                return {nome: np.array(valores) for nome, valores in colunas.items()}
+        partes = [
+            {
+                'timestamp': bloco['timestamp'].astype(np.int64),
+                'umidade': bloco['umidade'],
+                'ph': bloco['ph'],
+                'temperatura': bloco['temperatura'],
+                'flags': empacotar_flags(bloco['fosforo'], bloco['potassio'], bloco['bomba']),
+            }
+            for bloco in self._gravador.ler_intervalo(
+                self.dispositivo_id or self.DISPOSITIVO_PADRAO,
+                us_para_datetime(inicio_us), us_para_datetime(fim_us)
+            )
+        ]
+        if not partes:
+            return {nome: np.empty(0, dtype=dtype) for nome, dtype in COLUNAS.items()}
+        return {nome: np.concatenate([p[nome] for p in partes]).astype(dtype, copy=False)
+                for nome, dtype in COLUNAS.items()}
+    
+    def obter_estatisticas_compressao(self) -> Dict:
+        """Blocos, bytes e razão de compressão das leituras antigas"""
+        if self._comprimido is None:
+            return {}
+        return self._ler(self._comprimido.estatisticas)
+    
+    def obter_leituras(self, limite: Optional[int] = None) -> List[SensorData]:
+        """
+        Retorna histórico de leituras como objetos SensorData
         
         Args:
             limite: Número máximo de leituras (mais recentes)
@@ -159,44 +951,288 @@ class SensorHandler:
         Returns:
             Lista de SensorData
         """
-        if limite:
-            return self.historico[-limite:]
-        return self.historico
+        return colunas_para_sensor_data(self.obter_historico(limite))
+    
+    def consultar_periodo(self, inicio: datetime, fim: datetime,
+                          tamanho_bloco: int = 10_000):
+        """
+        Lê do banco as leituras deste dispositivo em um intervalo de tempo
+        
+        Args:
+            inicio: Início do intervalo
+            fim: Fim do intervalo
+            tamanho_bloco: Leituras por bloco retornado
+            
+        Returns:
+            Iterador de blocos (dicionário coluna -> array NumPy)
+        """
+        if self._gravador is None:
+            raise RuntimeError("SensorHandler sem gravador de banco configurado")
+        return self._gravador.ler_intervalo(
+            self.dispositivo_id or self.DISPOSITIVO_PADRAO, inicio, fim, tamanho_bloco
+        )
     
     def obter_estatisticas(self) -> Dict:
         """
-        Calcula estatísticas do histórico de sensores
+        Retorna estatísticas do histórico de sensores
+        
+        Os agregados são mantidos incrementalmente a cada leitura, então a
+        consulta tem custo constante independente do tamanho do histórico.
         
         Returns:
             Dicionário com estatísticas
         """
-        if not self.historico:
-            return {
-                'total_leituras': 0,
-                'umidade_media': 0,
-                'ph_medio': 0
-            }
+        return dict(self.instantaneo().estatisticas)
+    
+    def obter_agregados(self) -> EstatisticasSensores:
+        """Retorna uma cópia dos agregados correntes (para consolidação)"""
+        return self._ler(lambda: EstatisticasSensores.combinar([self._estatisticas]))
+    
+    def obter_agregados_janelas(self, janelas: Optional[List] = None,
+                                referencia: Optional[datetime] = None) -> Dict[str, Dict]:
+        """
+        Retorna agregados por janela deslizante de tempo
+        
+        Args:
+            janelas: Nomes ('15min', '1h', '24h') ou durações em segundos
+                (padrão: as três janelas padrão)
+            referencia: Fim das janelas (padrão: agora)
+            
+        Returns:
+            Dicionário janela -> média/min/max/p95 por métrica, ciclo de
+            trabalho da bomba e 'finalizada' (a janela termina antes da
+            marca d'água e não recebe mais leituras atrasadas)
+        """
+        referencia = referencia or datetime.now()
+        resultado, marca = self._ler(
+            lambda: (self._janelas.consultar_varias(janelas, referencia), self.marca_dagua_us())
+        )
+        finalizada = marca is not None and datetime_para_us(referencia) <= marca
+        for agregados in resultado.values():
+            agregados['finalizada'] = finalizada
+        return resultado
+    
+    def obter_rollups(self, inicio: datetime, fim: datetime, pontos: int = 500,
+                      nivel: Optional[str] = None) -> Dict:
+        """
+        Retorna a série agregada de um período longo para gráficos
         
-        umidades = [s.umidade for s in self.historico]
-        phs = [s.ph for s in self.historico]
-        bombas_ligadas = sum(1 for s in self.historico if s.bomba_ligada)
+        Usa o nível de rollup mais grosso (1min, 15min, 1h, 1d) que ainda
+        fornece `pontos` pontos no intervalo, então o custo depende da
+        largura do gráfico e não da quantidade de leituras.
         
+        Args:
+            inicio: Início do intervalo
+            fim: Fim do intervalo
+            pontos: Pontos desejados (ex.: largura do gráfico em pixels)
+            nivel: Força um nível específico
+            
+        Returns:
+            Dicionário com 'nivel', 'timestamp' (início de cada bucket),
+            'contagem', 'bomba_segundos', média/min/max por métrica e
+            'finalizado' (bucket encerrado antes da marca d'água)
+        """
+        self._montar_rollups()
+        resultado, marca = self._ler(
+            lambda: (self._rollups.consultar(inicio, fim, pontos, nivel), self.marca_dagua_us())
+        )
+        if marca is None:
+            resultado['finalizado'] = np.zeros(len(resultado['timestamp']), dtype=bool)
+        else:
+            largura_us = self._rollups.niveis[resultado['nivel']].largura_us
+            fim_bucket = resultado['timestamp'].view(np.int64) + largura_us
+            resultado['finalizado'] = fim_bucket <= marca
+        return resultado
+    
+    def obter_uso_bomba(self, inicio: datetime, fim: Optional[datetime] = None) -> Dict:
+        """
+        Tempo de bomba ligada, ciclo de trabalho e acionamentos de um período
+        
+        Consulta o índice de intervalos da bomba (duas buscas binárias),
+        sem percorrer as leituras; cobre todo o histórico do log.
+        
+        Args:
+            inicio: Início do período
+            fim: Fim do período (padrão: agora)
+            
+        Returns:
+            Dicionário com 'segundos_ligada', 'ciclo_trabalho' (% do
+            período) e 'acionamentos'
+        """
+        inicio_us = datetime_para_us(inicio)
+        fim_us = datetime_para_us(fim or datetime.now())
+        self._montar_rollups()
+        return self._ler(lambda: self._rollups.intervalos_bomba.uso(inicio_us, fim_us))
+    
+    def obter_intervalos_bomba(self, inicio: datetime,
+                               fim: Optional[datetime] = None) -> Dict[str, np.ndarray]:
+        """
+        Períodos de bomba ligada que intersectam o intervalo
+        
+        Returns:
+            Dicionário com arrays 'inicio' e 'fim' (datetime64, cortados
+            nas bordas do intervalo)
+        """
+        inicio_us = datetime_para_us(inicio)
+        fim_us = datetime_para_us(fim or datetime.now())
+        self._montar_rollups()
+        return self._ler(lambda: self._rollups.intervalos_bomba.intervalos(inicio_us, fim_us))
+    
+    def obter_estado_envio(self) -> Dict:
+        """Segundos desde o último envio, intervalo esperado e silêncio relativo"""
+        ultima = self._ultima_chegada
+        silencio = self.silencio()
         return {
-            'total_leituras': len(self.historico),
-            'umidade_media': round(sum(umidades) / len(umidades), 2),
-            'umidade_minima': round(min(umidades), 2),
-            'umidade_maxima': round(max(umidades), 2),
-            'ph_medio': round(sum(phs) / len(phs), 2),
-            'ph_minimo': round(min(phs), 2),
-            'ph_maximo': round(max(phs), 2),
-            'ativacoes_bomba': bombas_ligadas,
-            'percentual_irrigacao': round(bombas_ligadas / len(self.historico) * 100, 1)
+            'segundos_desde_ultimo_envio': None if ultima is None else time.monotonic() - ultima,
+            'intervalo_envio_s': self.intervalo_envio(),
+            'silencio': silencio,
+            'atrasado': silencio is not None and silencio > self.TOLERANCIA_SILENCIO,
         }
     
+    def obter_estado_ordenacao(self) -> Dict:
+        """Marca d'água e contadores de leituras fora de ordem e recusadas"""
+        return self._ler(lambda: {
+            'marca_dagua': self.marca_dagua(),
+            'atraso_permitido_s': (None if self.atraso_permitido_us is None
+                                   else self.atraso_permitido_us / US_POR_SEGUNDO),
+            'leituras_fora_de_ordem': self.leituras_fora_de_ordem,
+            'leituras_recusadas': self.leituras_recusadas,
+        })
+    
+    def _montar_rollups(self):
+        """Monta os rollups a partir do log, se ainda estiverem pendentes"""
+        if not self._rollups_pendentes:
+            return
+        with self._escrita():
+            if not self._rollups_pendentes:
+                return
+            # Leituras atrasadas em relação a segmentos anteriores têm as
+            # vizinhas procuradas nos segmentos já incorporados
+            incorporados = []
+            
+            def leituras_desde(inicio_us: int):
+                partes = [c for c in incorporados if c['timestamp'].max() >= inicio_us]
+                ts = np.concatenate([c['timestamp'] for c in partes] or [np.empty(0, np.int64)])
+                flags = np.concatenate([c['flags'] for c in partes] or [np.empty(0, np.uint8)])
+                dentro = ts >= inicio_us
+                ts, flags = ts[dentro], flags[dentro]
+                ordem = np.argsort(ts, kind='stable')
+                return ts[ordem], (flags[ordem] & FLAG_BOMBA) != 0
+            
+            for colunas in self._log.iterar_segmentos():
+                self._rollups.adicionar_lote(
+                    colunas['timestamp'], colunas['umidade'], colunas['ph'],
+                    colunas['temperatura'], (colunas['flags'] & FLAG_BOMBA).astype(bool),
+                    leituras_desde
+                )
+                incorporados.append(colunas)
+            self._rollups_pendentes = False
+    
+    def obter_sketch(self, metrica: str = 'umidade', inicio: Optional[datetime] = None,
+                     fim: Optional[datetime] = None) -> DDSketch:
+        """
+        Retorna o sketch de quantis de uma métrica (mesclável entre dispositivos)
+        
+        Args:
+            metrica: 'umidade', 'ph' ou 'temperatura' (esta apenas com intervalo)
+            inicio, fim: Intervalo de tempo; sem intervalo, usa o histórico
+                em memória (o mesmo de obter_estatisticas)
+            
+        Returns:
+            Cópia do DDSketch
+        """
+        if inicio is None and fim is None:
+            return self._ler(
+                lambda: DDSketch.combinar([self._estatisticas.metricas[metrica].sketch])
+            )
+        self._montar_rollups()
+        inicio, fim = inicio or datetime.min, fim or datetime.now()
+        return self._ler(lambda: self._rollups.sketch(inicio, fim, metrica))
+    
+    def obter_percentis(self, metrica: str = 'umidade', quantis=QUANTIS_PADRAO,
+                        inicio: Optional[datetime] = None,
+                        fim: Optional[datetime] = None) -> Dict[float, Optional[float]]:
+        """
+        Retorna percentis de uma métrica sem ordenar o histórico
+        
+        Os valores vêm de um DDSketch (erro relativo de até 1%); com
+        intervalo, dos sketches por bucket dos rollups.
+        
+        Returns:
+            Dicionário quantil -> valor (None se não houver leituras)
+        """
+        return self.obter_sketch(metrica, inicio, fim).quantis(quantis)
+    
+    def reamostrar(self, inicio: datetime, fim: datetime, intervalo: float,
+                   agregacoes: Optional[Dict[str, str]] = None,
+                   preenchimento: str = 'nenhum',
+                   lacuna_maxima: Optional[float] = None) -> Dict[str, np.ndarray]:
+        """
+        Reamostra as leituras em memória em intervalos regulares
+        
+        Args:
+            inicio, fim: Período da grade [inicio, fim)
+            intervalo: Largura de cada intervalo (s)
+            agregacoes: Coluna -> função ('media', 'soma', 'min', 'max',
+                'primeiro', 'ultimo', 'contagem'); padrão: média de umidade,
+                pH, temperatura e bomba
+            preenchimento: Intervalos sem leituras: 'nenhum' (NaN),
+                'anterior' ou 'linear'
+            lacuna_maxima: Maior lacuna preenchida (s); None = sem limite
+            
+        Returns:
+            Dicionário com 'timestamp' (início de cada intervalo),
+            'contagem' e um array por coluna (ver reamostragem.reamostrar)
+        """
+        inicio_us, fim_us = datetime_para_us(inicio), datetime_para_us(fim)
+        return reamostrar(
+            self._ler(lambda: self._intervalo(inicio_us, fim_us)), inicio_us, fim_us,
+            int(intervalo * US_POR_SEGUNDO), agregacoes, preenchimento,
+            None if lacuna_maxima is None else int(lacuna_maxima * US_POR_SEGUNDO)
+        )
+    
+    def prever_umidade(self, horas: float = 6.0) -> Dict[str, np.ndarray]:
+        """
+        Prevê a umidade do solo nas próximas horas (modelo AR, ver PrevisorUmidade)
+        
+        Os intervalos fechados desde a última previsão são incorporados ao
+        modelo antes de prever; o ajuste é incremental, então chamadas
+        frequentes custam pouco.
+        
+        Args:
+            horas: Horizonte da previsão (até 6 h)
+            
+        Returns:
+            Dicionário com 'timestamp' (início de cada intervalo previsto)
+            e 'umidade' (média prevista em cada intervalo, NaN sem leituras
+            recentes)
+        """
+        chave = self.dispositivo_id or self.DISPOSITIVO_PADRAO
+        with self._lock_previsao:
+            previsor = self._previsor
+            inicio_us, fim_us = previsor.intervalos_pendentes(datetime_para_us(datetime.now()))
+            if fim_us > inicio_us:
+                grade = reamostrar(
+                    self._ler(lambda: self._intervalo(inicio_us, fim_us)), inicio_us, fim_us,
+                    previsor.passo_us, {'umidade': 'media'}
+                )['umidade']
+                previsor.atualizar([chave], inicio_us, grade[None, :])
+            previsao = previsor.prever(horas, [chave])
+        return {'timestamp': previsao['timestamp'], 'umidade': previsao['umidade'][0]}
+    
     def limpar_historico(self):
-        """Limpa todo o histórico de leituras"""
-        self.historico.clear()
-        self.ultima_leitura = None
+        """Limpa todo o histórico de leituras em memória (o log persistente é mantido)"""
+        with self._escrita():
+            self._historico.limpar()
+            self._maior_ts_us = None
+            if self._comprimido is not None:
+                self._comprimido.limpar()
+            self._estatisticas.zerar()
+            self._janelas.limpar()
+            self._rollups = RollupsSensores()
+            self._rollups_pendentes = self._log is not None and len(self._log) > 0
+            self.ultima_leitura = None
+            self._previsor = PrevisorUmidade()
     
     def exportar_para_dict(self) -> List[Dict]:
         """
@@ -205,42 +1241,140 @@ class SensorHandler:
         Returns:
             Lista de dicionários com dados dos sensores
         """
-        return [s.to_dict() for s in self.historico]
+        return colunas_para_registros(self.colunas)
+    
+    def _colunas_exportacao(self, limite: Optional[int]) -> Dict[str, np.ndarray]:
+        """Colunas no formato de exportar_para_dict (views de colunas)"""
+        colunas = self.obter_historico(limite)
+        flags = colunas['flags']
+        return {
+            'timestamp': colunas['timestamp'].view('datetime64[us]'),
+            'umidade': colunas['umidade'],
+            'ph': colunas['ph'],
+            'fosforo_presente': (flags & FLAG_FOSFORO) != 0,
+            'potassio_presente': (flags & FLAG_POTASSIO) != 0,
+            'bomba_ligada': (flags & FLAG_BOMBA) != 0,
+            'temperatura': colunas['temperatura'],
+        }
+    
+    def to_dataframe(self, limite: Optional[int] = None) -> pd.DataFrame:
+        """
+        Exporta o histórico como DataFrame montado direto das colunas
+        
+        Timestamp, umidade, pH e temperatura são views da cópia das colunas
+        da versão corrente (ver colunas); apenas os booleanos são extraídos
+        dos flags. A cópia não muda, então o DataFrame pode ser guardado
+        enquanto novas leituras chegam.
+        
+        Args:
+            limite: Número máximo de leituras (mais recentes)
+            
+        Returns:
+            DataFrame com as colunas de exportar_para_dict (temperatura
+            ausente = NaN)
+        """
+        return pd.DataFrame(self._colunas_exportacao(limite), copy=False)
+    
+    def to_arrow(self, limite: Optional[int] = None):
+        """
+        Exporta o histórico como pyarrow.Table
+        
+        As colunas numéricas reaproveitam os buffers NumPy; temperatura
+        ausente vira nulo.
+        
+        Args:
+            limite: Número máximo de leituras (mais recentes)
+            
+        Returns:
+            pyarrow.Table com as colunas de exportar_para_dict
+        """
+        try:
+            import pyarrow as pa
+        except ImportError:
+            raise ImportError(
+                "Biblioteca 'pyarrow' não instalada. "
+                "Execute: pip install pyarrow"
+            )
+        
+        colunas = self._colunas_exportacao(limite)
+        return pa.table({
+            nome: pa.array(valores, from_pandas=(nome == 'temperatura'))
+            for nome, valores in colunas.items()
+        })
     
     def verificar_alertas(self) -> List[str]:
         """
         Verifica condições de alerta baseado na última leitura
         
+        Cada tipo de alerta tem estado próprio (OK, ATENÇÃO, CRÍTICO) com
+        histerese; leituras anômalas (saltos em relação ao comportamento
+        recente do dispositivo), sensores repetindo o mesmo valor e
+        dispositivos sem enviar dados além do intervalo esperado (com
+        monitorar_silencio) também geram alertas. Apenas as transições de estado são enviadas à AWS, então
+        chamadas repetidas (ex.: a cada renderização do dashboard) não
+        geram novas notificações.
+        
         Returns:
-            Lista de alertas (strings)
+            Lista de alertas ativos (strings)
         """
-        if not self.ultima_leitura:
+        instantaneo = self.instantaneo()
+        if not instantaneo.ultima_leitura:
             return []
         
-        alertas = []
+        escores = {f'anomalia_{m}': e for m, e in instantaneo.escores_anomalia.items()}
+        escores.update({f'travado_{m}': r for m, r in instantaneo.repeticoes.items()})
+        if self.monitorar_silencio:
+            escores['silencio'] = self.silencio()
+        with self._lock_alertas:
+            alertas, transicoes = self._alertas.avaliar(instantaneo.ultima_leitura,
+                                                        extras=escores)
         
-        # Alerta: Umidade crítica
-        if self.ultima_leitura.umidade < 30:
-            alertas.append("⚠️ CRÍTICO: Umidade do solo muito baixa (<30%)")
-        elif self.ultima_leitura.umidade < self.LIMIAR_UMIDADE_BAIXA:
-            alertas.append("⚠️ ATENÇÃO: Umidade do solo baixa")
+        # ENVIAR PARA AWS APENAS AS MUDANÇAS DE ESTADO
+        if transicoes:
+            mensagem = " | ".join(transicoes)
+            origem = f" [{self.dispositivo_id}]" if self.dispositivo_id else ""
+            send_alert(f"ALERTA DETECTADO{origem}: {mensagem}")
         
-        # Alerta: pH fora da faixa
-        if self.ultima_leitura.ph < self.LIMIAR_PH_MINIMO:
-            alertas.append(f"⚠️ pH muito ácido ({self.ultima_leitura.ph})")
-        elif self.ultima_leitura.ph > self.LIMIAR_PH_MAXIMO:
-            alertas.append(f"⚠️ pH muito alcalino ({self.ultima_leitura.ph})")
+        return alertas
+    
+    def avaliar_regras(self, limite: Optional[int] = None,
+                       regras: Optional[TabelaRegras] = None) -> Dict[str, np.ndarray]:
+        """
+        Avalia a tabela de regras sobre o histórico inteiro de uma vez
         
-        # Alerta: Falta de nutrientes
-        if not self.ultima_leitura.fosforo_presente:
-            alertas.append("⚠️ Fósforo (P) não detectado")
-        if not self.ultima_leitura.potassio_presente:
-            alertas.append("⚠️ Potássio (K) não detectado")
-
-        # ENVIAR PARA AWS SE TIVER ALERTA CRÍTICO
-        if alertas:  
-            mensagem = " | ".join(alertas)  
-            send_alert(f"ALERTA DETECTADO: {mensagem}")
+        Args:
+            limite: Número máximo de leituras (mais recentes)
+            regras: Tabela a usar (padrão: self.regras)
+            
+        Returns:
+            Dicionário nome da regra -> máscara booleana por leitura,
+            alinhada com obter_historico(limite)
+        """
+        regras = regras or self.regras
+        return regras.avaliar(self.obter_historico(limite))
+    
+    def definir_regras(self, regras: TabelaRegras, talhao: Optional[str] = None,
+                       cultura: Optional[str] = None):
+        """
+        Troca a tabela de regras usada pelos alertas e por avaliar_regras
         
-        return alertas
+        Os tipos de alerta passam a ser as regras efetivas para este
+        dispositivo no talhão e cultura informados; alertas que continuam
+        mantêm o estado.
+        """
+        with self._lock_alertas:
+            self.regras = regras
+            self._alertas.definir_tipos(
+                regras.tipos_alerta(self.dispositivo_id, talhao, cultura)
+                + self._tipos_monitoramento
+            )
+    
+    def obter_estado_alertas(self) -> Dict[str, str]:
+        """Retorna o estado corrente de cada tipo de alerta"""
+        with self._lock_alertas:
+            return self._alertas.obter_estado()
+    
+    def obter_estado_anomalias(self) -> Dict[str, Dict]:
+        """Retorna o estado dos detectores de anomalia por métrica"""
+        return self._ler(self._anomalias.estado)
 
@@ -0,0 +1,408 @@
+"""
+Servidor HTTP assíncrono de ingestão de telemetria dos dispositivos IoT
+Recebe o JSON do firmware ESP8266 e grava em micro-lotes no ArmazemSensores
+Execute: python -m src.fase3.servidor_ingestao
+"""
+
+import asyncio
+import json
+import os
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .armazem_sensores import ArmazemSensores
+from .historico_colunar import datetime_para_us
+
+
+# Leitura já validada: (dispositivo, timestamp µs, umidade, pH, temperatura,
+# fósforo, potássio, latitude, longitude)
+Leitura = Tuple[str, int, float, float, float, bool, bool, float, float]
+
+POLITICAS = ('rejeitar', 'descartar_antigas')
+
+_STATUS = {
+    200: 'OK',
+    202: 'Accepted',
+    400: 'Bad Request',
+    404: 'Not Found',
+    405: 'Method Not Allowed',
+    413: 'Payload Too Large',
+    429: 'Too Many Requests',
+    500: 'Internal Server Error',
+}
+
+
+def _primeiro(payload: Dict, *chaves):
+    for chave in chaves:
+        if chave in payload and payload[chave] is not None:
+            return payload[chave]
+    return None
+
+
+def interpretar_telemetria(payload: Dict) -> Leitura:
+    """
+    Converte um objeto JSON de telemetria em uma leitura
+
+    Aceita os campos do firmware ESP8266 (deviceId, timestamp ISO em UTC,
+    humidity, temperature, latitude, longitude) e os nomes usados no
+    painel (dispositivo, umidade, ph, temperatura, fosforo, potassio).
+    pH, latitude e longitude ausentes viram NaN; pH NaN significa
+    dispositivo sem sensor de pH, e a decisão de irrigação
+    (SensorHandler.decidir_irrigacao) passa a considerar só a umidade;
+    fósforo e potássio ausentes são tratados como presentes (dispositivo
+    sem sensor de nutrientes não deve gerar alerta de falta).
+
+    Raises:
+        ValueError: Se o payload não tiver dispositivo ou umidade válidos
+    """
+    if not isinstance(payload, dict):
+        raise ValueError("Telemetria deve ser um objeto JSON")
+
+    dispositivo = _primeiro(payload, 'deviceId', 'dispositivo')
+    if not dispositivo:
+        raise ValueError("Campo 'deviceId' ausente")
+    umidade = _primeiro(payload, 'humidity', 'umidade')
+    if umidade is None:
+        raise ValueError("Campo 'humidity' ausente")
+
+    texto = _primeiro(payload, 'timestamp')
+    if texto:
+        instante = datetime.fromisoformat(str(texto).replace('Z', '+00:00'))
+        if instante.tzinfo is not None:
+            # Horário local sem fuso, como no restante do sistema
+            instante = instante.astimezone().replace(tzinfo=None)
+    else:
+        instante = datetime.now()
+
+    ph = _primeiro(payload, 'ph')
+    temperatura = _primeiro(payload, 'temperature', 'temperatura')
+    latitude = _primeiro(payload, 'latitude')
+    longitude = _primeiro(payload, 'longitude')
+    return (
+        str(dispositivo),
+        datetime_para_us(instante),
+        float(umidade),
+        float('nan') if ph is None else float(ph),
+        float('nan') if temperatura is None else float(temperatura),
+        bool(_primeiro(payload, 'fosforo', 'phosphorus') is not False),
+        bool(_primeiro(payload, 'potassio', 'potassium') is not False),
+        float('nan') if latitude is None else float(latitude),
+        float('nan') if longitude is None else float(longitude),
+    )
+
+
+class ServidorIngestao:
+    """
+    Endpoint HTTP/1.1 (asyncio, sem dependências) para telemetria
+
+    POST /telemetria aceita um objeto ou uma lista de objetos JSON. As
+    leituras vão para uma fila limitada; quando ela enche, a política
+    'rejeitar' responde 429 (com Retry-After) e 'descartar_antigas' remove
+    as leituras mais antigas da fila para abrir espaço. Um consumidor
+    agrupa a fila em micro-lotes (até `tamanho_lote` leituras ou
+    `espera_lote` segundos) e chama ArmazemSensores.adicionar_leituras_lote
+    em uma thread, sem bloquear o laço de eventos.
+
+    GET /metricas retorna os contadores; GET /saude responde 200.
+    """
+
+    TAMANHO_FILA = 50_000
+    TAMANHO_LOTE = 5_000
+    ESPERA_LOTE = 0.05  # segundos
+    TAMANHO_MAXIMO_CORPO = 1024 * 1024  # bytes
+
+    def __init__(self, armazem: ArmazemSensores, host: str = '0.0.0.0', porta: int = 8081,
+                 tamanho_fila: Optional[int] = None, politica: str = 'rejeitar',
+                 tamanho_lote: Optional[int] = None, espera_lote: Optional[float] = None):
+        """
+        Inicializa o servidor
+
+        Args:
+            armazem: Destino das leituras
+            host, porta: Endereço de escuta
+            tamanho_fila: Leituras aguardando gravação antes da contrapressão
+            politica: 'rejeitar' (HTTP 429) ou 'descartar_antigas'
+            tamanho_lote: Máximo de leituras por micro-lote
+            espera_lote: Tempo máximo para completar um micro-lote
+        """
+        if politica not in POLITICAS:
+            raise ValueError(f"Política inválida: {politica}. Use {POLITICAS}")
+        self.armazem = armazem
+        self.host = host
+        self.porta = porta
+        self.tamanho_fila = tamanho_fila or self.TAMANHO_FILA
+        self.politica = politica
+        self.tamanho_lote = tamanho_lote or self.TAMANHO_LOTE
+        self.espera_lote = self.ESPERA_LOTE if espera_lote is None else espera_lote
+
+        self._fila: Optional[asyncio.Queue] = None
+        self._servidor: Optional[asyncio.AbstractServer] = None
+        self._consumidor: Optional[asyncio.Task] = None
+        self.contadores = {
+            'requisicoes': 0,
+            'leituras_recebidas': 0,
+            'leituras_aceitas': 0,
+            'leituras_rejeitadas': 0,   # 429
+            'leituras_descartadas': 0,  # política descartar_antigas
+            'leituras_invalidas': 0,    # 400
+            'leituras_gravadas': 0,
+            'leituras_atrasadas': 0,    # recusadas pela marca d'água do dispositivo
+            'lotes_gravados': 0,
+            'erros_gravacao': 0,
+        }
+        self._maior_lote = 0
+        self._tempo_gravacao = 0.0
+
+    # ------------------------------------------------------------------
+    # Ciclo de vida
+    # ------------------------------------------------------------------
+
+    async def iniciar(self):
+        """Abre o socket e inicia o consumidor da fila"""
+        self._fila = asyncio.Queue(self.tamanho_fila)
+        self._consumidor = asyncio.create_task(self._consumir())
+        self._servidor = await asyncio.start_server(self._atender, self.host, self.porta)
+        self.porta = self._servidor.sockets[0].getsockname()[1]
+        print(f"📡 Ingestão de telemetria em http://{self.host}:{self.porta}/telemetria")
+
+    async def parar(self):
+        """Para de aceitar conexões e grava o que estiver na fila"""
+        if self._servidor:
+            self._servidor.close()
+            await self._servidor.wait_closed()
+        if self._fila is not None:
+            await self._fila.join()
+        if self._consumidor:
+            self._consumidor.cancel()
+
+    async def executar(self):
+        """Executa até ser interrompido"""
+        await self.iniciar()
+        try:
+            await self._servidor.serve_forever()
+        finally:
+            await self.parar()
+
+    # ------------------------------------------------------------------
+    # HTTP
+    # ------------------------------------------------------------------
+
+    async def _atender(self, leitor: asyncio.StreamReader, escritor: asyncio.StreamWriter):
+        """Atende uma conexão (keep-alive: várias requisições em sequência)"""
+        try:
+            while True:
+                linha = await leitor.readline()
+                if not linha:
+                    break
+                try:
+                    metodo, caminho, versao = linha.decode('latin-1').split()
+                except ValueError:
+                    await self._responder(escritor, 400, {'erro': 'Requisição inválida'}, False)
+                    break
+
+                cabecalhos = {}
+                while True:
+                    linha = await leitor.readline()
+                    if linha in (b'\r\n', b'\n', b''):
+                        break
+                    nome, _, valor = linha.decode('latin-1').partition(':')
+                    cabecalhos[nome.strip().lower()] = valor.strip()
+
+                manter = (cabecalhos.get('connection', '').lower() != 'close'
+                          and versao == 'HTTP/1.1')
+                tamanho = self._tamanho_corpo(cabecalhos.get('content-length'))
+                if tamanho is None:
+                    # Sem tamanho confiável não há como achar a próxima requisição
+                    await self._responder(escritor, 400, {'erro': 'Content-Length inválido'}, False)
+                    break
+                if tamanho > self.TAMANHO_MAXIMO_CORPO:
+                    await self._responder(escritor, 413, {'erro': 'Corpo muito grande'}, False)
+                    break
+                corpo = await leitor.readexactly(tamanho) if tamanho else b''
+
+                try:
+                    status, resposta, extras = self._rotear(metodo, caminho.split('?')[0], corpo)
+                except Exception as e:
+                    print(f"❌ Erro ao atender {metodo} {caminho}: {e}")
+                    status, resposta, extras = 500, {'erro': 'Erro interno'}, None
+                await self._responder(escritor, status, resposta, manter, extras)
+                if not manter:
+                    break
+        except (ValueError, asyncio.LimitOverrunError):
+            # Linha maior que o limite do StreamReader (readline converte o
+            # LimitOverrunError em ValueError)
+            try:
+                await self._responder(escritor, 413, {'erro': 'Cabeçalho muito grande'}, False)
+            except ConnectionError:
+                pass
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            escritor.close()
+
+    @staticmethod
+    def _tamanho_corpo(valor: Optional[str]) -> Optional[int]:
+        """Content-Length como inteiro não negativo (0 se ausente; None se inválido)"""
+        if not valor:
+            return 0
+        if not valor.isascii() or not valor.isdigit():
+            return None
+        return int(valor)
+
+    async def _responder(self, escritor: asyncio.StreamWriter, status: int, corpo: Dict,
+                         manter: bool, extras: Optional[Dict[str, str]] = None):
+        dados = json.dumps(corpo, ensure_ascii=False).encode('utf-8')
+        cabecalhos = [
+            f"HTTP/1.1 {status} {_STATUS[status]}",
+            "Content-Type: application/json; charset=utf-8",
+            f"Content-Length: {len(dados)}",
+            f"Connection: {'keep-alive' if manter else 'close'}",
+        ]
+        cabecalhos += [f"{nome}: {valor}" for nome, valor in (extras or {}).items()]
+        escritor.write(("\r\n".join(cabecalhos) + "\r\n\r\n").encode('latin-1') + dados)
+        await escritor.drain()
+
+    def _rotear(self, metodo: str, caminho: str, corpo: bytes):
+        """Retorna (status, corpo JSON, cabeçalhos extras)"""
+        self.contadores['requisicoes'] += 1
+        if caminho == '/telemetria':
+            if metodo != 'POST':
+                return 405, {'erro': 'Use POST'}, None
+            return self._receber(corpo)
+        if caminho == '/metricas' and metodo == 'GET':
+            return 200, self.metricas(), None
+        if caminho == '/saude' and metodo == 'GET':
+            return 200, {'status': 'ok'}, None
+        return 404, {'erro': 'Rota não encontrada'}, None
+
+    def _receber(self, corpo: bytes):
+        """Valida o corpo e enfileira as leituras aplicando a contrapressão"""
+        try:
+            dados = json.loads(corpo)
+        except ValueError:
+            self.contadores['leituras_invalidas'] += 1
+            return 400, {'erro': 'JSON inválido'}, None
+
+        itens = dados if isinstance(dados, list) else [dados]
+        self.contadores['leituras_recebidas'] += len(itens)
+        leituras: List[Leitura] = []
+        erros = []
+        for posicao, item in enumerate(itens):
+            try:
+                leituras.append(interpretar_telemetria(item))
+            except (ValueError, TypeError) as e:
+                erros.append({'posicao': posicao, 'erro': str(e)})
+        self.contadores['leituras_invalidas'] += len(erros)
+        if not leituras:
+            return 400, {'erro': 'Nenhuma leitura válida', 'detalhes': erros}, None
+
+        livres = self.tamanho_fila - self._fila.qsize()
+        if len(leituras) > livres:
+            if self.politica == 'rejeitar':
+                self.contadores['leituras_rejeitadas'] += len(leituras)
+                return 429, {'erro': 'Fila cheia'}, {'Retry-After': '1'}
+            # descartar_antigas: abre espaço removendo o início da fila
+            excesso = min(len(leituras) - livres, self._fila.qsize())
+            for _ in range(excesso):
+                self._fila.get_nowait()
+                self._fila.task_done()
+            self.contadores['leituras_descartadas'] += excesso
+            leituras = leituras[-self.tamanho_fila:]
+            self.contadores['leituras_descartadas'] += len(itens) - len(erros) - len(leituras)
+
+        for leitura in leituras:
+            self._fila.put_nowait(leitura)
+        self.contadores['leituras_aceitas'] += len(leituras)
+        return 202, {'aceitas': len(leituras), 'invalidas': erros}, None
+
+    # ------------------------------------------------------------------
+    # Micro-lotes
+    # ------------------------------------------------------------------
+
+    async def _consumir(self):
+        """Agrupa a fila em micro-lotes e grava no armazém"""
+        while True:
+            lote = [await self._fila.get()]
+            prazo = time.monotonic() + self.espera_lote
+            while len(lote) < self.tamanho_lote:
+                if self._fila.empty():
+                    restante = prazo - time.monotonic()
+                    if restante <= 0:
+                        break
+                    try:
+                        lote.append(await asyncio.wait_for(self._fila.get(), restante))
+                    except asyncio.TimeoutError:
+                        break
+                else:
+                    lote.append(self._fila.get_nowait())
+
+            inicio = time.perf_counter()
+            try:
+                gravadas = await asyncio.to_thread(self._gravar, lote)
+                self.contadores['leituras_gravadas'] += gravadas
+                self.contadores['leituras_atrasadas'] += len(lote) - gravadas
+                self.contadores['lotes_gravados'] += 1
+            except Exception as e:
+                self.contadores['erros_gravacao'] += 1
+                print(f"❌ Erro ao gravar lote de telemetria: {e}")
+            finally:
+                self._tempo_gravacao += time.perf_counter() - inicio
+                self._maior_lote = max(self._maior_lote, len(lote))
+                for _ in lote:
+                    self._fila.task_done()
+
+    def _gravar(self, lote: List[Leitura]) -> int:
+        """Converte o lote em colunas e entrega ao armazém"""
+        (dispositivos, timestamps, umidade, ph, temperatura, fosforo, potassio,
+         latitudes, longitudes) = zip(*lote)
+        self.armazem.definir_posicoes({
+            dispositivo: (latitude, longitude)
+            for dispositivo, latitude, longitude in zip(dispositivos, latitudes, longitudes)
+            if latitude == latitude and longitude == longitude
+        })
+        return self.armazem.adicionar_leituras_lote(
+            {
+                'timestamp': np.array(timestamps, dtype=np.int64),
+                'umidade': np.array(umidade),
+                'ph': np.array(ph),
+                'temperatura': np.array(temperatura),
+                'fosforo': np.array(fosforo),
+                'potassio': np.array(potassio),
+            },
+            dispositivos=np.array(dispositivos)
+        )
+
+    def metricas(self) -> Dict:
+        """Contadores de ingestão, ocupação da fila e tempo de gravação"""
+        lotes = self.contadores['lotes_gravados']
+        return {
+            **self.contadores,
+            'tamanho_fila': self._fila.qsize() if self._fila else 0,
+            'capacidade_fila': self.tamanho_fila,
+            'politica': self.politica,
+            'maior_lote': self._maior_lote,
+            'tempo_medio_lote_ms': round(self._tempo_gravacao / lotes * 1000, 3) if lotes else 0,
+            'dispositivos': len(self.armazem.dispositivos()),
+        }
+
+
+def main():
+    """Executa o servidor com um ArmazemSensores em memória"""
+    atraso = os.getenv("INGESTAO_ATRASO_PERMITIDO")
+    servidor = ServidorIngestao(
+        ArmazemSensores(atraso_permitido=float(atraso) if atraso else None),
+        host=os.getenv("INGESTAO_HOST", "0.0.0.0"),
+        porta=int(os.getenv("INGESTAO_PORTA", "8081")),
+        politica=os.getenv("INGESTAO_POLITICA", "rejeitar"),
+    )
+    try:
+        asyncio.run(servidor.executar())
+    except KeyboardInterrupt:
+        print("\n🛑 Servidor de ingestão encerrado")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+"""
+Gerador vetorizado de leituras sintéticas para testes de carga
+Produz blocos NumPy para N dispositivos sem criar objetos SensorData
+"""
+
+from datetime import datetime
+from typing import Dict, Iterator, Optional
+
+import numpy as np
+from numpy.lib.format import open_memmap
+
+from .historico_colunar import datetime_para_us, US_POR_SEGUNDO
+
+
+# Registro gravado em arquivo .npy por gravar_arquivo
+DTYPE_SIMULADO = np.dtype([
+    ('timestamp', np.int64),     # µs desde a época
+    ('dispositivo', np.int32),   # Índice do dispositivo (ver GeradorSensores.nomes)
+    ('umidade', np.float32),
+    ('ph', np.float32),
+    ('temperatura', np.float32),
+    ('fosforo', np.bool_),
+    ('potassio', np.bool_),
+])
+
+SEGUNDOS_POR_DIA = 24 * 60 * 60
+
+
+class GeradorSensores:
+    """
+    Gerador de telemetria sintética com ciclo diário
+
+    A temperatura segue uma senoide diária (pico por volta das 15 h) e a
+    umidade do solo cai nas horas quentes, somadas a um ruído AR(1) por
+    dispositivo que mantém continuidade entre blocos. Cada bloco contém
+    todos os dispositivos para um intervalo de passos de tempo
+    (ordem tempo-dispositivo).
+    """
+
+    PHI_RUIDO = 0.995       # Persistência do ruído AR(1) da umidade
+    SEGMENTO_AR = 512       # Passos por segmento no cálculo vetorizado do AR(1)
+
+    def __init__(self, n_dispositivos: int = 100, intervalo_segundos: int = 5,
+                 seed: Optional[int] = None, prefixo: str = "esp-"):
+        """
+        Inicializa o gerador
+
+        Args:
+            n_dispositivos: Quantidade de dispositivos simulados
+            intervalo_segundos: Intervalo entre leituras de cada dispositivo
+            seed: Semente do gerador aleatório (reprodutibilidade)
+            prefixo: Prefixo dos nomes dos dispositivos
+        """
+        self.n_dispositivos = n_dispositivos
+        self.intervalo_us = intervalo_segundos * US_POR_SEGUNDO
+        self.rng = np.random.default_rng(seed)
+        self.nomes = np.array([f"{prefixo}{i}" for i in range(n_dispositivos)])
+
+        # Características fixas de cada dispositivo
+        n = n_dispositivos
+        self._umidade_base = self.rng.uniform(45, 75, n)
+        self._amplitude_umidade = self.rng.uniform(5, 15, n)
+        self._temperatura_base = self.rng.uniform(18, 26, n)
+        self._amplitude_temperatura = self.rng.uniform(4, 9, n)
+        self._ph_base = self.rng.uniform(5.8, 7.2, n)
+        self._prob_fosforo = self.rng.uniform(0.6, 0.95, n)
+        self._prob_potassio = self.rng.uniform(0.6, 0.95, n)
+        self._ruido_umidade = np.zeros(n)
+
+    def _ar1(self, inovacoes: np.ndarray) -> np.ndarray:
+        """
+        Ruído AR(1) x[t] = phi * x[t-1] + e[t] sem laço por passo
+
+        Usa x[t] = phi^t * (x0 + soma(e[k] / phi^k)) em segmentos curtos
+        para evitar overflow de phi^-k.
+        """
+        phi = self.PHI_RUIDO
+        saida = np.empty_like(inovacoes)
+        for inicio in range(0, len(inovacoes), self.SEGMENTO_AR):
+            bloco = inovacoes[inicio:inicio + self.SEGMENTO_AR]
+            potencias = phi ** np.arange(1, len(bloco) + 1)[:, None]
+            acumulado = np.cumsum(bloco / potencias, axis=0)
+            saida[inicio:inicio + len(bloco)] = potencias * (self._ruido_umidade + acumulado)
+            self._ruido_umidade = saida[inicio + len(bloco) - 1]
+        return saida
+
+    def gerar_blocos(self, inicio: datetime, fim: datetime,
+                     tamanho_bloco: int = 1_000_000) -> Iterator[Dict[str, np.ndarray]]:
+        """
+        Gera leituras de todos os dispositivos entre `inicio` e `fim`
+
+        Args:
+            inicio: Primeiro instante (inclusive)
+            fim: Último instante (exclusive)
+            tamanho_bloco: Número aproximado de leituras por bloco
+
+        Yields:
+            Dicionário de arrays com as colunas 'timestamp' (µs), 'dispositivo',
+            'umidade', 'ph', 'temperatura', 'fosforo' e 'potassio'
+        """
+        n = self.n_dispositivos
+        t0 = datetime_para_us(inicio)
+        total_passos = max(0, -(-(datetime_para_us(fim) - t0) // self.intervalo_us))
+        passos_por_bloco = max(1, tamanho_bloco // n)
+
+        for passo in range(0, total_passos, passos_por_bloco):
+            passos = min(passos_por_bloco, total_passos - passo)
+            tempos = t0 + (passo + np.arange(passos, dtype=np.int64)) * self.intervalo_us
+
+            # Fase do dia em radianos, com máximo de temperatura às 15 h
+            horas = (tempos // US_POR_SEGUNDO) % SEGUNDOS_POR_DIA / 3600.0
+            ciclo = np.sin(2 * np.pi * (horas - 9.0) / 24.0)[:, None]
+
+            temperatura = (self._temperatura_base + self._amplitude_temperatura * ciclo
+                           + self.rng.normal(0, 0.5, (passos, n)))
+            ruido = self._ar1(self.rng.normal(0, 0.3, (passos, n)))
+            umidade = np.clip(
+                self._umidade_base - self._amplitude_umidade * ciclo + ruido, 0, 100
+            )
+            ph = self._ph_base + self.rng.normal(0, 0.05, (passos, n))
+
+            yield {
+                'timestamp': np.repeat(tempos, n),
+                'dispositivo': np.tile(np.arange(n, dtype=np.int32), passos),
+                'umidade': umidade.astype(np.float32).ravel(),
+                'ph': ph.astype(np.float32).ravel(),
+                'temperatura': temperatura.astype(np.float32).ravel(),
+                'fosforo': (self.rng.random((passos, n)) < self._prob_fosforo).ravel(),
+                'potassio': (self.rng.random((passos, n)) < self._prob_potassio).ravel(),
+            }
+
+    def alimentar(self, destino, inicio: datetime, fim: datetime,
+                  tamanho_bloco: int = 1_000_000) -> int:
+        """
+        Envia os blocos gerados direto para a ingestão em lote
+
+        Args:
+            destino: ArmazemSensores (um shard por dispositivo) ou
+                SensorHandler (todas as leituras no mesmo handler)
+            inicio, fim: Intervalo simulado
+            tamanho_bloco: Leituras por bloco
+
+        Returns:
+            Total de leituras ingeridas
+        """
+        from .armazem_sensores import ArmazemSensores
+
+        total = 0
+        for bloco in self.gerar_blocos(inicio, fim, tamanho_bloco):
+            if isinstance(destino, ArmazemSensores):
+                total += destino.adicionar_leituras_lote(
+                    bloco, dispositivos=self.nomes[bloco['dispositivo']]
+                )
+            else:
+                total += destino.adicionar_leituras_lote(bloco)
+        return total
+
+    def gravar_arquivo(self, caminho: str, inicio: datetime, fim: datetime,
+                       tamanho_bloco: int = 1_000_000) -> int:
+        """
+        Grava as leituras em um arquivo .npy (registros DTYPE_SIMULADO)
+
+        O arquivo é preenchido por memória mapeada, bloco a bloco, e pode
+        ser relido com np.load(caminho, mmap_mode='r').
+
+        Args:
+            caminho: Caminho do arquivo de saída
+            inicio, fim: Intervalo simulado
+            tamanho_bloco: Leituras por bloco
+
+        Returns:
+            Total de leituras gravadas
+        """
+        total_passos = max(0, -(-(datetime_para_us(fim) - datetime_para_us(inicio))
+                                // self.intervalo_us))
+        saida = open_memmap(caminho, mode='w+', dtype=DTYPE_SIMULADO,
+                            shape=(total_passos * self.n_dispositivos,))
+
+        posicao = 0
+        for bloco in self.gerar_blocos(inicio, fim, tamanho_bloco):
+            n = len(bloco['timestamp'])
+            registros = saida[posicao:posicao + n]
+            for nome in DTYPE_SIMULADO.names:
+                registros[nome] = bloco[nome]
+            posicao += n
+
+        saida.flush()
+        del saida
+        return posicao
@@ -0,0 +1,231 @@
+"""
+Sketches de quantis mescláveis (DDSketch) para métricas de sensores
+Percentis com erro relativo limitado a partir de contagens por faixa
+logarítmica, combináveis entre janelas e dispositivos por soma
+"""
+
+import math
+from typing import Dict, Iterable, Optional, Sequence
+
+import numpy as np
+
+
+# Erro relativo máximo dos quantis (1%)
+ALFA = 0.01
+# |valor| abaixo disso cai na faixa do zero (erro absoluto, não relativo)
+VALOR_MINIMO = 1e-3
+# |valor| acima disso é contado na última faixa (erro não garantido)
+VALOR_MAXIMO = 1e5
+
+QUANTIS_PADRAO = (0.5, 0.95, 0.99)
+
+_GAMA = (1 + ALFA) / (1 - ALFA)
+_LOG_GAMA = math.log(_GAMA)
+_CHAVE_MINIMA = math.ceil(math.log(VALOR_MINIMO) / _LOG_GAMA)
+_CHAVE_MAXIMA = math.ceil(math.log(VALOR_MAXIMO) / _LOG_GAMA)
+_FAIXAS = _CHAVE_MAXIMA - _CHAVE_MINIMA + 1
+
+# Índices ordenados pelo valor: negativos (do maior módulo ao menor),
+# zero e positivos. Somar contagens índice a índice mescla dois sketches.
+INDICE_ZERO = _FAIXAS
+NUM_INDICES = 2 * _FAIXAS + 1
+
+
+def indice_valor(valor: float) -> int:
+    """Índice do sketch para um valor (escalar)"""
+    modulo = abs(valor)
+    if modulo <= VALOR_MINIMO:
+        return INDICE_ZERO
+    chave = min(math.ceil(math.log(modulo) / _LOG_GAMA), _CHAVE_MAXIMA) - _CHAVE_MINIMA
+    return INDICE_ZERO + 1 + chave if valor > 0 else INDICE_ZERO - 1 - chave
+
+
+def indices_valores(valores: np.ndarray) -> np.ndarray:
+    """Versão vetorizada de indice_valor (NaN deve ser filtrado antes)"""
+    valores = np.asarray(valores, dtype=np.float64)
+    modulo = np.abs(valores)
+    with np.errstate(divide='ignore'):
+        chaves = np.ceil(np.log(np.maximum(modulo, VALOR_MINIMO)) / _LOG_GAMA)
+    chaves = np.minimum(chaves, _CHAVE_MAXIMA).astype(np.int64) - _CHAVE_MINIMA
+    indices = np.where(valores > 0, INDICE_ZERO + 1 + chaves, INDICE_ZERO - 1 - chaves)
+    indices[modulo <= VALOR_MINIMO] = INDICE_ZERO
+    return indices
+
+
+def valores_indices(indices: np.ndarray) -> np.ndarray:
+    """Valor representativo de cada índice (erro relativo <= ALFA na faixa)"""
+    indices = np.asarray(indices, dtype=np.int64)
+    positivos = indices > INDICE_ZERO
+    chaves = np.where(positivos, indices - INDICE_ZERO - 1, INDICE_ZERO - 1 - indices)
+    modulo = 2 * _GAMA ** (chaves + _CHAVE_MINIMA) / (_GAMA + 1)
+    return np.where(indices == INDICE_ZERO, 0.0, np.where(positivos, modulo, -modulo))
+
+
+def quantis_contagens(contagens: np.ndarray, quantis: Sequence[float]) -> Dict[float, Optional[float]]:
+    """
+    Quantis a partir de um vetor denso de contagens por índice
+
+    Returns:
+        Dicionário quantil -> valor (None se não houver contagens)
+    """
+    total = int(contagens.sum())
+    if not total:
+        return {q: None for q in quantis}
+    acumulado = np.cumsum(contagens)
+    # Posição (0-based) do elemento de rank q * (n - 1), como no DDSketch
+    posicoes = np.floor(np.asarray(quantis, dtype=np.float64) * (total - 1))
+    indices = np.searchsorted(acumulado, posicoes, side='right')
+    return dict(zip(quantis, valores_indices(indices).tolist()))
+
+
+class DDSketch:
+    """
+    Sketch de quantis com erro relativo limitado (DDSketch)
+
+    Cada valor incrementa a contagem da sua faixa logarítmica; o quantil
+    estimado está a no máximo ALFA (relativo) do valor real. As faixas
+    são fixas, então mesclar dois sketches é somar os vetores de contagem
+    e remover valores é subtrair, o que permite acompanhar um histórico
+    com descarte das leituras antigas.
+    """
+
+    __slots__ = ('contagens', 'n')
+
+    def __init__(self, contagens: Optional[np.ndarray] = None):
+        self.contagens = (np.zeros(NUM_INDICES, dtype=np.int64) if contagens is None
+                          else contagens)
+        self.n = int(self.contagens.sum())
+
+    def zerar(self):
+        self.contagens[:] = 0
+        self.n = 0
+
+    def adicionar(self, valor: float):
+        """Conta um valor (NaN é ignorado)"""
+        if valor != valor:
+            return
+        self.contagens[indice_valor(valor)] += 1
+        self.n += 1
+
+    def remover(self, valor: float):
+        """Desconta um valor previamente adicionado"""
+        if valor != valor:
+            return
+        self.contagens[indice_valor(valor)] -= 1
+        self.n -= 1
+
+    @classmethod
+    def de_valores(cls, valores: np.ndarray) -> 'DDSketch':
+        """Sketch de um array (vetorizado, NaN ignorado)"""
+        valores = np.asarray(valores, dtype=np.float64)
+        valores = valores[~np.isnan(valores)]
+        return cls(np.bincount(indices_valores(valores), minlength=NUM_INDICES))
+
+    def mesclar(self, outro: 'DDSketch'):
+        """Soma as contagens de outro sketch a este"""
+        self.contagens += outro.contagens
+        self.n += outro.n
+
+    def subtrair(self, outro: 'DDSketch'):
+        """Desconta valores de um sketch contido neste"""
+        self.contagens -= outro.contagens
+        self.n -= outro.n
+
+    @classmethod
+    def combinar(cls, partes: Iterable['DDSketch']) -> 'DDSketch':
+        """Novo sketch equivalente à união dos conjuntos"""
+        total = cls()
+        for parte in partes:
+            total.mesclar(parte)
+        return total
+
+    def quantis(self, quantis: Sequence[float] = QUANTIS_PADRAO) -> Dict[float, Optional[float]]:
+        """Quantil -> valor estimado (None se vazio)"""
+        return quantis_contagens(self.contagens, quantis)
+
+    def quantil(self, q: float) -> Optional[float]:
+        return self.quantis((q,))[q]
+
+
+class SketchesPorBucket:
+    """
+    Sketches esparsos de uma série de buckets de tempo
+
+    Cada entrada é (bucket * NUM_INDICES + índice, contagem), mantida
+    ordenada em arrays que crescem por duplicação. Um bucket ocupa apenas
+    as faixas em que houve leituras, e o sketch de um intervalo de
+    buckets é a soma das contagens das entradas no intervalo.
+    """
+
+    CAPACIDADE_INICIAL = 1024
+
+    def __init__(self):
+        self.n = 0
+        self._codigos = np.zeros(self.CAPACIDADE_INICIAL, dtype=np.int64)
+        self._contagens = np.zeros(self.CAPACIDADE_INICIAL, dtype=np.int64)
+
+    def _reservar(self, extra: int):
+        capacidade = len(self._codigos)
+        if self.n + extra <= capacidade:
+            return
+        nova = max(2 * capacidade, self.n + extra)
+        for nome in ('_codigos', '_contagens'):
+            maior = np.zeros(nova, dtype=np.int64)
+            maior[:self.n] = getattr(self, nome)[:self.n]
+            setattr(self, nome, maior)
+
+    @staticmethod
+    def codificar(buckets: np.ndarray, valores: np.ndarray):
+        """
+        Entradas (códigos ordenados, contagens) de leituras por bucket
+
+        Args:
+            buckets: Bucket de cada leitura
+            valores: Valor de cada leitura (NaN ignorado)
+        """
+        valores = np.asarray(valores, dtype=np.float64)
+        presentes = ~np.isnan(valores)
+        codigos = (np.asarray(buckets, dtype=np.int64)[presentes] * NUM_INDICES
+                   + indices_valores(valores[presentes]))
+        return np.unique(codigos, return_counts=True)
+
+    def mesclar(self, codigos: np.ndarray, contagens: np.ndarray):
+        """Soma entradas (ordenadas, sem repetição) às existentes"""
+        if not len(codigos):
+            return
+        if not self.n or codigos[0] > self._codigos[self.n - 1]:
+            self._reservar(len(codigos))
+            self._codigos[self.n:self.n + len(codigos)] = codigos
+            self._contagens[self.n:self.n + len(codigos)] = contagens
+            self.n += len(codigos)
+            return
+        # Refaz apenas a cauda a partir da primeira entrada afetada
+        inicio = int(np.searchsorted(self._codigos[:self.n], codigos[0]))
+        unicos, inverso = np.unique(
+            np.concatenate([self._codigos[inicio:self.n], codigos]), return_inverse=True
+        )
+        somas = np.bincount(
+            inverso, np.concatenate([self._contagens[inicio:self.n], contagens]), len(unicos)
+        ).astype(np.int64)
+        self._reservar(inicio + len(unicos) - self.n)
+        self._codigos[inicio:inicio + len(unicos)] = unicos
+        self._contagens[inicio:inicio + len(unicos)] = somas
+        self.n = inicio + len(unicos)
+
+    def descartar_antes(self, bucket: int):
+        """Remove as entradas de buckets anteriores a `bucket`"""
+        corte = int(np.searchsorted(self._codigos[:self.n], bucket * NUM_INDICES))
+        if not corte:
+            return
+        restantes = self.n - corte
+        self._codigos[:restantes] = self._codigos[corte:self.n]
+        self._contagens[:restantes] = self._contagens[corte:self.n]
+        self.n = restantes
+
+    def intervalo(self, bucket_inicio: int, bucket_fim: int) -> DDSketch:
+        """Sketch mesclado dos buckets em [bucket_inicio, bucket_fim]"""
+        codigos = self._codigos[:self.n]
+        a = int(np.searchsorted(codigos, bucket_inicio * NUM_INDICES))
+        b = int(np.searchsorted(codigos, (bucket_fim + 1) * NUM_INDICES))
+        return DDSketch(np.bincount(codigos[a:b] % NUM_INDICES,
+                                    self._contagens[a:b], NUM_INDICES).astype(np.int64))
@@ -146,7 +146,35 @@ class MLModel:
             Lista de dicionários com resultados
         """
         return [self.prever(dados) for dados in lista_dados]
-    
+
+    def prever_arrays(self, umidade: np.ndarray, temperatura: np.ndarray,
+                      nutrientes) -> np.ndarray:
+        """
+        Faz previsões para arrays de entradas em uma única chamada ao modelo
+
+        Args:
+            umidade: Umidades do solo (%)
+            temperatura: Temperaturas (°C), mesma forma de umidade
+            nutrientes: Nível de nutrientes N (ppm), escalar ou mesma forma
+
+        Returns:
+            Array booleano com a forma de umidade (True = irrigar)
+        """
+        if not self.model_info['carregado']:
+            raise RuntimeError("Modelo não carregado")
+
+        umidade = np.asarray(umidade, dtype=np.float64)
+        df = pd.DataFrame({
+            'umidade_solo': umidade.ravel(),
+            'temperatura': np.asarray(temperatura, dtype=np.float64).ravel(),
+            'nutrientes_N': np.broadcast_to(
+                np.asarray(nutrientes, dtype=np.float64), umidade.shape
+            ).ravel()
+        })[self.model_info['features']]
+
+        previsao = np.asarray(self.model.predict(df))
+        return (previsao == 1).reshape(umidade.shape)
+
     def obter_importancia_features(self) -> Optional[Dict]:
         """
         Retorna importância das features (se o modelo suportar)
@@ -0,0 +1,204 @@
+"""
+Benchmarks do módulo de sensores (Fase 3)
+Execute: python utils/benchmark_sensores.py
+"""
+
+import sys
+import time
+from dataclasses import dataclass, asdict
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, Optional
+
+import numpy as np
+
+# Adicionar raiz e src ao path
+RAIZ = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(RAIZ))
+sys.path.insert(0, str(RAIZ / "src"))
+
+from src.fase3.sensor_handler import SensorHandler, SensorData  # noqa: E402
+from src.fase3.simulador import GeradorSensores  # noqa: E402
+from src.fase3.compressao import HistoricoComprimido  # noqa: E402
+from src.fase3.historico_colunar import empacotar_flags  # noqa: E402
+
+
+def gerar_lote(n: int, seed: int = 42) -> dict:
+    """Gera um lote sintético de n leituras com intervalo de 5 s"""
+    rng = np.random.default_rng(seed)
+    inicio = np.datetime64('2026-01-01T00:00:00', 'us')
+    return {
+        'timestamp': inicio + np.arange(n) * np.timedelta64(5, 's'),
+        'umidade': rng.uniform(20, 90, n),
+        'ph': rng.uniform(5.0, 8.0, n),
+        'fosforo': rng.random(n) < 0.7,
+        'potassio': rng.random(n) < 0.7,
+        'temperatura': rng.uniform(15, 35, n),
+    }
+
+
+def benchmark_ingestao(n_unitario: int = 50_000, n_lote: int = 1_000_000):
+    """Compara adicionar_leitura (uma a uma) com adicionar_leituras_lote"""
+    print("📥 Ingestão de leituras")
+
+    dados = gerar_lote(max(n_unitario, n_lote))
+
+    handler = SensorHandler(capacidade=n_unitario)
+    inicio = time.perf_counter()
+    for i in range(n_unitario):
+        handler.adicionar_leitura(
+            dados['umidade'][i], dados['ph'][i],
+            dados['fosforo'][i], dados['potassio'][i], dados['temperatura'][i]
+        )
+    decorrido = time.perf_counter() - inicio
+    print(f"  adicionar_leitura:       {n_unitario / decorrido:>14,.0f} leituras/s")
+
+    handler = SensorHandler(capacidade=n_lote)
+    lote = {nome: valores[:n_lote] for nome, valores in dados.items()}
+    inicio = time.perf_counter()
+    handler.adicionar_leituras_lote(lote)
+    decorrido = time.perf_counter() - inicio
+    print(f"  adicionar_leituras_lote: {n_lote / decorrido:>14,.0f} leituras/s")
+
+
+def benchmark_gerador(n_dispositivos: int = 500, horas: int = 24):
+    """Mede a vazão do gerador sintético (sem destino)"""
+    print("🧪 Gerador sintético")
+
+    gerador = GeradorSensores(n_dispositivos, intervalo_segundos=5, seed=42)
+    inicio_sim = datetime(2026, 1, 1)
+    fim_sim = inicio_sim + timedelta(hours=horas)
+
+    total = 0
+    inicio = time.perf_counter()
+    for bloco in gerador.gerar_blocos(inicio_sim, fim_sim):
+        total += len(bloco['timestamp'])
+    decorrido = time.perf_counter() - inicio
+    print(f"  {total:,} leituras em {decorrido:.2f} s "
+          f"({total / decorrido:,.0f} leituras/s)")
+
+
+@dataclass
+class SensorDataAnterior:
+    """SensorData antes do __slots__ (referência para comparação)"""
+    timestamp: datetime
+    umidade: float
+    ph: float
+    fosforo_presente: bool
+    potassio_presente: bool
+    bomba_ligada: bool
+    temperatura: Optional[float] = None
+
+    def to_dict(self) -> Dict:
+        data = asdict(self)
+        data['timestamp'] = self.timestamp.isoformat()
+        return data
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'SensorDataAnterior':
+        data['timestamp'] = datetime.fromisoformat(data['timestamp'])
+        return cls(**data)
+
+
+def _bytes_por_objeto(obj) -> int:
+    """Tamanho do objeto mais o __dict__ (se houver)"""
+    tamanho = sys.getsizeof(obj)
+    if hasattr(obj, '__dict__'):
+        tamanho += sys.getsizeof(obj.__dict__)
+    return tamanho
+
+
+def benchmark_sensor_data(n: int = 100_000):
+    """Compara SensorData (slots) com a versão anterior baseada em asdict"""
+    print("📦 SensorData: memória e serialização")
+
+    agora = datetime(2026, 1, 1)
+    campos = (agora, 55.5, 6.5, True, False, True, 24.3)
+    handler = SensorHandler(capacidade=n)
+    handler.adicionar_leituras_lote(gerar_lote(n))
+
+    for nome, classe in (("anterior", SensorDataAnterior), ("slots", SensorData)):
+        leituras = [classe(*campos) for _ in range(n)]
+
+        inicio = time.perf_counter()
+        registros = [s.to_dict() for s in leituras]
+        to_dict = n / (time.perf_counter() - inicio)
+
+        inicio = time.perf_counter()
+        if classe is SensorData:
+            for r in registros:
+                classe.from_dict(r)
+        else:
+            # A versão anterior altera o dicionário recebido
+            for r in registros:
+                classe.from_dict(dict(r))
+        from_dict = n / (time.perf_counter() - inicio)
+
+        print(f"  {nome:<9} {_bytes_por_objeto(leituras[0]):>4} bytes/leitura | "
+              f"to_dict {to_dict:>10,.0f}/s | from_dict {from_dict:>10,.0f}/s")
+
+    inicio = time.perf_counter()
+    SensorData.to_records(leituras)
+    print(f"  SensorData.to_records:        {n / (time.perf_counter() - inicio):>12,.0f} leituras/s")
+
+    inicio = time.perf_counter()
+    [s.to_dict() for s in handler.historico]
+    print(f"  exportar (objetos + to_dict): {n / (time.perf_counter() - inicio):>12,.0f} leituras/s")
+
+    inicio = time.perf_counter()
+    handler.exportar_para_dict()
+    print(f"  exportar_para_dict (colunas): {n / (time.perf_counter() - inicio):>12,.0f} leituras/s")
+
+
+def benchmark_compressao(dias: int = 30):
+    """Razão de compressão e vazão de descompressão dos blocos selados"""
+    print("🗜️  Compressão de blocos selados")
+
+    gerador = GeradorSensores(1, intervalo_segundos=5, seed=42)
+    inicio_sim = datetime(2026, 1, 1)
+    dados = next(gerador.gerar_blocos(inicio_sim, inicio_sim + timedelta(days=dias),
+                                      tamanho_bloco=dias * 86_400 // 5))
+    n = len(dados['timestamp'])
+    colunas = {
+        'timestamp': dados['timestamp'],
+        'umidade': dados['umidade'],
+        'ph': dados['ph'],
+        'temperatura': dados['temperatura'],
+        'flags': empacotar_flags(dados['fosforo'], dados['potassio'], np.zeros(n, dtype=bool)),
+    }
+    # Mesmo sinal com a resolução dos sensores reais (0,1 % e 0,01 de pH)
+    quantizadas = dict(colunas,
+                       umidade=np.round(colunas['umidade'], 1),
+                       ph=np.round(colunas['ph'], 2),
+                       temperatura=np.round(colunas['temperatura'], 1))
+
+    for nome, entrada in (("float32 bruto", colunas), ("quantizado", quantizadas)):
+        comprimido = HistoricoComprimido()
+        inicio = time.perf_counter()
+        comprimido.adicionar_lote(entrada)
+        compressao = n / (time.perf_counter() - inicio)
+
+        inicio = time.perf_counter()
+        for bloco in comprimido.blocos:
+            bloco.descomprimir()
+        lidas = sum(bloco.n for bloco in comprimido.blocos)
+        descompressao = lidas / (time.perf_counter() - inicio)
+
+        razao = comprimido.estatisticas()['razao_compressao']
+        print(f"  {nome:<13} {n:,} leituras | razão {razao:>5.2f}x | "
+              f"compressão {compressao:>11,.0f}/s | descompressão {descompressao:>11,.0f}/s")
+
+
+def main():
+    """Executa todos os benchmarks"""
+    print("=" * 60)
+    print("⏱️  BENCHMARKS - SENSORES IoT")
+    print("=" * 60)
+    benchmark_ingestao()
+    benchmark_gerador()
+    benchmark_sensor_data()
+    benchmark_compressao()
+
+
+if __name__ == "__main__":
+    main()